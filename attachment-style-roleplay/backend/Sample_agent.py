@@ -1,51 +1,69 @@
 import os
-from dotenv import load_dotenv
-from openai import OpenAI
-from load_prompts import load_agent_prompts
-
-load_dotenv()
-client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-
-# Load your prompts JSON however you do it
-prompts = load_agent_prompts()
-
-partner_style = "secure"
-prompt_template = prompts[partner_style]
-
-# Conversation history (list of messages in chat format)
-conversation = [
-    {"role": "system", "content": prompt_template.template.split("\\n")[0]}
-]
-
-print("Start chatting with your partner! Type 'exit' to quit.\n")
-
-while True:
-    user_input = input("You: ")
-    if user_input.lower() in ["exit", "quit", "stop"]:
-        print("Conversation ended.")
-        break
-    
-    user_message = prompt_template.format(input=user_input)
-    # Append user's message
-    conversation.append({"role": "user", "content": user_message})
-
-    # Call OpenAI with conversation history to keep context
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=conversation,
-        temperature=0.7,
-        max_tokens=60,
-        frequency_penalty=0.3,
-        presence_penalty=0.1
+from clients import get_client, prefetch_client
+from style_registry import get_style_registry
+from history import ConversationHistory, DEFAULT_TOKEN_BUDGET
+from llm import create_reply
+
+
+def main():
+    # dotenv and the OpenAI SDK load here rather than at import time
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    api_key = os.environ.get('OPENAI_API_KEY')
+    base_url = os.environ.get('OPENAI_BASE_URL')
+    # Build the client in the background while the user types the first message
+    prefetch_client(api_key, base_url)
+
+    # Every style's lexicon, weights and band prompts compiled once; prompts
+    # follow edits to agent_profiles.json between turns
+    styles = get_style_registry()
+    engine = styles.get(os.environ.get('PARTNER_STYLE', 'secure'))
+    state = engine.initial_state()
+
+    # Conversation history, kept under a token budget with older turns summarized
+    history = ConversationHistory(
+        engine.variants.prefix,
+        token_budget=int(os.environ.get('HISTORY_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET)),
     )
 
-    reply = response.choices[0].message.content.strip()
-    print("Partner:", reply)
+    print(f"Start chatting with your {engine.name} partner! Type 'exit' to quit, "
+          f"'style <{'|'.join(styles.styles)}>' to switch.\n")
+
+    while True:
+        user_input = input("You: ")
+        if user_input.lower() in ["exit", "quit", "stop"]:
+            print("Conversation ended.")
+            break
+
+        command = user_input.strip().lower().split()
+        if command and command[0] == "style":
+            if len(command) != 2 or command[1] not in styles:
+                print(f"Styles: {', '.join(styles.styles)}")
+                continue
+            # Already compiled: the conversation carries on with the new partner's engine
+            engine = styles.get(command[1])
+            state = engine.initial_state()
+            print(f"Partner style: {engine.name}")
+            continue
+
+        triggers = engine.analyze(user_input)
+        state = engine.step(state, triggers)
+
+        variants = engine.variants
+        history.set_system_prompt(variants.prefix)
+        # Append user's message
+        history.append("user", user_input)
+
+        # Call OpenAI with conversation history and the band directive for the current level
+        reply = create_reply(get_client(api_key, base_url),
+                             variants.request_messages(history.messages(), state.level))
+        print("Partner:", reply)
+        print(f"  ({engine.name} level: {state.level:.2f})")
+
+        # Append partner's reply to conversation to keep context
+        history.append("assistant", reply)
 
-    # Append partner's reply to conversation to keep context
-    conversation.append({"role": "assistant", "content": reply})
 
-    # Optional: keep conversation history length limited to save tokens
-    if len(conversation) > 12:  # ~6 user/partner exchanges
-        # Keep system prompt + last 10 messages
-        conversation = [conversation[0]] + conversation[-10:]
+if __name__ == "__main__":
+    main()
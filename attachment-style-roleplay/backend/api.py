@@ -0,0 +1,371 @@
+"""Async HTTP API for the trainer, for the React front-end.
+
+    python api.py --port 8000
+    uvicorn api:app --port 8000
+
+Endpoints:
+
+    POST /sessions {"style"?}          -> {"session_id", "style", "avoidance_level"}
+    POST /sessions/{id}/turns          -> text/event-stream: analysis, token..., [suggestions,] done | error
+                                          (?stream=0 returns one JSON object instead)
+    GET  /sessions/{id}?start=&limit=  -> session summary and its stored turns
+    GET  /health
+    GET  /metrics                      -> per-stage timings and turn counters, Prometheus text format
+
+Each session keeps the partner style it was created with (one of
+style_registry's, PARTNER_STYLE when the request names none); its turns run
+on that style's lexicon, weights and prompts. The OpenAI key and base URL
+come from OPENAI_API_KEY / OPENAI_BASE_URL, turns are logged to SESSION_STORE, and API_CORS_ORIGINS lists the allowed origins
+(comma separated, default http://localhost:3000). With REPLY_CANDIDATES above
+1, each turn requests that many replies in one call and the best-ranked one
+is sent as a single token event. PERSONALIZED_SUGGESTIONS=1 writes rewrites of
+the trainee's message concurrently with the reply and sends them as a
+suggestions event before done (static ones if SUGGESTION_DEADLINE passes).
+"""
+import contextlib
+import json
+import os
+import time
+import weakref
+from collections import OrderedDict
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from avoidance_engine import AvoidanceState
+from clients import AsyncClientRegistry
+from feedback import coaching_for, suggestions_for
+from history import ConversationHistory, DEFAULT_TOKEN_BUDGET
+from llm import acreate_ranked_reply, acreate_reply, astream_reply, default_caller
+from session_store import open_session_store, restore_history
+from style_registry import DEFAULT_STYLE, get_style_registry
+from suggestion_writer import DEFAULT_DEADLINE, await_suggestions, awrite_suggestions
+from tracing import get_tracer
+from trigger_engine import trigger_mask
+
+DEFAULT_CORS_ORIGINS = "http://localhost:3000"
+MAX_CACHED_HISTORIES = 1024
+MAX_MESSAGE_CHARS = 2000
+
+
+def sse_event(name, payload):
+    return f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+class Trainer:
+    """Per-process state behind the API: store, pooled async clients and prompt windows.
+
+    Everything a turn needs is in the session store, so any worker can serve
+    any session. Prompt windows for recent sessions are kept in an LRU and
+    rebuilt from the store when missing or when another worker has since
+    added turns. Turns for one session are serialized within a worker.
+    """
+
+    def __init__(self, store, api_key=None, base_url=None, token_budget=DEFAULT_TOKEN_BUDGET,
+                 max_histories=MAX_CACHED_HISTORIES, reply_candidates=1,
+                 personalized_suggestions=False, suggestion_deadline=DEFAULT_DEADLINE,
+                 default_style=DEFAULT_STYLE):
+        self.styles = get_style_registry()
+        self.default_style = self.styles.get(default_style).name
+        self.store = store
+        self.api_key = api_key
+        self.base_url = base_url
+        self.token_budget = token_budget
+        self.max_histories = max_histories
+        self.reply_candidates = reply_candidates
+        self.personalized_suggestions = personalized_suggestions
+        self.suggestion_deadline = suggestion_deadline
+        self.clients = AsyncClientRegistry()
+        self.tracer = get_tracer()
+        self._histories = OrderedDict()  # session id -> (history, turn count it reflects)
+        self._locks = weakref.WeakValueDictionary()
+
+    async def create_session(self, style=None):
+        """Raises ValueError for a style the registry does not know"""
+        engine = self.styles.get(style or self.default_style)
+        session_id = await run_in_threadpool(self.store.create_session, engine.name, engine.initial_level)
+        return {"session_id": session_id, "style": engine.name, "avoidance_level": engine.initial_level}
+
+    def _engine(self, session):
+        # Sessions logged before styles were stored, or by a newer build, fall back to the default
+        style = session["style"]
+        return self.styles.get(style if style in self.styles else self.default_style)
+
+    def _lock(self, session_id):
+        import asyncio
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[session_id] = lock
+        return lock
+
+    async def _history(self, session, engine):
+        session_id = session["id"]
+        entry = self._histories.get(session_id)
+        if entry is not None and entry[1] == session["turn_count"]:
+            self._histories.move_to_end(session_id)
+            return entry[0]
+        turns = await run_in_threadpool(self.store.turns, session_id)
+        history = restore_history(
+            ConversationHistory(engine.variants.prefix, token_budget=self.token_budget), turns)
+        self._remember(session_id, history, session["turn_count"])
+        return history
+
+    def _remember(self, session_id, history, turn_count):
+        self._histories[session_id] = (history, turn_count)
+        self._histories.move_to_end(session_id)
+        while len(self._histories) > self.max_histories:
+            self._histories.popitem(last=False)
+
+    async def run_turn(self, session_id, message, stream=True):
+        """Yield (event, payload) pairs: analysis, then tokens, then done or error"""
+        async with self._lock(session_id):
+            session = await run_in_threadpool(self.store.get_session, session_id)
+            if session is None:
+                yield "error", {"error": "unknown session"}
+                return
+            trace = self.tracer.start_turn(session_id, frontend="api")
+            engine = self._engine(session)
+            with trace.span("prompt"):
+                history = await self._history(session, engine)
+
+            # Same trigger analysis, level update and coaching as the CLI, with this
+            # session's style engine on its stored level
+            with trace.span("analyze"):
+                triggers = engine.analyze(message)
+            level_before = session["level"]
+            with trace.span("adjust"):
+                level = engine.step(AvoidanceState(level_before), triggers).level
+            with trace.span("feedback"):
+                mask = trigger_mask(triggers)
+                severity, coaching = coaching_for(mask)
+                suggestions = suggestions_for(mask, level)
+            yield "analysis", {
+                "style": engine.name,
+                "triggers": triggers,
+                "level_before": level_before,
+                "avoidance_level": level,
+                "trigger_mask": mask,
+                "severity": severity.value,
+                "coaching": coaching,
+                "suggestions": suggestions,
+            }
+
+            with trace.span("prompt"):
+                variants = engine.variants
+                history.set_system_prompt(variants.prefix)
+                history.append("user", message)
+                messages = variants.request_messages(history.messages(), level)
+
+            started = time.perf_counter()
+            reply = None
+            error = None
+            pending = None
+            try:
+                with trace.span("llm"):
+                    client = self.clients.get(self.api_key, self.base_url)
+                    if self.personalized_suggestions:
+                        import asyncio
+                        # Runs while the reply streams; collected (or dropped) after it
+                        pending = asyncio.ensure_future(awrite_suggestions(
+                            client, history.messages(), message, coaching,
+                            deadline=self.suggestion_deadline))
+                    if self.reply_candidates > 1:
+                        reply = await acreate_ranked_reply(client, messages, level,
+                                                           candidates=self.reply_candidates,
+                                                           trace=trace)
+                        if stream:
+                            yield "token", {"text": reply}
+                    elif stream:
+                        parts = []
+                        async for token in astream_reply(client, messages, trace=trace):
+                            parts.append(token)
+                            yield "token", {"text": token}
+                        reply = "".join(parts).strip()
+                    else:
+                        reply = await acreate_reply(client, messages, trace=trace)
+            except Exception as exc:
+                error = str(exc)
+                if pending is not None:
+                    pending.cancel()
+            except BaseException:
+                if pending is not None:
+                    pending.cancel()
+                # Client went away mid-reply: keep the level change, drop the partial reply.
+                # The cached window no longer matches the turn count and is rebuilt next time.
+                # Shielded so a second cancellation cannot lose the write, and on the threadpool
+                # like every other store call
+                import asyncio
+                try:
+                    await asyncio.shield(run_in_threadpool(
+                        self.store.append_turn, session_id, message, None, triggers,
+                        level_before, level, coaching))
+                finally:
+                    self.tracer.finish(trace, error="disconnected")
+                raise
+
+            latency_ms = (time.perf_counter() - started) * 1000 if reply is not None else None
+            with trace.span("store"):
+                index = await run_in_threadpool(self.store.append_turn, session_id, message, reply,
+                                                triggers, level_before, level, coaching, latency_ms)
+            if reply is None:
+                self.tracer.finish(trace, error=error)
+                yield "error", {"error": error, "turn": index}
+                return
+            history.append("assistant", reply)
+            self._remember(session_id, history, index + 1)
+            if pending is not None:
+                with trace.span("feedback"):
+                    suggestions, personalized = await await_suggestions(
+                        pending, suggestions, started, self.suggestion_deadline, trace)
+                yield "suggestions", {"suggestions": suggestions, "personalized": personalized}
+            self.tracer.finish(trace)
+            yield "done", {"reply": reply, "avoidance_level": level, "turn": index,
+                           "latency_ms": latency_ms, "timings_ms": {
+                               stage: seconds * 1000 for stage, seconds in trace.stage_seconds().items()}}
+
+    async def aclose(self):
+        await self.clients.aclose()
+        self.store.close()
+
+
+def _trainer(request):
+    return request.app.state.trainer
+
+
+async def health(request):
+    return JSONResponse({"status": "ok", "llm": default_caller.stats()})
+
+
+async def metrics(request):
+    return PlainTextResponse(_trainer(request).tracer.metrics.prometheus_text(),
+                             media_type="text/plain; version=0.0.4")
+
+
+async def create_session(request):
+    trainer = _trainer(request)
+    style = None
+    if await request.body():
+        try:
+            body = await request.json()
+        except ValueError:
+            return JSONResponse({"error": "body must be JSON"}, status_code=400)
+        style = body.get("style") if isinstance(body, dict) else None
+        if style is not None and (not isinstance(style, str) or style not in trainer.styles):
+            return JSONResponse({"error": f"'style' must be one of {', '.join(trainer.styles.styles)}"},
+                                status_code=400)
+    return JSONResponse(await trainer.create_session(style), status_code=201)
+
+
+async def get_session(request):
+    trainer = _trainer(request)
+    session_id = request.path_params["session_id"]
+    try:
+        start = int(request.query_params.get("start", 0))
+        limit = request.query_params.get("limit")
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return JSONResponse({"error": "start and limit must be integers"}, status_code=400)
+
+    session = await run_in_threadpool(trainer.store.get_session, session_id)
+    if session is None:
+        return JSONResponse({"error": "unknown session"}, status_code=404)
+    turns = await run_in_threadpool(trainer.store.turns, session_id, start, limit)
+    return JSONResponse({"session": session, "turns": turns})
+
+
+async def send_turn(request):
+    trainer = _trainer(request)
+    session_id = request.path_params["session_id"]
+    try:
+        body = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "body must be JSON"}, status_code=400)
+    message = body.get("message") if isinstance(body, dict) else None
+    if not isinstance(message, str) or not message.strip():
+        return JSONResponse({"error": "'message' is required"}, status_code=400)
+    if len(message) > MAX_MESSAGE_CHARS:
+        return JSONResponse({"error": f"'message' is longer than {MAX_MESSAGE_CHARS} characters"},
+                            status_code=413)
+    if await run_in_threadpool(trainer.store.get_session, session_id) is None:
+        return JSONResponse({"error": "unknown session"}, status_code=404)
+    message = message.strip()
+
+    if request.query_params.get("stream", "1") == "0":
+        result = {}
+        async for event, payload in trainer.run_turn(session_id, message, stream=False):
+            result.update(payload)
+            if event == "error":
+                return JSONResponse(result, status_code=502)
+        return JSONResponse(result)
+
+    async def events():
+        async for event, payload in trainer.run_turn(session_id, message):
+            yield sse_event(event, payload)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    trainer = Trainer(
+        open_session_store(os.environ.get("SESSION_STORE")),
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        base_url=os.environ.get("OPENAI_BASE_URL"),
+        token_budget=int(os.environ.get("HISTORY_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)),
+        reply_candidates=max(1, int(os.environ.get("REPLY_CANDIDATES", 1))),
+        personalized_suggestions=os.environ.get("PERSONALIZED_SUGGESTIONS") == "1",
+        suggestion_deadline=float(os.environ.get("SUGGESTION_DEADLINE", DEFAULT_DEADLINE)),
+        default_style=os.environ.get("PARTNER_STYLE", DEFAULT_STYLE),
+    )
+    # Import the SDK and build the pooled client before serving, not inside the first turn
+    trainer.clients.get(trainer.api_key, trainer.base_url)
+    app.state.trainer = trainer
+    try:
+        yield
+    finally:
+        await trainer.aclose()
+
+
+def create_app(cors_origins=None):
+    if cors_origins is None:
+        cors_origins = os.environ.get("API_CORS_ORIGINS", DEFAULT_CORS_ORIGINS).split(",")
+    routes = [
+        Route("/health", health),
+        Route("/metrics", metrics),
+        Route("/sessions", create_session, methods=["POST"]),
+        Route("/sessions/{session_id}", get_session),
+        Route("/sessions/{session_id}/turns", send_turn, methods=["POST"]),
+    ]
+    middleware = [Middleware(CORSMiddleware, allow_origins=[o.strip() for o in cors_origins if o.strip()],
+                             allow_methods=["GET", "POST"], allow_headers=["Content-Type"])]
+    return Starlette(routes=routes, middleware=middleware, lifespan=lifespan)
+
+
+app = create_app()
+
+
+def main():
+    import argparse
+
+    import uvicorn
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Serve the trainer API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    # uvicorn's 5 s default races pooled clients that pause between requests
+    parser.add_argument("--keep-alive", type=float, default=30.0, help="idle keep-alive seconds")
+    args = parser.parse_args()
+
+    load_dotenv()
+    uvicorn.run(create_app(), host=args.host, port=args.port, timeout_keep_alive=args.keep_alive)
+
+
+if __name__ == "__main__":
+    main()
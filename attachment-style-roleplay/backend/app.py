@@ -1,7 +1,20 @@
 import streamlit as st
-import openai
-from openai import OpenAI
 import os
+import time
+from itertools import chain
+from trigger_engine import trigger_mask
+from avoidance_engine import AvoidanceState
+from feedback import Severity, coaching_for, suggestions_for
+from llm import create_ranked_reply, create_reply, stream_reply, default_caller
+from resilience import format_latency
+from response_cache import ResponseCache
+from clients import get_client_registry
+from history import ConversationHistory, DEFAULT_TOKEN_BUDGET
+from prompt_variants import PrefixTracker
+from style_registry import get_style_registry
+from session_store import open_session_store, restore_history
+from tracing import get_tracer
+from suggestion_writer import PendingSuggestions
 
 # Page configuration
 st.set_page_config(
@@ -10,305 +23,380 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def get_session_store():
+    """Turn log shared by every session on this server (SESSION_STORE: "memory" or a SQLite path)"""
+    return open_session_store(os.environ.get("SESSION_STORE"))
+
+# Streamlit re-executes this script on every interaction, so every style's
+# lexicon (one Aho-Corasick automaton each), weights and prompts are compiled
+# once per server process
+@st.cache_resource
+def get_styles():
+    return get_style_registry()
+
+def get_partner_engine():
+    """Engine for the partner style this session is practising with"""
+    return get_styles().get(st.session_state.partner_style)
+
 # Initialize session state
-if 'conversation' not in st.session_state:
-    st.session_state.conversation = []
+if 'history' not in st.session_state:
+    st.session_state.history = ConversationHistory()  # Token-budgeted prompt window
+if 'prefix_tracker' not in st.session_state:
+    st.session_state.prefix_tracker = PrefixTracker()
+if 'partner_style' not in st.session_state:
+    st.session_state.partner_style = os.environ.get("PARTNER_STYLE", "avoidant")
 if 'avoidance_level' not in st.session_state:
-    st.session_state.avoidance_level = 0.6
+    st.session_state.avoidance_level = get_partner_engine().initial_level
 if 'client' not in st.session_state:
     st.session_state.client = None
+if 'last_feedback' not in st.session_state:
+    st.session_state.last_feedback = None
+if 'session_id' not in st.session_state:
+    # ?session=<id> resumes a stored conversation after a restart or on another worker
+    session = get_session_store().get_session(st.query_params.get("session", ""))
+    if session is not None:
+        st.session_state.session_id = session["id"]
+        if session["style"] in get_styles():
+            st.session_state.partner_style = session["style"]
+        st.session_state.avoidance_level = session["level"]
+        restore_history(st.session_state.history, get_session_store().turns(session["id"]))
+    else:
+        st.session_state.session_id = get_session_store().create_session(
+            st.session_state.partner_style, st.session_state.avoidance_level)
+    st.query_params["session"] = st.session_state.session_id
 
-# Load prompts function (since it was missing from the original)
-def load_agent_prompts():
-    return {
-        "avoidant": """You are simulating an avoidant attachment partner in a relationship. You tend to:
-        - Avoid taking on responsibilities when possible
-        - Deflect requests back to your partner
-        - Make excuses when asked to do tasks
-        - Become defensive when pressed
-        - Prefer independence and autonomy
-        - Get uncomfortable with emotional pressure
-        
-        Respond as this partner would in conversation. Keep responses natural and realistic."""
-    }
-
-# Real conversation patterns (same as original)
-REAL_CONVERSATION_PATTERNS = {
-    "deflection_phrases": ["pharmacy will ask", "they might want", "i dont have time", "im busy"],
-    "counter_deflection": ["why cant you", "why dont you", "you should", "its your turn"],
-    "excuse_challenging": ["i dont think they will", "that wont happen", "youre overthinking"],
-    "pressing_patterns": ["why cant you just", "give me one reason", "tell me why"],
-    
-    "emotional_escalation": [
-        "crying", "this is ridiculous", "i give up", "whatever", 
-        "fuck", "fck", "shit", "damn", "hate", "can't stand", 
-        "fed up", "done with", "over it", "stupid", "crazy",
-        "mad", "angry", "frustrated", "pissed","sad","anxious","embarassed"
-    ],
-    
-    "personal_attacks": [
-        "too much ego", "selfish", "you always", "you never", 
-        "go fuck", "fck ur", "screw you", "hate you", 
-        "piece of shit", "asshole", "not meant", "wrong person", 
-        "waste of time", "useless", "pathetic", "loser", 
-        "idiot", "stupid", "moron", "dumb", "useless"
-    ],
-    
-    "relationship_threats": [
-        "leave this marriage", "leave me", "want a divorce",
-        "not meant to", "break up", "leave you", "find someone", 
-        "better than you", "done with you", "can't do this", 
-        "want out", "end this", "we're done", "it's over","we're done"
-    ],
-    
-    "respectful_requests": ["can you", "could you", "would you mind", "please"],
-    "space_giving": ["when you're ready", "no pressure", "take your time", "if you want"],
-    "validation": ["i understand", "that makes sense", "i appreciate", "thank you"],
-    "collaborative": ["let's", "we could", "together", "what do you think"]
-}
+def get_trigger_matcher():
+    return get_partner_engine().matcher
 
 def analyze_real_patterns(user_input):
     """Enhanced trigger detection that catches hostile language"""
-    user_lower = user_input.lower()
-    
-    triggers = {
-        'deflection_challenge': 0,
-        'counter_deflection': 0, 
-        'pressing_behavior': 0,
-        'emotional_escalation': 0,
-        'personal_attack': 0,
-        'relationship_threat': 0,
-        'positive_communication': 0,
-        'space_giving': 0,
-        'validation': 0
-    }
-    
-    # Check all negative triggers
-    for phrase in REAL_CONVERSATION_PATTERNS["excuse_challenging"]:
-        if phrase in user_lower:
-            triggers['deflection_challenge'] += 1
-    
-    for phrase in REAL_CONVERSATION_PATTERNS["counter_deflection"]:
-        if phrase in user_lower:
-            triggers['counter_deflection'] += 1
-    
-    for phrase in REAL_CONVERSATION_PATTERNS["pressing_patterns"]:
-        if phrase in user_lower:
-            triggers['pressing_behavior'] += 1
-    
-    for phrase in REAL_CONVERSATION_PATTERNS["emotional_escalation"]:
-        if phrase in user_lower:
-            triggers['emotional_escalation'] += 1
-    
-    for phrase in REAL_CONVERSATION_PATTERNS["personal_attacks"]:
-        if phrase in user_lower:
-            triggers['personal_attack'] += 1
-    
-    for phrase in REAL_CONVERSATION_PATTERNS["relationship_threats"]:
-        if phrase in user_lower:
-            triggers['relationship_threat'] += 1
-    
-    # Check positive triggers
-    for phrase in REAL_CONVERSATION_PATTERNS["respectful_requests"]:
-        if phrase in user_lower:
-            triggers['positive_communication'] += 1
-    
-    for phrase in REAL_CONVERSATION_PATTERNS["space_giving"]:
-        if phrase in user_lower:
-            triggers['space_giving'] += 1
-    
-    for phrase in REAL_CONVERSATION_PATTERNS["validation"]:
-        if phrase in user_lower:
-            triggers['validation'] += 1
-    
-    return triggers
+    # TRIGGER_MODEL only sits in front of the avoidant lexicon it was trained for
+    return get_partner_engine().analyze(user_input)
 
 def adjust_avoidance_with_real_data(triggers):
     """Proper avoidance adjustment"""
-    # EXTREME triggers first (override everything else)
-    if triggers['relationship_threat'] > 0:
-        st.session_state.avoidance_level = 0.95
-        return
-    
-    # Major triggers
-    if triggers['personal_attack'] > 0:
-        st.session_state.avoidance_level += 0.7 * triggers['personal_attack']
-    
-    if triggers['emotional_escalation'] > 0:
-        st.session_state.avoidance_level += 0.5 * triggers['emotional_escalation']
-    
-    # Regular triggers
-    if triggers['deflection_challenge'] > 0:
-        st.session_state.avoidance_level += 0.2
-    
-    if triggers['counter_deflection'] > 0:
-        st.session_state.avoidance_level += 0.3
-    
-    if triggers['pressing_behavior'] > 0:
-        st.session_state.avoidance_level += 0.4
-    
-    # Only apply positive adjustments if NO negative triggers
-    negative_triggers = sum(triggers[k] for k in ['deflection_challenge', 'counter_deflection', 
-                                                 'pressing_behavior', 'emotional_escalation', 
-                                                 'personal_attack', 'relationship_threat'])
-    
-    if negative_triggers == 0:
-        if triggers['positive_communication'] > 0:
-            st.session_state.avoidance_level -= 0.15 * triggers['positive_communication']
-        
-        if triggers['space_giving'] > 0:
-            st.session_state.avoidance_level -= 0.2 * triggers['space_giving']
+    engine = get_partner_engine()
+    st.session_state.avoidance_level = engine.step(AvoidanceState(st.session_state.avoidance_level), triggers).level
+
+def get_prompt_variants():
+    """The style's four adaptive prompts, rebuilt only when agent_profiles.json changes"""
+    # The registry is process-wide, so every session shares one set of variants per style
+    return get_partner_engine().variants
+
+def get_adaptive_prompt():
+    """Get adaptive prompt that makes partner ACTUALLY avoidant"""
+    return get_prompt_variants().full_prompt(st.session_state.avoidance_level)
+
+def render_avoidance_panel(panel):
+    """Current avoidance level and what it means"""
+    with panel.container():
+        st.metric("Avoidance Level", f"{st.session_state.avoidance_level:.1f}/1.0")
         
-        if triggers['validation'] > 0:
-            st.session_state.avoidance_level -= 0.1 * triggers['validation']
+        # Avoidance level interpretation
+        if st.session_state.avoidance_level > 0.8:
+            st.error("🔴 CRITICAL: Highly defensive!")
+        elif st.session_state.avoidance_level > 0.6:
+            st.warning("🟡 HIGH: Entering defensive territory")
+        elif st.session_state.avoidance_level > 0.4:
+            st.info("🔵 MODERATE: Cautious but manageable")
+        else:
+            st.success("🟢 LOW: Comfortable and open")
         
-        # Gradual decrease for neutral interactions
-        st.session_state.avoidance_level -= 0.05
-    
-    # Keep within bounds
-    st.session_state.avoidance_level = max(0.1, min(0.95, st.session_state.avoidance_level))
+        # Stable prefixes are what let the provider reuse its prompt cache
+        tracker = st.session_state.prefix_tracker
+        st.caption(f"Prompt prefix changed {tracker.prefix_changes}× in {tracker.requests} requests")
 
-def get_real_pattern_coaching(triggers):
-    """Coaching that properly handles extreme situations"""
-    
-    # Handle extreme cases first
-    if triggers['relationship_threat'] > 0:
-        return "🆘 RELATIONSHIP THREAT: You just threatened the relationship! This is extremely damaging. Immediate damage control needed."
-    
-    if triggers['personal_attack'] > 0:
-        return "💥 PERSONAL ATTACK: You just attacked them personally with hostile language. This causes maximum avoidance and relationship damage."
-    
-    if triggers['emotional_escalation'] > 0:
-        return "🔥 EMOTIONAL EXPLOSION: You're using hostile, aggressive language. This will make them completely shut down."
-    
-    # Regular triggers
-    if triggers['deflection_challenge'] > 0:
-        return "🚨 STOP: You're challenging their deflection! This escalates conflict. Accept their excuse and offer to handle it yourself."
-    
-    if triggers['counter_deflection'] > 0:
-        return "🔴 DEFLECTION BATTLE: You're both avoiding responsibility. Someone needs to step up. Try: 'You know what, I'll just handle it'"
-    
-    if triggers['pressing_behavior'] > 0:
-        return "⚠️ PRESSING TRIGGER: This is exactly what led to defensive escalation. Step back now!"
-    
-    # Positive feedback
-    if triggers['space_giving'] > 0:
-        return "🌟 EXCELLENT: You're giving them space and autonomy. This is exactly what avoidant partners need!"
-    
-    if triggers['positive_communication'] > 0:
-        return "✅ GREAT APPROACH: You're using respectful, non-triggering language. Keep this up!"
-    
-    if triggers['validation'] > 0:
-        return "💚 GOOD VALIDATION: You're acknowledging their perspective. This builds trust!"
-    
-    return "💡 Neutral communication - no major triggers detected"
+@st.cache_resource
+def get_shared_client_registry():
+    """OpenAI clients keyed on a hash of the API key, on one pooled HTTP client"""
+    return get_client_registry()
 
-def get_real_data_suggestions(triggers, avoidance_level):
-    """Context-appropriate suggestions"""
-    
-    # Extreme damage control
-    if triggers['relationship_threat'] > 0:
-        return [
-            "I'm sorry, I didn't mean that about leaving",
-            "I was angry and said something I don't mean", 
-            "I don't actually want to end our marriage",
-            "Can we please talk when I'm calmer?"
-        ]
-    
-    if triggers['personal_attack'] > 0:
-        return [
-            "I'm so sorry for calling you names",
-            "That was completely out of line",
-            "I don't actually think those things about you",
-            "I need to apologize for attacking you personally"
-        ]
-    
-    if triggers['emotional_escalation'] > 0:
-        return [
-            "I'm sorry for getting so heated",
-            "I need to calm down before we continue",
-            "That came out wrong, I'm just frustrated",
-            "Let me try again when I'm not so angry"
-        ]
-    
-    # High avoidance situations
-    if avoidance_level > 0.8:
-        return [
-            "I'm sorry this got so heated",
-            "This isn't worth fighting about", 
-            "Let me just handle it myself",
-            "I didn't mean to make this difficult"
-        ]
-    
-    # When they're deflecting shared responsibilities
-    if triggers['counter_deflection'] > 0 or triggers['pressing_behavior'] > 0:
-        return [
-            "You know what, I'll just take care of it",
-            "Let me handle this one",
-            "No problem, I can do it myself",
-            "This doesn't need to be complicated"
-        ]
-    
-    # When challenging deflections
-    if triggers['deflection_challenge'] > 0:
-        return [
-            "That's totally understandable",
-            "No worries, I'll figure it out", 
-            "Makes sense, let me handle it",
-            "I get it, I'll take care of it"
-        ]
-    
-    # When they're being positive
-    if triggers['positive_communication'] > 0 or triggers['space_giving'] > 0:
-        return [
-            "Thanks for understanding",
-            "I appreciate you being flexible",
-            "Let me know what works for you",
-            "We can figure this out together"
-        ]
-    
-    # Default suggestions for normal conversations
-    return [
-        "I can handle this",
-        "Let me take care of it", 
-        "No big deal, I'll do it",
-        "Want to tackle this together?"
-    ]
+@st.cache_resource
+def get_response_cache():
+    """One reply cache shared by every session on this server"""
+    return ResponseCache()
 
-def get_adaptive_prompt():
-    """Get adaptive prompt that makes partner ACTUALLY avoidant"""
-    prompts = load_agent_prompts()
-    base_prompt = prompts["avoidant"]
+def render_cache_stats(panel, cache):
+    """Hit/miss counters for the reply cache"""
+    stats = cache.stats()
+    with panel.container():
+        hits_col, misses_col = st.columns(2)
+        hits_col.metric("Cache hits", stats["hits"])
+        misses_col.metric("Cache misses", stats["misses"])
+        st.caption(f"Hit rate {stats['hit_rate']:.0%} · {stats['disk_hits']} served from disk")
+
+def render_api_health(panel):
+    """Rolling latency percentiles and circuit state of the shared LLM caller"""
+    stats = default_caller.stats()
+    with panel.expander("📈 API latency"):
+        for label, key in (("Full reply", "latency"), ("First token", "first_token")):
+            snapshot = stats[key]
+            st.write(f"**{label}** ({snapshot['count']} calls)")
+            cols = st.columns(3)
+            for col, point in zip(cols, ("p50", "p95", "p99")):
+                col.metric(point, format_latency(snapshot[point]))
+        st.caption(f"Retries {stats['retries']} · errors {stats['latency']['errors']} · circuit {stats['breaker']}")
+
+# Coaching colour comes from the table's severity, not from the wording
+SEVERITY_RENDERERS = {
+    Severity.CRITICAL: st.error,
+    Severity.WARNING: st.warning,
+    Severity.NEUTRAL: st.info,
+    Severity.POSITIVE: st.success,
+}
+
+def render_feedback(severity, coaching, suggestions, personalized=False):
+    """Coaching and better alternatives for the last turn"""
+    SEVERITY_RENDERERS[severity](f"**Feedback:** {coaching}")
     
-    avoidant_behavior = """
+    st.write("**💡 Better alternatives:**" + (" *(written for this conversation)*" if personalized else ""))
+    for i, suggestion in enumerate(suggestions, 1):
+        st.write(f"{i}. \"{suggestion}\"")
 
-CRITICAL INSTRUCTIONS: You are an avoidant attachment partner. You MUST deflect responsibilities and avoid commitments:
+CHAT_PAGE_SIZE = 20  # turns rendered per page of chat history
 
-WHEN ASKED TO DO THINGS:
-- Make excuses: "I'm busy", "They'll ask for ID", "I don't have time"
-- Deflect back: "Why can't you do it?", "You're better at that stuff"
-- Avoid commitment: "Maybe later", "We'll see", "I'll think about it"
+HELP_TEXT = """
+**Goal**: Practice accepting deflections and taking initiative instead of escalating conflict.
 
-WHEN PRESSED OR CHALLENGED:
-- Become defensive: "I already told you why I can't"
-- Minimize: "It's not that big a deal", "You're overthinking this"
-- Withdraw: "I don't want to talk about this", "Let's just drop it"
+**❌ Avoid These Patterns:**
+- Challenging deflections
+- Asking "why can't you" repeatedly
+- Pressing for reasons when they're defensive
+- Using hostile or emotional language
 
-NEVER be immediately cooperative with shared responsibilities. Always deflect first.
+**✅ Try These Instead:**
+- "That makes sense, I'll handle it"
+- "No problem, I can take care of it"
+- "I understand, let me figure it out"
+- Use respectful requests with "please" or "could you"
 """
-    
-    if st.session_state.avoidance_level > 0.8:
-        return base_prompt + avoidant_behavior + " You're feeling very defensive and cornered. Give short, hostile responses and deflect aggressively."
-    elif st.session_state.avoidance_level > 0.6:
-        return base_prompt + avoidant_behavior + " You're feeling pressured. Make excuses and deflect the request back to them."
-    elif st.session_state.avoidance_level > 0.4:
-        return base_prompt + avoidant_behavior + " You're uncomfortable with the request. Give a polite excuse or deflection."
-    else:
-        return base_prompt + avoidant_behavior + " You prefer not to take on responsibilities. Make a reasonable excuse but stay somewhat pleasant."
+
+EXAMPLE_CONVERSATION = (
+    ("You", "will u buy me a pill?", 0.3),
+    ("Partner", "if i go, pharmacy will ask for id", 0.6),
+    ("You", "i dont think they will ask", 0.7, "🚨 Deflection challenge"),
+    ("Partner", "why cant u buy it?", 0.8, "🚨 Counter-deflection"),
+    ("You", "i dont know which one to buy", 0.7),
+    ("Partner", "u can ask it in the pharmacy", 0.8),
+    ("You", "y cant u buy?", 0.9, "🚨 Pressing behavior"),
+    ("Partner", "tell me a reason y u cant buy", 0.95, "🚨 Defensive demand"),
+    ("You", "crying", 1.0, "🚨 Emotional overwhelm"),
+    ("Partner", "u hve too much ego", 1.0, "🚨 Personal attack"),
+)
+
+@st.cache_data
+def example_markdown():
+    """The escalation example as one markdown block, built once per server process"""
+    lines = []
+    for item in EXAMPLE_CONVERSATION:
+        if len(item) == 4:
+            speaker, msg, avoidance, trigger = item
+            lines.append(f"**{speaker}:** {msg} → *{trigger}*")
+        else:
+            speaker, msg, avoidance = item
+            lines.append(f"**{speaker}:** {msg}")
+    return "  \n".join(lines)
+
+def record_render(name, started, excluded_seconds=0.0):
+    """Add one run to the render-time counters shown next to the chat"""
+    elapsed_ms = (time.perf_counter() - started - excluded_seconds) * 1000
+    stats = st.session_state.render_stats.setdefault(name, {"runs": 0, "last_ms": 0.0, "total_ms": 0.0})
+    stats["runs"] += 1
+    stats["last_ms"] = elapsed_ms
+    stats["total_ms"] += elapsed_ms
+
+def render_timings():
+    """How often each part of the page was rebuilt and what it cost"""
+    parts = []
+    for name, label in (("chat", "chat pane"), ("page", "full page")):
+        stats = st.session_state.render_stats.get(name)
+        if stats:
+            parts.append(f"{label} {stats['runs']}× (last {stats['last_ms']:.0f} ms, "
+                         f"avg {stats['total_ms'] / stats['runs']:.0f} ms)")
+    if parts:
+        st.caption("Rendered: " + " · ".join(parts))
+
+def start_new_conversation():
+    """Empty history and a new stored session at the partner style's starting level"""
+    engine = get_partner_engine()
+    st.session_state.history.clear()
+    st.session_state.avoidance_level = engine.initial_level
+    st.session_state.last_feedback = None
+    st.session_state.session_id = get_session_store().create_session(engine.name, engine.initial_level)
+    st.query_params["session"] = st.session_state.session_id
+    st.session_state.chat_pages = 1
+    st.session_state.pop('visible_turns', None)
+
+def load_visible_turns():
+    """Most recent page(s) of the stored transcript"""
+    store = get_session_store()
+    session = store.get_session(st.session_state.session_id)
+    turn_count = session["turn_count"] if session else 0
+    start = max(0, turn_count - st.session_state.chat_pages * CHAT_PAGE_SIZE)
+    st.session_state.first_visible_turn = start
+    st.session_state.visible_turns = store.turns(st.session_state.session_id, start)
+
+def render_turn(user_message, reply):
+    st.chat_message("user").write(f"**You:** {user_message}")
+    if reply is not None:
+        st.chat_message("assistant").write(f"**Partner:** {reply}")
+
+def run_turn(user_input, stream_replies, response_cache, trace, reply_candidates=1,
+             personalized_suggestions=False):
+    """Analyze one message, stream the reply and log the turn; returns seconds spent waiting on the model"""
+    # Analyze patterns and adjust avoidance
+    with trace.span("analyze"):
+        triggers = analyze_real_patterns(user_input)
+    level_before = st.session_state.avoidance_level
+    with trace.span("adjust"):
+        adjust_avoidance_with_real_data(triggers)
+
+    # Feedback only depends on the triggers, so it is ready before the first token arrives
+    with trace.span("feedback"):
+        mask = trigger_mask(triggers)
+        severity, coaching = coaching_for(mask)
+        suggestions = suggestions_for(mask, st.session_state.avoidance_level)
+
+    with trace.span("prompt"):
+        # The system prompt is the same for every band; the level rides in a trailing directive
+        variants = get_prompt_variants()
+        history = st.session_state.history
+        history.set_system_prompt(variants.prefix)
+
+        # Add user message
+        history.append("user", user_input)
+        messages = variants.request_messages(history.messages(), st.session_state.avoidance_level)
+        st.session_state.prefix_tracker.observe(messages)
+
+    st.chat_message("user").write(f"**You:** {user_input}")
+
+    # Rewrites are written on a worker thread while the reply is generated
+    pending = PendingSuggestions(
+        st.session_state.client, history.messages(), user_input, coaching, suggestions,
+        cache=response_cache, trace=trace,
+    ) if personalized_suggestions else None
+
+    reply = None
+    started = time.perf_counter()
+    try:
+        # Generate response
+        with trace.span("llm"), st.chat_message("assistant"):
+            if reply_candidates > 1:
+                # Candidates are ranked once they have all arrived, so there is nothing to stream
+                reply = create_ranked_reply(st.session_state.client, messages,
+                                            st.session_state.avoidance_level,
+                                            candidates=reply_candidates,
+                                            cache=response_cache, trace=trace)
+                st.write(f"**Partner:** {reply}")
+            elif stream_replies:
+                label = "**Partner:** "
+                tokens = stream_reply(st.session_state.client, messages,
+                                      cache=response_cache, trace=trace)
+                reply = st.write_stream(chain([label], tokens)).removeprefix(label).strip()
+            else:
+                reply = create_reply(st.session_state.client, messages,
+                                     cache=response_cache, trace=trace)
+                st.write(f"**Partner:** {reply}")
+        llm_seconds = time.perf_counter() - started
+
+        # Add assistant response; older turns are summarized in the background
+        # once they leave the token budget
+        history.append("assistant", reply)
+        personalized = False
+        if pending is not None:
+            with trace.span("feedback"):
+                suggestions, personalized = pending.result()
+        st.session_state.last_feedback = (severity, coaching, suggestions, personalized)
+    except Exception as e:
+        llm_seconds = time.perf_counter() - started
+        st.session_state.last_feedback = None
+        trace.error = type(e).__name__
+        st.error(f"Error generating response: {str(e)}")
+
+    with trace.span("store"):
+        get_session_store().append_turn(
+            st.session_state.session_id, user_input, reply, triggers, level_before,
+            st.session_state.avoidance_level, coaching,
+            llm_seconds * 1000 if reply is not None else None)
+
+    # Keep the rendered window to the pages being shown
+    visible = st.session_state.visible_turns
+    visible.append({"user_message": user_input, "reply": reply})
+    overflow = len(visible) - st.session_state.chat_pages * CHAT_PAGE_SIZE
+    if overflow > 0:
+        del visible[:overflow]
+        st.session_state.first_visible_turn += overflow
+    return llm_seconds
+
+@st.fragment
+def chat_pane(stream_replies, response_cache, show_timing, reply_candidates=1,
+               personalized_suggestions=False):
+    """Chat, level and feedback; a new message reruns only this fragment, not the whole page"""
+    started = time.perf_counter()
+    llm_seconds = 0.0
+    trace = None
+
+    chat_col, status_col = st.columns([3, 1])
+    with status_col:
+        avoidance_panel = st.empty()
+        feedback_panel = st.container()
+        health_panel = st.container()
+
+    with chat_col:
+        if 'visible_turns' not in st.session_state:
+            load_visible_turns()
+
+        # Older turns are only fetched from the store when asked for
+        if st.session_state.first_visible_turn > 0:
+            # Fixed label: a label that changes with the count would be a new widget every run
+            if st.button("⬆️ Show earlier messages", key="show_earlier"):
+                st.session_state.chat_pages += 1
+                load_visible_turns()
+            st.caption(f"{st.session_state.first_visible_turn} earlier turns not shown")
+
+        for turn in st.session_state.visible_turns:
+            render_turn(turn["user_message"], turn["reply"])
+
+        # Input for new message
+        if not st.session_state.client:
+            st.warning("⚠️ Please enter your OpenAI API key in the sidebar to start the conversation.")
+        else:
+            user_input = st.chat_input("Type your message to your partner...")
+            if user_input:
+                trace = get_tracer().start_turn(st.session_state.session_id, frontend="streamlit")
+                llm_seconds = run_turn(user_input, stream_replies, response_cache, trace,
+                                       reply_candidates, personalized_suggestions)
+
+    render_started = time.perf_counter()
+    render_avoidance_panel(avoidance_panel)
+    # Coaching and suggestions for the last turn stay visible until the next one
+    if st.session_state.last_feedback:
+        with feedback_panel:
+            render_feedback(*st.session_state.last_feedback)
+    render_api_health(health_panel)
+    if response_cache is not None:
+        render_cache_stats(health_panel, response_cache)
+    if trace is not None:
+        trace.record("render", time.perf_counter() - render_started)
+        st.session_state.last_trace = get_tracer().finish(trace, error=trace.error)
+
+    # Model wait time is excluded so the counter reflects rendering work only
+    record_render("chat", started, llm_seconds)
+    with health_panel:
+        render_timings()
+        if show_timing and st.session_state.get('last_trace'):
+            st.caption(f"⏱️ Last turn {st.session_state.last_trace.breakdown()}")
 
 # Streamlit UI
-st.title("🎯 Avoidant Communication Trainer")
-st.subheader("Practice healthy communication with avoidant attachment patterns")
+page_started = time.perf_counter()
+if 'render_stats' not in st.session_state:
+    st.session_state.render_stats = {}
+if 'chat_pages' not in st.session_state:
+    st.session_state.chat_pages = 1
+
+st.title(f"🎯 {st.session_state.partner_style.title()} Communication Trainer")
+st.subheader(f"Practice healthy communication with {st.session_state.partner_style} attachment patterns")
 
 # Sidebar for API key and controls
 with st.sidebar:
@@ -317,158 +405,71 @@ with st.sidebar:
     # API Key input
     api_key = st.text_input("OpenAI API Key", type="password", help="Enter your OpenAI API key")
     
+    # Point at any OpenAI-compatible server, e.g. mock_llm_server.py for load tests
+    base_url = st.text_input("API base URL", value=os.environ.get("OPENAI_BASE_URL", ""),
+                             help="Leave empty for the public OpenAI API")
+    
     if api_key:
         try:
-            st.session_state.client = OpenAI(api_key=api_key)
+            # Reuses the pooled client for this key instead of rebuilding it every rerun
+            st.session_state.client = get_shared_client_registry().get(api_key, base_url or None)
             st.success("✅ API key set!")
         except Exception as e:
             st.error(f"❌ Error setting API key: {str(e)}")
     
-    st.divider()
+    # Every style is already compiled; switching starts a new conversation with that partner
+    st.selectbox("Partner style", get_styles().styles, key="partner_style",
+                 on_change=start_new_conversation)
     
-    # Current avoidance level
-    st.metric("Avoidance Level", f"{st.session_state.avoidance_level:.1f}/1.0")
+    # Render tokens into the chat bubble as they arrive
+    stream_replies = st.checkbox("Stream replies", value=True)
     
-    # Avoidance level interpretation
-    if st.session_state.avoidance_level > 0.8:
-        st.error("🔴 CRITICAL: Highly defensive!")
-    elif st.session_state.avoidance_level > 0.6:
-        st.warning("🟡 HIGH: Entering defensive territory")
-    elif st.session_state.avoidance_level > 0.4:
-        st.info("🔵 MODERATE: Cautious but manageable")
-    else:
-        st.success("🟢 LOW: Comfortable and open")
+    # Several replies from one request; the most in-character one for the current level is shown
+    reply_candidates = int(st.number_input(
+        "Reply candidates", min_value=1, max_value=5, value=1,
+        help="Above 1, replies are ranked locally and not streamed",
+    ))
+    
+    # Model-written rewrites of each message, generated alongside the reply; the
+    # static suggestions are shown if they are not back in time
+    personalized_suggestions = st.checkbox("Personalized suggestions", value=False)
+    
+    # Serve identical prompts (replayed examples, scripted openers) without an API call
+    use_cache = st.checkbox("Cache replies", value=False)
+    response_cache = get_response_cache() if use_cache else None
+    
+    # Per-stage timing of the last turn under the chat stats
+    show_timing = st.checkbox("Show turn timing", value=False)
+    
+    # Older turns beyond this budget are folded into a running summary
+    st.session_state.history.token_budget = st.slider(
+        "History token budget", min_value=300, max_value=4000,
+        value=DEFAULT_TOKEN_BUDGET, step=100,
+    )
     
     st.divider()
     
     # Reset button
     if st.button("🔄 Reset Conversation"):
-        st.session_state.conversation = []
-        st.session_state.avoidance_level = 0.6
+        start_new_conversation()
         st.success("Conversation reset!")
         st.rerun()
     
     # Help section
     with st.expander("📚 How to Use"):
-        st.write("""
-        **Goal**: Practice accepting deflections and taking initiative instead of escalating conflict.
-        
-        **❌ Avoid These Patterns:**
-        - Challenging deflections
-        - Asking "why can't you" repeatedly  
-        - Pressing for reasons when they're defensive
-        - Using hostile or emotional language
-        
-        **✅ Try These Instead:**
-        - "That makes sense, I'll handle it"
-        - "No problem, I can take care of it"
-        - "I understand, let me figure it out"
-        - Use respectful requests with "please" or "could you"
-        """)
+        st.markdown(HELP_TEXT)
 
 # Main chat interface
 st.header("💬 Practice Conversation")
+chat_pane(stream_replies, response_cache, show_timing, reply_candidates, personalized_suggestions)
 
-# Display conversation history
-if st.session_state.conversation:
-    for i, message in enumerate(st.session_state.conversation[1:], 1):  # Skip system message
-        if message["role"] == "user":
-            st.chat_message("user").write(f"**You:** {message['content']}")
-        else:
-            st.chat_message("assistant").write(f"**Partner:** {message['content']}")
-
-# Input for new message
-if not st.session_state.client:
-    st.warning("⚠️ Please enter your OpenAI API key in the sidebar to start the conversation.")
-else:
-    user_input = st.chat_input("Type your message to your partner...")
-    
-    if user_input:
-        # Initialize conversation if empty
-        if not st.session_state.conversation:
-            st.session_state.conversation = [
-                {"role": "system", "content": get_adaptive_prompt()}
-            ]
-        
-        # Analyze patterns and adjust avoidance
-        triggers = analyze_real_patterns(user_input)
-        adjust_avoidance_with_real_data(triggers)
-        
-        # Update system prompt
-        st.session_state.conversation[0] = {"role": "system", "content": get_adaptive_prompt()}
-        
-        # Add user message
-        st.session_state.conversation.append({"role": "user", "content": user_input})
-        
-        try:
-            # Generate response
-            response = st.session_state.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=st.session_state.conversation,
-                temperature=0.7,
-                max_tokens=60,
-                frequency_penalty=0.3,
-                presence_penalty=0.1
-            )
-            
-            reply = response.choices[0].message.content.strip()
-            
-            # Add assistant response
-            st.session_state.conversation.append({"role": "assistant", "content": reply})
-            
-            # Manage conversation length
-            if len(st.session_state.conversation) > 12:
-                st.session_state.conversation = [st.session_state.conversation[0]] + st.session_state.conversation[-10:]
-            
-            # Display coaching and suggestions
-            st.success(f"**Partner:** {reply}")
-            
-            coaching = get_real_pattern_coaching(triggers)
-            if "EXCELLENT" in coaching or "GREAT" in coaching or "GOOD" in coaching:
-                st.success(f"**Feedback:** {coaching}")
-            elif "CRITICAL" in coaching or "ATTACK" in coaching or "EXPLOSION" in coaching:
-                st.error(f"**Feedback:** {coaching}")
-            elif "STOP" in coaching or "TRIGGER" in coaching:
-                st.warning(f"**Feedback:** {coaching}")
-            else:
-                st.info(f"**Feedback:** {coaching}")
-            
-            suggestions = get_real_data_suggestions(triggers, st.session_state.avoidance_level)
-            st.write("**💡 Better alternatives:**")
-            for i, suggestion in enumerate(suggestions, 1):
-                st.write(f"{i}. \"{suggestion}\"")
-            
-            st.rerun()
-            
-        except Exception as e:
-            st.error(f"Error generating response: {str(e)}")
-
-# Examples section
+# Examples section; static, and only rebuilt on full-page reruns
 with st.expander("📚 Real Conversation Example"):
     st.write("**Here's how a real conversation escalated:**")
-    
-    real_conv = [
-        ("You", "will u buy me a pill?", 0.3),
-        ("Partner", "if i go, pharmacy will ask for id", 0.6),
-        ("You", "i dont think they will ask", 0.7, "🚨 Deflection challenge"),
-        ("Partner", "why cant u buy it?", 0.8, "🚨 Counter-deflection"),  
-        ("You", "i dont know which one to buy", 0.7),
-        ("Partner", "u can ask it in the pharmacy", 0.8),
-        ("You", "y cant u buy?", 0.9, "🚨 Pressing behavior"),
-        ("Partner", "tell me a reason y u cant buy", 0.95, "🚨 Defensive demand"),
-        ("You", "crying", 1.0, "🚨 Emotional overwhelm"),
-        ("Partner", "u hve too much ego", 1.0, "🚨 Personal attack")
-    ]
-    
-    for item in real_conv:
-        if len(item) == 4:
-            speaker, msg, avoidance, trigger = item
-            st.write(f"**{speaker}:** {msg} → *{trigger}*")
-        else:
-            speaker, msg, avoidance = item
-            st.write(f"**{speaker}:** {msg}")
-    
+    st.markdown(example_markdown())
     st.success("**💡 What should have happened after the first deflection:**")
-    st.write("**Partner:** if i go, pharmacy will ask for id")
-    st.write("**You:** That's okay, I understand. I'll handle it")
-    st.write("**RESULT:** ✅ Problem solved, no escalation!")
\ No newline at end of file
+    st.markdown("**Partner:** if i go, pharmacy will ask for id  \n"
+                "**You:** That's okay, I understand. I'll handle it  \n"
+                "**RESULT:** ✅ Problem solved, no escalation!")
+
+record_render("page", page_started)
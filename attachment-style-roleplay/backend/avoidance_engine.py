@@ -0,0 +1,137 @@
+from trigger_engine import TRIGGER_CATEGORIES
+
+DEFAULT_AVOIDANCE_LEVEL = 0.6
+MIN_AVOIDANCE = 0.1
+MAX_AVOIDANCE = 0.95
+RELATIONSHIP_THREAT_LEVEL = 0.95
+
+NEGATIVE_TRIGGERS = (
+    'deflection_challenge', 'counter_deflection', 'pressing_behavior',
+    'emotional_escalation', 'personal_attack', 'relationship_threat',
+)
+
+# Per-trigger weights. "per_hit" scales with the number of phrases matched,
+# "flat" applies once if the trigger fired at all. Positive adjustments only
+# apply to turns with no negative triggers, followed by the neutral decay.
+# A relationship threat sets the level to "threat_level" outright.
+DEFAULT_WEIGHTS = {
+    'per_hit': {
+        'personal_attack': 0.7,
+        'emotional_escalation': 0.5,
+        'positive_communication': -0.15,
+        'space_giving': -0.2,
+        'validation': -0.1,
+    },
+    'flat': {
+        'deflection_challenge': 0.2,
+        'counter_deflection': 0.3,
+        'pressing_behavior': 0.4,
+    },
+    'neutral_decay': 0.05,
+    'threat_level': RELATIONSHIP_THREAT_LEVEL,
+}
+
+_POSITIVE_TRIGGERS = ('positive_communication', 'space_giving', 'validation')
+
+
+class AvoidanceState:
+    """Snapshot of the partner's avoidance between turns"""
+
+    __slots__ = ('level', 'turn')
+
+    def __init__(self, level=DEFAULT_AVOIDANCE_LEVEL, turn=0):
+        self.level = level
+        self.turn = turn
+
+    def __repr__(self):
+        return f"AvoidanceState(level={self.level:.2f}, turn={self.turn})"
+
+    def __eq__(self, other):
+        return (isinstance(other, AvoidanceState)
+                and self.level == other.level and self.turn == other.turn)
+
+
+def step(state, triggers, weights=DEFAULT_WEIGHTS):
+    """Pure transition: return the state after one user turn"""
+    if triggers['relationship_threat'] > 0:
+        # Relationship threats override everything else
+        return AvoidanceState(weights['threat_level'], state.turn + 1)
+
+    level = state.level
+    per_hit, flat = weights['per_hit'], weights['flat']
+
+    for name in ('personal_attack', 'emotional_escalation'):
+        if triggers[name] > 0:
+            level += per_hit[name] * triggers[name]
+
+    for name in ('deflection_challenge', 'counter_deflection', 'pressing_behavior'):
+        if triggers[name] > 0:
+            level += flat[name]
+
+    if sum(triggers[name] for name in NEGATIVE_TRIGGERS) == 0:
+        for name in _POSITIVE_TRIGGERS:
+            if triggers[name] > 0:
+                level += per_hit[name] * triggers[name]
+        level -= weights['neutral_decay']
+
+    level = max(MIN_AVOIDANCE, min(MAX_AVOIDANCE, level))
+    return AvoidanceState(level, state.turn + 1)
+
+
+def replay(trigger_matrix, initial_level=DEFAULT_AVOIDANCE_LEVEL,
+           weights=DEFAULT_WEIGHTS, lengths=None):
+    """Avoidance trajectories for many conversations at once.
+
+    trigger_matrix has shape (conversations, turns, categories) with the
+    categories in TRIGGER_CATEGORIES order; a 2-D (turns, categories) matrix is
+    treated as a single conversation. Turns are stepped in order but every
+    conversation advances together, so the cost is one vector op per turn
+    rather than one Python call per message. Returns a (conversations, turns)
+    array of the level after each turn; with ``lengths`` the padding turns past
+    each conversation's end hold its final level.
+    """
+    # NumPy is only needed for batch replays, not for the per-turn step()
+    import numpy as np
+
+    counts = np.asarray(trigger_matrix, dtype=np.float64)
+    single = counts.ndim == 2
+    if single:
+        counts = counts[np.newaxis]
+    n_conversations, n_turns, _ = counts.shape
+
+    column = {name: counts[:, :, i] for i, name in enumerate(TRIGGER_CATEGORIES)}
+    per_hit, flat = weights['per_hit'], weights['flat']
+
+    # One term per step() adjustment, added to the level in step()'s order so
+    # both round identically and land in the same band on boundary turns
+    terms = [per_hit[name] * column[name] for name in ('personal_attack', 'emotional_escalation')]
+    terms += [flat[name] * (column[name] > 0)
+              for name in ('deflection_challenge', 'counter_deflection', 'pressing_behavior')]
+    calm = sum(column[name] for name in NEGATIVE_TRIGGERS) == 0
+    terms += [np.where(calm, per_hit[name] * column[name], 0.0) for name in _POSITIVE_TRIGGERS]
+    terms.append(np.where(calm, -weights['neutral_decay'], 0.0))
+    threat = column['relationship_threat'] > 0
+
+    if lengths is None:
+        active = np.ones((n_conversations, n_turns), dtype=bool)
+    else:
+        active = np.arange(n_turns) < np.asarray(lengths)[:, np.newaxis]
+
+    trajectory = np.empty((n_conversations, n_turns))
+    level = np.broadcast_to(np.asarray(initial_level, dtype=np.float64),
+                            (n_conversations,)).copy()
+    for turn in range(n_turns):
+        moved = level
+        for term in terms:
+            moved = moved + term[:, turn]
+        moved = np.clip(moved, MIN_AVOIDANCE, MAX_AVOIDANCE)
+        moved = np.where(threat[:, turn], weights['threat_level'], moved)
+        level = np.where(active[:, turn], moved, level)
+        trajectory[:, turn] = level
+
+    return trajectory[0] if single else trajectory
+
+
+def triggers_to_row(triggers):
+    """Flatten a triggers dict into a row in TRIGGER_CATEGORIES order"""
+    return [triggers[name] for name in TRIGGER_CATEGORIES]
@@ -0,0 +1,285 @@
+"""Throughput budget for the per-turn hot path: trigger analysis, level update, feedback, prompt.
+
+    python attachment-style-roleplay/backend/benchmarks/hot_path.py            # check against baseline
+    python attachment-style-roleplay/backend/benchmarks/hot_path.py --update   # record a new baseline
+    python attachment-style-roleplay/backend/benchmarks/hot_path.py -k app/analyze
+
+Both copies of the pipeline are measured: avoidant_style.py (imported as is)
+and app.py, whose hot-path functions are lifted out of the script with
+ast so Streamlit never runs. Cases vary message length, lexicon size (the
+real lexicon plus synthetic phrases) and conversation length over seeded
+synthetic corpora. Each case reports ops/sec (best of several passes) and
+the peak bytes allocated per op under tracemalloc; a case fails when its
+throughput stays below the baseline by more than --tolerance after
+--retries re-measurements.
+"""
+import argparse
+import ast
+import functools
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "hot_path_baseline.json"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from avoidance_engine import DEFAULT_AVOIDANCE_LEVEL  # noqa: E402
+from trigger_engine import compile_trigger_matcher  # noqa: E402
+
+MESSAGE_WORDS = (5, 25, 100)
+EXTRA_PHRASES = (0, 500, 2000)
+CONVERSATION_TURNS = (10, 100)
+CORPUS_SIZE = 2000
+MIN_PASS_SECONDS = 0.1
+SEED = 7
+
+# Names app.py's hot path needs; everything else in the script is UI
+APP_NAMES = ("get_styles", "get_partner_engine", "get_trigger_matcher", "analyze_real_patterns",
+             "adjust_avoidance_with_real_data", "get_prompt_variants", "get_adaptive_prompt")
+
+FILLER = (
+    "the", "pharmacy", "today", "pick", "up", "meds", "after", "work", "tomorrow", "car",
+    "groceries", "dinner", "kids", "school", "call", "mom", "weekend", "bills", "later", "honestly",
+    "u", "ur", "y", "rn", "pls", "sooo", "cant", "dont", "im", "ok",
+)
+
+
+def load_app_copy():
+    """Run app.py's hot-path definitions against a minimal `st` namespace"""
+    source = (BACKEND_DIR / "app.py").read_text(encoding="utf-8")
+    body = []
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.ImportFrom):
+            body.append(node)
+        elif isinstance(node, ast.Assign) and any(
+                isinstance(target, ast.Name) and target.id in APP_NAMES for target in node.targets):
+            body.append(node)
+        elif isinstance(node, ast.FunctionDef) and node.name in APP_NAMES:
+            body.append(node)
+    st = SimpleNamespace(session_state=SimpleNamespace(avoidance_level=DEFAULT_AVOIDANCE_LEVEL,
+                                                       partner_style="avoidant"),
+                         cache_resource=functools.cache, cache_data=functools.cache)
+    namespace = {"st": st, "os": os, "__name__": "app_hot_path"}
+    exec(compile(ast.Module(body=body, type_ignores=[]), str(BACKEND_DIR / "app.py"), "exec"), namespace)
+
+    coaching_for, suggestions_for, trigger_mask = (
+        namespace["coaching_for"], namespace["suggestions_for"], namespace["trigger_mask"])
+
+    def reset():
+        st.session_state.avoidance_level = DEFAULT_AVOIDANCE_LEVEL
+
+    return SimpleNamespace(
+        name="app",
+        patterns=namespace["get_partner_engine"]().definition.lexicon,
+        matcher=namespace["get_trigger_matcher"](),
+        analyze=namespace["analyze_real_patterns"],
+        adjust=namespace["adjust_avoidance_with_real_data"],
+        # run_turn's feedback step
+        coaching=lambda triggers: coaching_for(trigger_mask(triggers))[1],
+        suggestions=lambda triggers, level: suggestions_for(trigger_mask(triggers), level),
+        adaptive_prompt=namespace["get_adaptive_prompt"],
+        level=lambda: st.session_state.avoidance_level,
+        reset=reset,
+    )
+
+
+def load_cli_copy():
+    import avoidant_style
+
+    def reset():
+        avoidant_style.avoidance_level = DEFAULT_AVOIDANCE_LEVEL
+
+    return SimpleNamespace(
+        name="cli",
+        patterns=avoidant_style.REAL_CONVERSATION_PATTERNS,
+        matcher=avoidant_style.TRIGGER_MATCHER,
+        analyze=avoidant_style.analyze_real_patterns,
+        adjust=avoidant_style.adjust_avoidance_with_real_data,
+        coaching=avoidant_style.get_real_pattern_coaching,
+        suggestions=avoidant_style.get_real_data_suggestions,
+        adaptive_prompt=avoidant_style.get_adaptive_prompt,
+        level=lambda: avoidant_style.avoidance_level,
+        reset=reset,
+    )
+
+
+def synthetic_messages(patterns, words, count, rng, hit_rate=0.3):
+    """Chat-like messages of about `words` words; some carry a lexicon phrase"""
+    phrases = [phrase for values in patterns.values() for phrase in values]
+    messages = []
+    for _ in range(count):
+        tokens = [rng.choice(FILLER) for _ in range(words)]
+        if rng.random() < hit_rate:
+            tokens[rng.randrange(words)] = rng.choice(phrases)
+        messages.append(" ".join(tokens))
+    return messages
+
+
+def padded_patterns(patterns, extra, rng):
+    """The lexicon plus `extra` made-up two-word phrases spread over its lists"""
+    padded = {name: list(values) for name, values in patterns.items()}
+    names = list(padded)
+    for index in range(extra):
+        word = "".join(rng.choice("bcdfghjklmnpqrstvwxz") for _ in range(5))
+        padded[names[index % len(names)]].append(f"{word} {rng.choice(FILLER)}")
+    return padded
+
+
+def measure(run, items, passes, min_pass_seconds=MIN_PASS_SECONDS, alloc_sample=200):
+    """(ops/sec, peak bytes per op): best of `passes` over items, then tracemalloc on a sample"""
+    # Cheap cases are looped until a pass is long enough for the timer to be trusted
+    started = time.perf_counter()
+    run(items)
+    loops = max(1, math.ceil(min_pass_seconds / max(time.perf_counter() - started, 1e-9)))
+
+    best = None
+    for _ in range(passes):
+        started = time.perf_counter()
+        for _ in range(loops):
+            run(items)
+        elapsed = (time.perf_counter() - started) / loops
+        best = elapsed if best is None else min(best, elapsed)
+
+    sample = items[:alloc_sample]
+    tracemalloc.start()
+    try:
+        peaks = []
+        for item in sample:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            run([item])
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return len(items) / best, sum(peaks) / len(peaks)
+
+
+def build_cases(copy, rng):
+    """(case name, run(items), items) for one copy of the pipeline"""
+    cases = []
+    medium = synthetic_messages(copy.patterns, MESSAGE_WORDS[1], CORPUS_SIZE, rng)
+
+    def uncached(analyze, matcher):
+        def run(messages):
+            # Every message is new to the scan cache, as in a live session
+            matcher.cache_clear()
+            for message in messages:
+                analyze(message)
+        return run
+
+    for words in MESSAGE_WORDS:
+        messages = synthetic_messages(copy.patterns, words, CORPUS_SIZE, rng)
+        cases.append((f"{copy.name}/analyze/{words}w", uncached(copy.analyze, copy.matcher), messages))
+
+    for extra in EXTRA_PHRASES[1:]:
+        matcher = compile_trigger_matcher(padded_patterns(copy.patterns, extra, rng), cache_size=0)
+        cases.append((f"{copy.name}/analyze/lexicon+{extra}", uncached(matcher.scan, matcher), medium))
+
+    repeated = medium[:50] * (CORPUS_SIZE // 50)
+
+    def cached(messages):
+        for message in messages:
+            copy.analyze(message)
+    cases.append((f"{copy.name}/analyze/repeated", cached, repeated))
+
+    triggers = [copy.matcher.scan(message) for message in medium]
+
+    def adjust(items):
+        copy.reset()
+        for item in items:
+            copy.adjust(item)
+    cases.append((f"{copy.name}/adjust", adjust, triggers))
+
+    def coaching(items):
+        for item in items:
+            copy.coaching(item)
+    cases.append((f"{copy.name}/coaching", coaching, triggers))
+
+    levels = [rng.uniform(0.1, 0.95) for _ in triggers]
+    paired = list(zip(triggers, levels))
+
+    def suggestions(items):
+        for item, level in items:
+            copy.suggestions(item, level)
+    cases.append((f"{copy.name}/suggestions", suggestions, paired))
+
+    def adaptive_prompt(items):
+        for _ in items:
+            copy.adaptive_prompt()
+    cases.append((f"{copy.name}/adaptive_prompt", adaptive_prompt, medium))
+
+    for turns in CONVERSATION_TURNS:
+        conversations = [medium[start:start + turns] for start in range(0, len(medium) - turns + 1, turns)]
+        flat = [(index == 0, message) for conversation in conversations
+                for index, message in enumerate(conversation)]
+
+        def turn(items):
+            copy.matcher.cache_clear()
+            for starts, message in items:
+                if starts:
+                    copy.reset()
+                found = copy.analyze(message)
+                copy.adjust(found)
+                level = copy.level()
+                copy.coaching(found)
+                copy.suggestions(found, level)
+                copy.adaptive_prompt()
+        cases.append((f"{copy.name}/turn/{turns}t", turn, flat))
+
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot-path throughput budget for the trainer")
+    parser.add_argument("--update", action="store_true", help="write the measured numbers as the new baseline")
+    parser.add_argument("--passes", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="allowed throughput drop relative to the baseline (0.3 = -30%%)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="re-measure a case that misses its floor this many times before failing it")
+    parser.add_argument("-k", "--filter", default="", help="only run cases whose name contains this")
+    args = parser.parse_args()
+
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    measured = {}
+    failures = []
+
+    for copy in (load_cli_copy(), load_app_copy()):
+        for name, run, items in build_cases(copy, random.Random(SEED)):
+            if args.filter not in name:
+                continue
+            ops, peak_bytes = measure(run, items, args.passes)
+            floor = baseline.get(name, {}).get("ops_per_sec")
+            # Shared and virtualized CPUs jitter; a real regression survives a second look
+            for _ in range(args.retries if floor is not None and not args.update else 0):
+                if ops >= floor * (1 - args.tolerance):
+                    break
+                ops = max(ops, measure(run, items, args.passes)[0])
+            measured[name] = {"ops_per_sec": round(ops), "peak_bytes_per_op": round(peak_bytes)}
+            status = "ok"
+            if floor is not None and ops < floor * (1 - args.tolerance):
+                status = f"FAIL (< {floor * (1 - args.tolerance):,.0f}/s)"
+                failures.append(name)
+            shown = f"{floor:,}" if floor is not None else "-"
+            print(f"{name:<30} {ops:>12,.0f}/s   {peak_bytes:>8,.0f} B/op   baseline {shown:>11}/s   {status}")
+
+    if args.update:
+        # Keep baselines for cases that were filtered out of this run
+        BASELINE_PATH.write_text(json.dumps({**baseline, **measured}, indent=2) + "\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+    if failures:
+        print(f"Hot-path throughput regressed: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,385 @@
+"""Self-play load generator: simulated trainees holding concurrent conversations with the partner.
+
+    python attachment-style-roleplay/backend/benchmarks/load_generator.py --sessions 200 --concurrency 50
+    python attachment-style-roleplay/backend/benchmarks/load_generator.py --backend openai \\
+        --base-url http://127.0.0.1:8600/v1                       # against mock_llm_server.py
+    python attachment-style-roleplay/backend/benchmarks/load_generator.py --api http://127.0.0.1:8000
+
+Each simulated trainee is an asyncio task that plays one full conversation
+under a policy:
+
+    respectful   requests, space and validation from the lexicon's positive lists
+    pressing     counter-deflections, pressing and excuse challenges
+    hostile      escalation, personal attacks and the odd relationship threat
+
+Messages are a household task plus a phrase drawn from the policy's lexicon
+lists, or come from --script (JSON: {"policy": ["message", ...]}, played in
+order and cycled). Sessions are assigned to policies round-robin.
+
+In process, every turn runs the trainer's pipeline on the session's own
+state with the --style engine from style_registry (default avoidant): its
+analyze() and step() (what adjust_avoidance_with_real_data applies to the
+CLI's global level), the band's request messages (what get_adaptive_prompt
+builds) and a completion. Policies draw their phrases from that style's
+lexicon. The completion comes from
+--backend stub (mock_llm_server's per-band replies after a simulated
+latency, no network) or openai (OPENAI_BASE_URL / --base-url, e.g. the mock
+server). With --api the same conversations go to a running api.py over HTTP,
+each session created with that style.
+
+The report gives sessions/sec and turns/sec, turn latency percentiles (and
+the time spent outside the completion) and the avoidance curve per policy:
+mean level by turn, mean final and peak level, how many sessions reached the
+top band and after how many turns. --output writes it as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from avoidance_engine import AvoidanceState  # noqa: E402
+from history import ConversationHistory, DEFAULT_TOKEN_BUDGET  # noqa: E402
+from prompt_variants import BAND_THRESHOLDS, avoidance_band  # noqa: E402
+from style_registry import DEFAULT_STYLE, get_style_registry  # noqa: E402
+from tracing import TurnTrace  # noqa: E402
+
+TOP_BAND = len(BAND_THRESHOLDS)
+# Default stub jitter as a share of the latency. The stub's latency is
+# lognormal with sigma = jitter / latency, so an absolute jitter larger than a
+# small latency would give a heavy tail of multi-second "round trips".
+STUB_JITTER_FRACTION = 0.25
+
+# (lexicon lists a policy draws phrases from, with their weights)
+POLICIES = {
+    "respectful": (("respectful_requests", 3), ("space_giving", 2), ("validation", 2), ("collaborative", 1)),
+    "pressing": (("counter_deflection", 2), ("pressing_patterns", 2), ("excuse_challenging", 1)),
+    "hostile": (("emotional_escalation", 3), ("personal_attacks", 3), ("relationship_threats", 1)),
+}
+
+TASKS = (
+    "pick up the meds", "call the pharmacy", "get groceries after work", "take the car in",
+    "pay the electric bill", "drop the kids at school", "sort out dinner", "call your mom back",
+    "book the dentist", "take the trash out",
+)
+
+PERCENTILES = (50, 90, 99)
+
+
+class LexiconPolicy:
+    """A task plus a phrase from the policy's lexicon lists, in one of a few shapes"""
+
+    def __init__(self, name, patterns):
+        self.name = name
+        self.sources = [(patterns[source], weight) for source, weight in POLICIES[name] if patterns.get(source)]
+
+    def message(self, rng, turn):
+        phrases = rng.choices([phrases for phrases, _ in self.sources],
+                              weights=[weight for _, weight in self.sources])[0]
+        phrase, task = rng.choice(phrases), rng.choice(TASKS)
+        return rng.choice((f"{phrase} {task}", f"{task}? {phrase}", f"{phrase}"))
+
+
+class ScriptedPolicy:
+    """Fixed messages played in order, cycling when the conversation runs longer"""
+
+    def __init__(self, name, messages):
+        self.name = name
+        self.messages = list(messages)
+
+    def message(self, rng, turn):
+        return self.messages[turn % len(self.messages)]
+
+
+class StubBackend:
+    """mock_llm_server's deterministic reply for the band, after a simulated round trip"""
+
+    def __init__(self, latency_ms=200.0, jitter_ms=None, seed=None):
+        from mock_llm_server import FaultProfile, pick_reply
+        if jitter_ms is None:
+            jitter_ms = STUB_JITTER_FRACTION * latency_ms
+        self._latency = FaultProfile(latency_ms=latency_ms, latency_jitter_ms=jitter_ms, seed=seed)
+        self._pick_reply = pick_reply
+
+    async def reply(self, messages):
+        await asyncio.sleep(self._latency.first_token_delay())
+        return self._pick_reply(messages)
+
+    async def aclose(self):
+        pass
+
+
+class OpenAIBackend:
+    def __init__(self, api_key=None, base_url=None):
+        from clients import AsyncClientRegistry
+        self.api_key = api_key
+        self.base_url = base_url
+        self.clients = AsyncClientRegistry()
+
+    async def reply(self, messages):
+        from llm import acreate_reply
+        return await acreate_reply(self.clients.get(self.api_key, self.base_url), messages)
+
+    async def aclose(self):
+        await self.clients.aclose()
+
+
+class SessionResult:
+    def __init__(self, policy):
+        self.policy = policy
+        self.levels = []
+        self.turn_seconds = []
+        self.pipeline_seconds = []
+        self.errors = 0
+
+
+async def play_in_process(policy, backend, turns, rng, session_id, think_seconds=0.0,
+                          initial_level=None, token_budget=DEFAULT_TOKEN_BUDGET, style=DEFAULT_STYLE):
+    """One conversation through the trainer's turn pipeline on this session's own state"""
+    engine = get_style_registry().get(style)
+    result = SessionResult(policy.name)
+    state = AvoidanceState(engine.initial_level if initial_level is None else initial_level)
+    history = ConversationHistory(engine.variants.prefix, token_budget=token_budget)
+    for turn in range(turns):
+        message = policy.message(rng, turn)
+        started = time.perf_counter()
+        trace = TurnTrace(session_id, frontend="load")
+        with trace.span("analyze"):
+            triggers = engine.analyze(message)
+        with trace.span("adjust"):
+            state = engine.step(state, triggers)
+        with trace.span("prompt"):
+            variants = engine.variants
+            history.set_system_prompt(variants.prefix)
+            history.append("user", message)
+            request = variants.request_messages(history.messages(), state.level)
+        try:
+            with trace.span("llm"):
+                reply = await backend.reply(request)
+        except Exception:
+            result.errors += 1
+            reply = None
+        trace.end()
+        elapsed = time.perf_counter() - started
+        stages = trace.stage_seconds()
+        result.levels.append(state.level)
+        result.turn_seconds.append(elapsed)
+        result.pipeline_seconds.append(elapsed - stages.get("llm", 0.0))
+        if reply is not None:
+            history.append("assistant", reply)
+        if think_seconds:
+            await asyncio.sleep(think_seconds)
+    return result
+
+
+async def play_over_http(policy, client, base_url, turns, rng, think_seconds=0.0, style=DEFAULT_STYLE):
+    """One conversation against a running api.py (non-streaming turns)"""
+    result = SessionResult(policy.name)
+    response = await client.post(f"{base_url}/sessions", json={"style": style})
+    response.raise_for_status()
+    session_id = response.json()["session_id"]
+    for turn in range(turns):
+        started = time.perf_counter()
+        response = await client.post(f"{base_url}/sessions/{session_id}/turns",
+                                     params={"stream": "0"}, json={"message": policy.message(rng, turn)})
+        elapsed = time.perf_counter() - started
+        body = response.json()
+        if response.status_code != 200:
+            result.errors += 1
+        if "avoidance_level" in body:
+            result.levels.append(body["avoidance_level"])
+        result.turn_seconds.append(elapsed)
+        llm_ms = body.get("timings_ms", {}).get("llm")
+        if llm_ms is not None:
+            result.pipeline_seconds.append(elapsed - llm_ms / 1000)
+        if think_seconds:
+            await asyncio.sleep(think_seconds)
+    return result
+
+
+def percentile(values, point):
+    """Nearest-rank percentile of a sorted list (as LatencyHistogram reads them)"""
+    if not values:
+        return None
+    last = len(values) - 1
+    return values[min(last, round(point / 100 * last))]
+
+
+def summarize(results, elapsed):
+    """Per-policy and overall throughput, latency and avoidance-curve statistics"""
+    def stats(group):
+        turn_seconds = sorted(s for result in group for s in result.turn_seconds)
+        pipeline_seconds = sorted(s for result in group for s in result.pipeline_seconds)
+        curves = [result.levels for result in group if result.levels]
+        longest = max((len(curve) for curve in curves), default=0)
+        mean_by_turn = []
+        for turn in range(longest):
+            at_turn = [curve[turn] for curve in curves if len(curve) > turn]
+            mean_by_turn.append(round(sum(at_turn) / len(at_turn), 4))
+        reached = [next((turn + 1 for turn, level in enumerate(curve) if avoidance_band(level) == TOP_BAND), None)
+                   for curve in curves]
+        reached_turns = [turn for turn in reached if turn is not None]
+        return {
+            "sessions": len(group),
+            "turns": len(turn_seconds),
+            "errors": sum(result.errors for result in group),
+            "sessions_per_sec": round(len(group) / elapsed, 2) if elapsed else None,
+            "turns_per_sec": round(len(turn_seconds) / elapsed, 2) if elapsed else None,
+            "turn_ms": {f"p{p}": _ms(percentile(turn_seconds, p)) for p in PERCENTILES},
+            "pipeline_ms": {f"p{p}": _ms(percentile(pipeline_seconds, p)) for p in PERCENTILES},
+            "avoidance": {
+                "mean_by_turn": mean_by_turn,
+                "final_mean": _mean([curve[-1] for curve in curves]),
+                "peak_mean": _mean([max(curve) for curve in curves]),
+                "reached_top_band": round(len(reached_turns) / len(curves), 4) if curves else None,
+                "turns_to_top_band": _mean(reached_turns),
+            },
+        }
+
+    by_policy = {}
+    for result in results:
+        by_policy.setdefault(result.policy, []).append(result)
+    return {"elapsed_sec": round(elapsed, 3),
+            "overall": stats(results),
+            "policies": {name: stats(group) for name, group in by_policy.items()}}
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def _mean(values):
+    return round(sum(values) / len(values), 4) if values else None
+
+
+def print_report(report, out=sys.stdout):
+    print(f"{'policy':<12}{'sessions':>9}{'sess/s':>9}{'turns/s':>10}{'errors':>8}"
+          f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'pipe p99':>10}"
+          f"{'final':>8}{'peak':>8}{'top band':>10}{'@turn':>7}", file=out)
+    rows = [*report["policies"].items(), ("overall", report["overall"])]
+    for name, stats in rows:
+        turn_ms, avoidance = stats["turn_ms"], stats["avoidance"]
+        print(f"{name:<12}{stats['sessions']:>9}{stats['sessions_per_sec']:>9}{stats['turns_per_sec']:>10}"
+              f"{stats['errors']:>8}{_fmt(turn_ms['p50']):>10}{_fmt(turn_ms['p90']):>10}"
+              f"{_fmt(turn_ms['p99']):>10}{_fmt(stats['pipeline_ms']['p99']):>10}"
+              f"{_fmt(avoidance['final_mean']):>8}{_fmt(avoidance['peak_mean']):>8}"
+              f"{_fmt(avoidance['reached_top_band']):>10}{_fmt(avoidance['turns_to_top_band']):>7}", file=out)
+    print(file=out)
+    for name, stats in report["policies"].items():
+        curve = " ".join(f"{level:.2f}" for level in stats["avoidance"]["mean_by_turn"])
+        print(f"{name:<12}mean level by turn: {curve}", file=out)
+
+
+def _fmt(value):
+    return "–" if value is None else f"{value:.2f}"
+
+
+def load_policies(names, patterns, script=None):
+    scripted = json.loads(Path(script).read_text(encoding="utf-8")) if script else {}
+    policies = []
+    for name in names:
+        if name in scripted:
+            policies.append(ScriptedPolicy(name, scripted[name]))
+        elif name in POLICIES:
+            policies.append(LexiconPolicy(name, patterns))
+        else:
+            raise SystemExit(f"unknown policy {name!r}: use {', '.join(POLICIES)} or add it to --script")
+    return policies
+
+
+async def run(args):
+    patterns = get_style_registry().get(args.style).definition.lexicon
+    policies = load_policies(args.policies.split(","), patterns, args.script)
+    client = backend = None
+    if args.api:
+        import httpx
+        client = httpx.AsyncClient(timeout=httpx.Timeout(args.timeout),
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    elif args.backend == "stub":
+        backend = StubBackend(args.stub_latency_ms, args.stub_jitter_ms, seed=args.seed)
+    else:
+        backend = OpenAIBackend(os.environ.get("OPENAI_API_KEY", "load-test"),
+                                args.base_url or os.environ.get("OPENAI_BASE_URL"))
+
+    queue = asyncio.Queue()
+    for index in range(args.sessions):
+        queue.put_nowait(index)
+    results = []
+    failures = []
+    think_seconds = args.think_ms / 1000
+
+    async def trainee():
+        while not queue.empty():
+            index = queue.get_nowait()
+            policy = policies[index % len(policies)]
+            # Every session has its own seeded stream, whatever order they finish in
+            rng = random.Random(f"{args.seed}:{index}")
+            try:
+                if client is not None:
+                    result = await play_over_http(policy, client, args.api.rstrip("/"), args.turns, rng,
+                                                  think_seconds, args.style)
+                else:
+                    result = await play_in_process(policy, backend, args.turns, rng, f"load-{index}",
+                                                   think_seconds, args.initial_level, style=args.style)
+                results.append(result)
+            except Exception as exc:
+                failures.append(f"session {index}: {exc}")
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(trainee() for _ in range(min(args.concurrency, args.sessions))))
+    finally:
+        if client is not None:
+            await client.aclose()
+        if backend is not None:
+            await backend.aclose()
+    elapsed = time.perf_counter() - started
+    return summarize(results, elapsed), failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent self-play load against the trainer's turn pipeline")
+    parser.add_argument("--sessions", type=int, default=100, help="conversations to play in total")
+    parser.add_argument("--concurrency", type=int, default=20, help="conversations in flight at once")
+    parser.add_argument("--turns", type=int, default=10, help="trainee messages per conversation")
+    parser.add_argument("--policies", default=",".join(POLICIES), help="comma-separated, assigned round-robin")
+    parser.add_argument("--script", help="JSON {policy: [messages]} for scripted policies")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between a reply and the next message")
+    parser.add_argument("--backend", choices=("stub", "openai"), default="stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=200.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=None,
+                        help=f"spread of the lognormal stub latency (default: {STUB_JITTER_FRACTION * 100:.0f}%% of it)")
+    parser.add_argument("--base-url", help="OpenAI-compatible base URL for --backend openai")
+    parser.add_argument("--api", help="drive a running api.py at this URL instead of the in-process pipeline")
+    parser.add_argument("--timeout", type=float, default=60.0, help="HTTP timeout per request with --api")
+    parser.add_argument("--style", default=DEFAULT_STYLE, choices=get_style_registry().styles,
+                        help="partner style to play against (default: %(default)s)")
+    parser.add_argument("--initial-level", type=float, default=None,
+                        help="starting level (default: the style's own)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("-o", "--output", help="write the report as JSON")
+    args = parser.parse_args()
+    if args.stub_jitter_ms is not None and args.stub_jitter_ms > args.stub_latency_ms:
+        parser.error("--stub-jitter-ms must not exceed --stub-latency-ms (the latency is lognormal)")
+
+    report, failures = asyncio.run(run(args))
+    target = args.api or (f"{args.backend} backend" + (
+        f", {args.stub_latency_ms:.0f} ms simulated latency" if args.backend == "stub" else ""))
+    print(f"{args.sessions} sessions × {args.turns} turns, {args.concurrency} concurrent, {target}: "
+          f"{report['elapsed_sec']:.2f}s\n")
+    print_report(report)
+    for failure in failures[:10]:
+        print(f"FAILED {failure}", file=sys.stderr)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
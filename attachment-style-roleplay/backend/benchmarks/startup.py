@@ -0,0 +1,105 @@
+"""Cold-start budget for the backend entry points, measured with `python -X importtime`.
+
+    python attachment-style-roleplay/backend/benchmarks/startup.py           # check against baseline
+    python attachment-style-roleplay/backend/benchmarks/startup.py --update  # record a new baseline
+
+Each module is imported in a fresh interpreter several times and the fastest
+cumulative import time is compared with startup_baseline.json. A module also
+fails if it pulls in one of the heavy packages that should only load on
+first use.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+REPO_ROOT = BACKEND_DIR.parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "startup_baseline.json"
+
+MODULES = (
+    "load_prompts",
+    "trigger_engine",
+    "avoidance_engine",
+    "llm",
+    "history",
+    "clients",
+    "avoidant_style",
+    "Sample_agent",
+)
+
+# Packages no entry point should import before it actually needs them
+DEFERRED_PACKAGES = ("openai", "httpx", "numpy", "langchain_core", "dotenv", "streamlit")
+
+
+def measure(module, runs=5):
+    """Fastest cumulative import time in ms and the top-level packages it loaded"""
+    env = {**os.environ, "PYTHONPATH": str(BACKEND_DIR)}
+    best = None
+    loaded = set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+        cumulative = None
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative_us, name = line[len("import time:"):].split("|")
+            name = name.strip()
+            loaded.add(name.split(".")[0])
+            if name == module:
+                cumulative = int(cumulative_us) / 1000.0
+        if cumulative is not None and (best is None or cumulative < best):
+            best = cumulative
+    return best, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget for backend entry points")
+    parser.add_argument("--update", action="store_true", help="write the measured times as the new baseline")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed slowdown relative to the baseline (0.5 = +50%%)")
+    parser.add_argument("--slack-ms", type=float, default=5.0,
+                        help="absolute allowance on top of the tolerance, for timer noise")
+    args = parser.parse_args()
+
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    measured = {}
+    failures = []
+
+    for module in MODULES:
+        ms, loaded = measure(module, args.runs)
+        measured[module] = round(ms, 2)
+        heavy = sorted(loaded.intersection(DEFERRED_PACKAGES))
+        budget = baseline.get(module)
+        limit = budget * (1 + args.tolerance) + args.slack_ms if budget is not None else None
+
+        status = "ok"
+        if heavy:
+            status = "FAIL (imports " + ", ".join(heavy) + ")"
+        elif limit is not None and ms > limit:
+            status = f"FAIL (> {limit:.1f} ms)"
+        if status != "ok":
+            failures.append(module)
+        shown = f"{budget:.1f}" if budget is not None else "-"
+        print(f"{module:<18} {ms:8.1f} ms   baseline {shown:>6} ms   {status}")
+
+    if args.update:
+        BASELINE_PATH.write_text(json.dumps(measured, indent=2) + "\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+    if failures:
+        print(f"Startup budget exceeded: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import hashlib
+import threading
+
+# One keep-alive pool shared by every OpenAI client in the process. httpx and
+# openai are imported on first use so entry points start without them.
+HTTP_LIMITS = {"max_connections": 100, "max_keepalive_connections": 20, "keepalive_expiry": 60.0}
+HTTP_TIMEOUT = {"timeout": 30.0, "connect": 5.0}
+
+
+def key_fingerprint(api_key):
+    """Stable digest used to key clients without keeping raw keys as dict keys"""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+class ClientRegistry:
+    """OpenAI clients reused per API key, all on one tuned HTTP pool"""
+
+    def __init__(self, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT):
+        self._limits = limits
+        self._timeout = timeout
+        self._http_client = None
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_key=None, base_url=None):
+        fingerprint = (key_fingerprint(api_key), base_url)
+        client = self._clients.get(fingerprint)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(fingerprint)
+            if client is None:
+                client = self._build(api_key, base_url)
+                self._clients[fingerprint] = client
+            return client
+
+    def _build(self, api_key, base_url):
+        from openai import OpenAI
+        if self._http_client is None:
+            import httpx
+            self._http_client = httpx.Client(limits=httpx.Limits(**self._limits),
+                                             timeout=httpx.Timeout(**self._timeout))
+        # Retries are handled by resilience.ResilientCaller, not the SDK
+        return OpenAI(api_key=api_key, base_url=base_url, http_client=self._http_client,
+                      max_retries=0)
+
+    def __len__(self):
+        return len(self._clients)
+
+    def close(self):
+        with self._lock:
+            self._clients.clear()
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+
+
+class AsyncClientRegistry(ClientRegistry):
+    """AsyncOpenAI clients on one httpx.AsyncClient; create and close it on the serving event loop"""
+
+    def _build(self, api_key, base_url):
+        from openai import AsyncOpenAI
+        if self._http_client is None:
+            import httpx
+            self._http_client = httpx.AsyncClient(limits=httpx.Limits(**self._limits),
+                                                  timeout=httpx.Timeout(**self._timeout))
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self._http_client,
+                           max_retries=0)
+
+    async def aclose(self):
+        with self._lock:
+            self._clients.clear()
+            http_client, self._http_client = self._http_client, None
+        if http_client is not None:
+            await http_client.aclose()
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def get_client_registry():
+    """Process-wide registry used by the CLI entry points"""
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = ClientRegistry()
+    return _default_registry
+
+
+def get_client(api_key=None, base_url=None):
+    return get_client_registry().get(api_key, base_url)
+
+
+def prefetch_client(api_key=None, base_url=None):
+    """Build the client on a daemon thread so the SDK import overlaps user input.
+
+    A later get_client() call for the same key waits for this one to finish;
+    errors are left for that call to raise.
+    """
+    def build():
+        try:
+            get_client(api_key, base_url)
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=build, name="client-prefetch", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,144 @@
+"""Coaching and suggestion tables for every trigger combination.
+
+The rules below are evaluated once at import for all 512 trigger masks (and
+each avoidance band for suggestions), so feedback for a turn is two tuple
+lookups. Results are shared tuples; callers must not mutate them.
+"""
+import enum
+
+from prompt_variants import BAND_THRESHOLDS, avoidance_band
+from trigger_engine import MASK_COUNT, TRIGGER_BITS, trigger_mask
+
+
+class Severity(enum.Enum):
+    """How the front-ends colour a piece of coaching"""
+
+    CRITICAL = "critical"
+    WARNING = "warning"
+    NEUTRAL = "neutral"
+    POSITIVE = "positive"
+
+
+# First trigger present wins, so extreme cases come first
+COACHING_RULES = (
+    ('relationship_threat', Severity.CRITICAL,
+     "🆘 RELATIONSHIP THREAT: You just threatened the relationship! This is extremely damaging. Immediate damage control needed."),
+    ('personal_attack', Severity.CRITICAL,
+     "💥 PERSONAL ATTACK: You just attacked them personally with hostile language. This causes maximum avoidance and relationship damage."),
+    ('emotional_escalation', Severity.CRITICAL,
+     "🔥 EMOTIONAL EXPLOSION: You're using hostile, aggressive language. This will make them completely shut down."),
+    ('deflection_challenge', Severity.WARNING,
+     "🚨 STOP: You're challenging their deflection! This escalates conflict. Accept their excuse and offer to handle it yourself."),
+    ('counter_deflection', Severity.WARNING,
+     "🔴 DEFLECTION BATTLE: You're both avoiding responsibility. Someone needs to step up. Try: 'You know what, I'll just handle it'"),
+    ('pressing_behavior', Severity.WARNING,
+     "⚠️ PRESSING TRIGGER: This is exactly what led to defensive escalation. Step back now!"),
+    ('space_giving', Severity.POSITIVE,
+     "🌟 EXCELLENT: You're giving them space and autonomy. This is exactly what avoidant partners need!"),
+    ('positive_communication', Severity.POSITIVE,
+     "✅ GREAT APPROACH: You're using respectful, non-triggering language. Keep this up!"),
+    ('validation', Severity.POSITIVE,
+     "💚 GOOD VALIDATION: You're acknowledging their perspective. This builds trust!"),
+)
+NEUTRAL_COACHING = (Severity.NEUTRAL, "💡 Neutral communication - no major triggers detected")
+
+# Top band: the partner is close to shutting down whatever was said
+HIGH_AVOIDANCE = "high_avoidance"
+HIGH_AVOIDANCE_BAND = len(BAND_THRESHOLDS)
+BAND_COUNT = len(BAND_THRESHOLDS) + 1
+
+# (triggers or HIGH_AVOIDANCE, suggestions); first match wins
+SUGGESTION_RULES = (
+    (('relationship_threat',), (
+        "I'm sorry, I didn't mean that about leaving",
+        "I was angry and said something I don't mean",
+        "I don't actually want to end our marriage",
+        "Can we please talk when I'm calmer?",
+    )),
+    (('personal_attack',), (
+        "I'm so sorry for calling you names",
+        "That was completely out of line",
+        "I don't actually think those things about you",
+        "I need to apologize for attacking you personally",
+    )),
+    (('emotional_escalation',), (
+        "I'm sorry for getting so heated",
+        "I need to calm down before we continue",
+        "That came out wrong, I'm just frustrated",
+        "Let me try again when I'm not so angry",
+    )),
+    (HIGH_AVOIDANCE, (
+        "I'm sorry this got so heated",
+        "This isn't worth fighting about",
+        "Let me just handle it myself",
+        "I didn't mean to make this difficult",
+    )),
+    (('counter_deflection', 'pressing_behavior'), (
+        "You know what, I'll just take care of it",
+        "Let me handle this one",
+        "No problem, I can do it myself",
+        "This doesn't need to be complicated",
+    )),
+    (('deflection_challenge',), (
+        "That's totally understandable",
+        "No worries, I'll figure it out",
+        "Makes sense, let me handle it",
+        "I get it, I'll take care of it",
+    )),
+    (('positive_communication', 'space_giving'), (
+        "Thanks for understanding",
+        "I appreciate you being flexible",
+        "Let me know what works for you",
+        "We can figure this out together",
+    )),
+)
+DEFAULT_SUGGESTIONS = (
+    "I can handle this",
+    "Let me take care of it",
+    "No big deal, I'll do it",
+    "Want to tackle this together?",
+)
+
+
+def _coaching(mask):
+    for name, severity, text in COACHING_RULES:
+        if mask & TRIGGER_BITS[name]:
+            return severity, text
+    return NEUTRAL_COACHING
+
+
+def _suggestions(mask, band):
+    for condition, suggestions in SUGGESTION_RULES:
+        if condition == HIGH_AVOIDANCE:
+            if band == HIGH_AVOIDANCE_BAND:
+                return suggestions
+        elif any(mask & TRIGGER_BITS[name] for name in condition):
+            return suggestions
+    return DEFAULT_SUGGESTIONS
+
+
+# COACHING_TABLE[mask] -> (Severity, text); SUGGESTION_TABLE[band][mask] -> suggestions
+COACHING_TABLE = tuple(_coaching(mask) for mask in range(MASK_COUNT))
+SUGGESTION_TABLE = tuple(
+    tuple(_suggestions(mask, band) for mask in range(MASK_COUNT)) for band in range(BAND_COUNT)
+)
+
+
+def coaching_for(mask):
+    """(Severity, text) for a trigger mask"""
+    return COACHING_TABLE[mask]
+
+
+def suggestions_for(mask, level):
+    """Better alternatives for a trigger mask at an avoidance level"""
+    return SUGGESTION_TABLE[avoidance_band(level)][mask]
+
+
+def get_real_pattern_coaching(triggers):
+    """Coaching text for a {category: count} dict"""
+    return COACHING_TABLE[trigger_mask(triggers)][1]
+
+
+def get_real_data_suggestions(triggers, avoidance_level):
+    """Suggestions for a {category: count} dict at an avoidance level"""
+    return SUGGESTION_TABLE[avoidance_band(avoidance_level)][trigger_mask(triggers)]
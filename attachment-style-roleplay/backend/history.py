@@ -0,0 +1,156 @@
+import threading
+from collections import deque
+
+DEFAULT_TOKEN_BUDGET = 1500
+SUMMARY_TOKEN_BUDGET = 200
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators the chat format adds per message
+MIN_RECENT_MESSAGES = 2      # never evict the turn being answered
+
+_summary_executor = None
+_executor_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Offline token estimate (~4 characters per token for English chat text)"""
+    return (len(text) + 3) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+def _get_summary_executor():
+    global _summary_executor
+    if _summary_executor is None:
+        with _executor_lock:
+            if _summary_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+    return _summary_executor
+
+
+def extractive_summary(previous, evicted, token_budget=SUMMARY_TOKEN_BUDGET, count_tokens=estimate_tokens):
+    """Fold evicted turns into the running summary without calling a model.
+
+    Keeps the opening lines (where an escalation usually starts) and the most
+    recent ones, dropping the middle once the summary outgrows its budget.
+    """
+    lines = previous.splitlines() if previous else []
+    for message in evicted:
+        speaker = "You" if message["role"] == "user" else "Partner"
+        lines.append(f"{speaker}: {message['content'][:160]}")
+
+    while len(lines) > 4 and sum(count_tokens(line) for line in lines) > token_budget:
+        # Drop from just after the opening exchange, leaving a gap marker
+        if lines[2] != "...":
+            lines.insert(2, "...")
+        del lines[3]
+    return "\n".join(lines)
+
+
+class ConversationHistory:
+    """Chat history kept under a token budget.
+
+    Messages are stored with their token counts in a deque, so a turn is an
+    append plus a few pops rather than a full list copy. Turns that fall out of
+    the window are folded into a running summary on a background worker; the
+    reply path only ever reads the latest finished summary and never waits.
+    """
+
+    def __init__(self, system_prompt="", token_budget=DEFAULT_TOKEN_BUDGET,
+                 summarizer=extractive_summary, count_tokens=estimate_tokens):
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self.count_tokens = count_tokens
+        self._system = {"role": "system", "content": system_prompt}
+        self._system_tokens = count_tokens(system_prompt)
+        self._turns = deque()
+        self._window_tokens = 0
+        self._summary = ""
+        self._summary_tokens = 0
+        self._pending = []
+        self._future = None
+        # Bumped by clear(); a summary of an older generation is never installed
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._turns)
+
+    @property
+    def summary(self):
+        return self._summary
+
+    @property
+    def system_prompt(self):
+        return self._system["content"]
+
+    def set_system_prompt(self, content):
+        if content != self._system["content"]:
+            self._system = {"role": "system", "content": content}
+            self._system_tokens = self.count_tokens(content)
+            self._trim()
+
+    def append(self, role, content):
+        message = {"role": role, "content": content}
+        tokens = self.count_tokens(content)
+        self._turns.append((message, tokens))
+        self._window_tokens += tokens
+        self._trim()
+
+    def messages(self):
+        """Messages to send: system prompt, running summary, then the window"""
+        result = [self._system]
+        summary = self._summary
+        if summary:
+            result.append({"role": "system", "content": f"Earlier in this conversation:\n{summary}"})
+        result.extend(message for message, _ in self._turns)
+        return result
+
+    def token_count(self):
+        return self._system_tokens + self._summary_tokens + self._window_tokens
+
+    def clear(self):
+        with self._lock:
+            self._turns.clear()
+            self._window_tokens = 0
+            self._summary = ""
+            self._summary_tokens = 0
+            self._pending = []
+            # A job still running summarizes the previous conversation
+            self._generation += 1
+
+    def wait_for_summary(self, timeout=None):
+        """Block until queued summarization finishes (for tests and replays)"""
+        while True:
+            future = self._future
+            if future is None:
+                return
+            future.result(timeout)
+
+    def _trim(self):
+        evicted = []
+        while (len(self._turns) > MIN_RECENT_MESSAGES
+               and self.token_count() > self.token_budget):
+            message, tokens = self._turns.popleft()
+            self._window_tokens -= tokens
+            evicted.append(message)
+        if evicted:
+            with self._lock:
+                self._pending.extend(evicted)
+                self._schedule()
+
+    def _schedule(self):
+        # Called with the lock held; one summarization job at a time per history
+        if self._future is None and self._pending:
+            batch, self._pending = self._pending, []
+            self._future = _get_summary_executor().submit(self._summarize, batch, self._generation)
+
+    def _summarize(self, batch, generation):
+        try:
+            summary = self.summarizer(self._summary, batch)
+        except Exception:
+            # Keep the previous summary; the turns are lost from it but the chat goes on
+            summary = self._summary
+        with self._lock:
+            if generation == self._generation:
+                self._summary = summary
+                self._summary_tokens = self.count_tokens(summary) if summary else 0
+            self._future = None
+            self._schedule()
@@ -0,0 +1,222 @@
+# Shared chat-completion helpers for the trainer front-ends
+from response_cache import make_cache_key
+from resilience import ResilientCaller
+from history import estimate_tokens
+from reply_ranker import pick_reply
+
+COMPLETION_PARAMS = {
+    "model": "gpt-4o-mini",
+    "temperature": 0.7,
+    "max_tokens": 60,
+    "frequency_penalty": 0.3,
+    "presence_penalty": 0.1,
+}
+
+# Shared by every session in the process: one breaker and one set of latency histograms
+default_caller = ResilientCaller()
+
+
+def create_reply(client, messages, cache=None, caller=None, trace=None, **overrides):
+    """Generate the partner's reply in one blocking call"""
+    caller = caller or default_caller
+    params = {**COMPLETION_PARAMS, **overrides}
+    if cache is not None:
+        key = make_cache_key(messages, params)
+        reply = cache.get(key)
+        _trace_cache(trace, messages, reply)
+        if reply is not None:
+            return reply
+
+    response = caller.call(
+        lambda timeout: client.chat.completions.create(messages=messages, timeout=timeout, **params)
+    )
+    reply = response.choices[0].message.content.strip()
+    _trace_tokens(trace, messages, reply)
+
+    if cache is not None:
+        cache.put(key, reply)
+    return reply
+
+
+def create_ranked_reply(client, messages, level, candidates=3, cache=None, caller=None, trace=None,
+                        **overrides):
+    """Request several candidates in one call and return the one that best fits the level.
+
+    Costs one round-trip instead of a regenerate-and-retry loop; the
+    candidates' scores and the pick are recorded on the trace.
+    """
+    caller = caller or default_caller
+    params = {**COMPLETION_PARAMS, "n": candidates, **overrides}
+    if cache is not None:
+        key = make_cache_key(messages, params)
+        reply = cache.get(key)
+        _trace_cache(trace, messages, reply)
+        if reply is not None:
+            return reply
+
+    response = caller.call(
+        lambda timeout: client.chat.completions.create(messages=messages, timeout=timeout, **params)
+    )
+    reply = _pick_candidate(response, level, messages, trace)
+
+    if cache is not None and reply:
+        cache.put(key, reply)
+    return reply
+
+
+def stream_reply(client, messages, cache=None, caller=None, trace=None, **overrides):
+    """Yield the partner's reply token by token as the API produces it"""
+    caller = caller or default_caller
+    params = {**COMPLETION_PARAMS, **overrides}
+    if cache is not None:
+        key = make_cache_key(messages, params)
+        reply = cache.get(key)
+        _trace_cache(trace, messages, reply)
+        if reply is not None:
+            yield reply
+            return
+
+    parts = []
+    for delta in _stream_deltas(client, messages, params, caller):
+        if trace is not None and not parts:
+            trace.mark("first_token")
+        parts.append(delta)
+        yield delta
+    _trace_tokens(trace, messages, "".join(parts))
+
+    # Only complete replies are cached; an interrupted stream never gets here
+    if cache is not None:
+        cache.put(key, "".join(parts).strip())
+
+
+def _trace_cache(trace, messages, reply):
+    if trace is not None:
+        trace.set(cache_hit=reply is not None)
+        if reply is not None:
+            trace.mark("first_token")
+            _trace_tokens(trace, messages, reply)
+
+
+def _trace_tokens(trace, messages, reply):
+    # Estimates: streamed responses carry no usage block
+    if trace is not None:
+        trace.set(tokens_in=sum(estimate_tokens(m["content"]) for m in messages),
+                  tokens_out=estimate_tokens(reply))
+
+
+def _pick_candidate(response, level, messages, trace):
+    replies = [(choice.message.content or "").strip() for choice in response.choices]
+    chosen, scores = pick_reply(replies, level)
+    if trace is not None:
+        # Every candidate was generated and billed, so all of them count as output tokens
+        trace.set(tokens_in=sum(estimate_tokens(m["content"]) for m in messages),
+                  tokens_out=sum(estimate_tokens(reply) for reply in replies),
+                  candidates=len(replies), chosen_candidate=chosen,
+                  candidate_scores=[round(score, 3) if score != float("-inf") else None
+                                    for score in scores])
+    # A response can come back without choices; that is an empty reply, not a crash
+    return replies[chosen] if chosen is not None else ""
+
+
+def _has_content(chunk):
+    return bool(chunk.choices and chunk.choices[0].delta.content)
+
+
+def _stream_deltas(client, messages, params, caller):
+    def open_stream(timeout):
+        return client.chat.completions.create(messages=messages, stream=True, timeout=timeout, **params)
+
+    started = False
+    for chunk in caller.stream(open_stream, first_item=_has_content):
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        if not started:
+            # Match create_reply, which strips the leading whitespace
+            delta = delta.lstrip()
+            if not delta:
+                continue
+            started = True
+        yield delta
+
+
+async def acreate_reply(client, messages, cache=None, caller=None, trace=None, **overrides):
+    """create_reply() for an AsyncOpenAI client"""
+    caller = caller or default_caller
+    params = {**COMPLETION_PARAMS, **overrides}
+    if cache is not None:
+        key = make_cache_key(messages, params)
+        reply = cache.get(key)
+        _trace_cache(trace, messages, reply)
+        if reply is not None:
+            return reply
+
+    response = await caller.acall(
+        lambda timeout: client.chat.completions.create(messages=messages, timeout=timeout, **params)
+    )
+    reply = response.choices[0].message.content.strip()
+    _trace_tokens(trace, messages, reply)
+
+    if cache is not None:
+        cache.put(key, reply)
+    return reply
+
+
+async def acreate_ranked_reply(client, messages, level, candidates=3, cache=None, caller=None,
+                               trace=None, **overrides):
+    """create_ranked_reply() for an AsyncOpenAI client"""
+    caller = caller or default_caller
+    params = {**COMPLETION_PARAMS, "n": candidates, **overrides}
+    if cache is not None:
+        key = make_cache_key(messages, params)
+        reply = cache.get(key)
+        _trace_cache(trace, messages, reply)
+        if reply is not None:
+            return reply
+
+    response = await caller.acall(
+        lambda timeout: client.chat.completions.create(messages=messages, timeout=timeout, **params)
+    )
+    reply = _pick_candidate(response, level, messages, trace)
+
+    if cache is not None and reply:
+        cache.put(key, reply)
+    return reply
+
+
+async def astream_reply(client, messages, cache=None, caller=None, trace=None, **overrides):
+    """stream_reply() for an AsyncOpenAI client"""
+    caller = caller or default_caller
+    params = {**COMPLETION_PARAMS, **overrides}
+    if cache is not None:
+        key = make_cache_key(messages, params)
+        reply = cache.get(key)
+        _trace_cache(trace, messages, reply)
+        if reply is not None:
+            yield reply
+            return
+
+    def open_stream(timeout):
+        return client.chat.completions.create(messages=messages, stream=True, timeout=timeout, **params)
+
+    parts = []
+    async for chunk in caller.astream(open_stream, first_item=_has_content):
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        if not parts:
+            delta = delta.lstrip()
+            if not delta:
+                continue
+        if trace is not None and not parts:
+            trace.mark("first_token")
+        parts.append(delta)
+        yield delta
+    _trace_tokens(trace, messages, "".join(parts))
+
+    if cache is not None:
+        cache.put(key, "".join(parts).strip())
@@ -1,15 +1,15 @@
-import json
-from pathlib import Path
-from langchain_core.prompts import PromptTemplate
-
-def load_agent_prompts(json_path: str = "attachment-style-roleplay/prompts/agent_profiles.json"):
-    with open(json_path, "r", encoding="utf-8") as f:
-        profiles = json.load(f)
-
-    prompt_templates = {}
-    for style, data in profiles.items():
-        prompt_templates[style] = PromptTemplate.from_template(
-            f"{data['prompt']}\n\You: {{input}}\nPartner:"
-        )
-    
-    return prompt_templates
+from prompt_registry import DEFAULT_PROFILES_PATH, SimpleTemplate, get_prompt_registry
+
+
+def load_agent_prompts(json_path=DEFAULT_PROFILES_PATH, use_langchain: bool = False):
+    # Parsed once per process by the registry; repeat calls reuse its templates
+    registry = get_prompt_registry(json_path)
+
+    if use_langchain:
+        # Only pay for importing LangChain when a caller actually wants its templates
+        from langchain_core.prompts import PromptTemplate
+        template_class = PromptTemplate
+    else:
+        template_class = SimpleTemplate
+
+    return registry.templates(template_class)
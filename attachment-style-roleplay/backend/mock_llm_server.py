@@ -0,0 +1,264 @@
+"""Local stand-in for the OpenAI chat completions API, for load testing.
+
+Run it and point the trainer at it:
+
+    python mock_llm_server.py --port 8600 --latency-ms 300 --tokens-per-sec 40
+    OPENAI_BASE_URL=http://127.0.0.1:8600/v1 OPENAI_API_KEY=mock python avoidant_style.py
+
+In the Streamlit app, put the same URL in the sidebar's "API base URL" field.
+Replies are deterministic: they depend on the avoidance band (read from the
+trailing level directive) and a hash of the last user message. Requests for
+personalized suggestions (suggestion_writer.py) get a list of rewrites.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from prompt_variants import BAND_DIRECTIVES
+from suggestion_writer import SUGGESTION_INSTRUCTIONS
+
+# Canned partner replies from lowest to highest avoidance band
+MOCK_REPLIES = (
+    ("I'd rather not, but maybe later?", "Can we see how the week goes first?",
+     "Hmm, I might be busy, but we'll see."),
+    ("I'm kind of busy today, sorry.", "They'll probably ask for ID, so it's easier if you go.",
+     "I don't really have time for that right now."),
+    ("Why can't you do it?", "You're better at that stuff anyway.",
+     "I already told you I'm busy."),
+    ("I don't want to talk about this.", "Just drop it.",
+     "You're overthinking this. I'm done."),
+)
+
+MOCK_SUGGESTIONS = (
+    "No rush, I can sort it out if you're busy.",
+    "Totally fine, I'll take care of it this time.",
+    "Whenever you have a minute, no pressure.",
+    "Thanks for letting me know, I'll handle it.",
+)
+
+
+def detect_band(messages):
+    """Avoidance band from the level directive the trainer appends"""
+    for message in reversed(messages):
+        if message.get("role") != "system":
+            continue
+        content = message.get("content") or ""
+        for band in range(len(BAND_DIRECTIVES) - 1, -1, -1):
+            if BAND_DIRECTIVES[band] in content:
+                return band
+    return 1
+
+
+def pick_reply(messages, choice_index=0):
+    if any(m.get("role") == "system" and m.get("content") == SUGGESTION_INSTRUCTIONS for m in messages):
+        return "\n".join(MOCK_SUGGESTIONS)
+    band = detect_band(messages)
+    last_user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    digest = hashlib.sha256(f"{last_user}\0{choice_index}".encode("utf-8")).digest()
+    replies = MOCK_REPLIES[band]
+    return replies[digest[0] % len(replies)]
+
+
+def split_tokens(text):
+    words = text.split(" ")
+    return [words[0]] + [" " + word for word in words[1:]]
+
+
+class FaultProfile:
+    """Latency distribution, token rate and injected failures"""
+
+    def __init__(self, latency_ms=200.0, latency_jitter_ms=50.0, latency_dist="lognormal",
+                 tokens_per_sec=50.0, error_rate=0.0, rate_limit_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.latency_dist = latency_dist
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def first_token_delay(self):
+        with self._lock:
+            if self.latency_dist == "fixed":
+                delay = self.latency_ms
+            elif self.latency_dist == "uniform":
+                delay = self._random.uniform(self.latency_ms - self.latency_jitter_ms,
+                                             self.latency_ms + self.latency_jitter_ms)
+            else:
+                # Lognormal with the given median and a spread set by the jitter
+                sigma = self.latency_jitter_ms / self.latency_ms if self.latency_ms else 0.0
+                delay = self.latency_ms * self._random.lognormvariate(0.0, sigma)
+        return max(0.0, delay) / 1000.0
+
+    def token_delay(self):
+        return 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    def draw_fault(self):
+        """None, 429 or 500 for the next request"""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+
+class MockCompletionsHandler(BaseHTTPRequestHandler):
+    server_version = "MockOpenAI/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/health", "/v1/health"):
+            self._send_json(200, {"status": "ok"})
+        elif self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON", "type": "invalid_request_error"}})
+            return
+
+        profile = self.server.profile
+        fault = profile.draw_fault()
+        if fault == 429:
+            self._send_json(429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_error"}},
+                            headers={"Retry-After": "1"})
+            return
+        if fault == 500:
+            self._send_json(500, {"error": {"message": "Injected server error (mock)", "type": "server_error"}})
+            return
+
+        messages = request.get("messages") or []
+        model = request.get("model", "gpt-4o-mini")
+        n = max(1, int(request.get("n") or 1))
+        replies = [pick_reply(messages, index) for index in range(n)]
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+
+        time.sleep(profile.first_token_delay())
+        if request.get("stream"):
+            self._stream(completion_id, model, replies)
+        else:
+            time.sleep(profile.token_delay() * max(len(split_tokens(r)) for r in replies))
+            completion_tokens = sum(len(split_tokens(r)) for r in replies)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"index": i, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}
+                    for i, reply in enumerate(replies)
+                ],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+
+    def _stream(self, completion_id, model, replies):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        created = int(time.time())
+        token_delay = self.server.profile.token_delay()
+
+        def chunk(index, delta, finish_reason=None):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                       "model": model,
+                       "choices": [{"index": index, "delta": delta, "finish_reason": finish_reason}]}
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            for index, reply in enumerate(replies):
+                chunk(index, {"role": "assistant", "content": ""})
+                for token in split_tokens(reply):
+                    time.sleep(token_delay)
+                    chunk(index, {"content": token})
+                chunk(index, {}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockServer(ThreadingHTTPServer):
+    # The stdlib default backlog of 5 drops connections under load tests
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def make_server(host="127.0.0.1", port=8600, profile=None, verbose=False):
+    server = MockServer((host, port), MockCompletionsHandler)
+    server.profile = profile or FaultProfile()
+    server.verbose = verbose
+    return server
+
+
+def start_in_background(host="127.0.0.1", port=0, profile=None):
+    """Start a server on a daemon thread; returns (server, base_url)"""
+    server = make_server(host, port, profile)
+    threading.Thread(target=server.serve_forever, name="mock-llm-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="median time to first token")
+    parser.add_argument("--latency-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--latency-dist", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered with 429")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    profile = FaultProfile(args.latency_ms, args.latency_jitter_ms, args.latency_dist,
+                           args.tokens_per_sec, args.error_rate, args.rate_limit_rate, args.seed)
+    server = make_server(args.host, args.port, profile, args.verbose)
+    print(f"Mock OpenAI API on http://{args.host}:{server.server_address[1]}/v1 (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
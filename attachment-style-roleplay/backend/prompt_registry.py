@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_PROFILES_PATH = Path(__file__).resolve().parent.parent / "prompts" / "agent_profiles.json"
+
+
+class SimpleTemplate:
+    """Minimal stand-in for LangChain's PromptTemplate: `.template` and `.format()`"""
+
+    def __init__(self, template):
+        self.template = template
+
+    @classmethod
+    def from_template(cls, template):
+        return cls(template)
+
+    def format(self, **kwargs):
+        return self.template.format(**kwargs)
+
+
+def profile_template_text(prompt):
+    """The per-style template the CLIs have always used"""
+    return f"{prompt}\nYou: {{input}}\nPartner:"
+
+
+class PromptRegistry:
+    """Agent profiles parsed once per process, reloaded when the file changes.
+
+    Every lookup first does a cheap freshness check (at most one stat() per
+    check_interval seconds). The file is only re-read when its mtime or size
+    moved, and only re-parsed when the content hash differs too; each real
+    change bumps `version`, which invalidates the memoized templates and any
+    values built through derived().
+    """
+
+    def __init__(self, path=DEFAULT_PROFILES_PATH, check_interval=1.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self.version = 0
+        self._profiles = {}
+        self._templates = {}
+        self._derived = {}
+        self._stat_key = None
+        self._digest = None
+        self._last_check = float("-inf")
+        self._lock = threading.Lock()
+        self.reload(force=True)
+
+    def reload(self, force=False):
+        """Re-read the file if it changed; returns True when the profiles did"""
+        with self._lock:
+            self._last_check = time.monotonic()
+            stat = os.stat(self.path)
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+            if not force and stat_key == self._stat_key:
+                return False
+            self._stat_key = stat_key
+
+            raw = self.path.read_bytes()
+            digest = hashlib.sha256(raw).hexdigest()
+            if not force and digest == self._digest:
+                # Touched but not edited
+                return False
+
+            self._profiles = json.loads(raw.decode("utf-8"))
+            self._digest = digest
+            self._templates = {}
+            self._derived = {}
+            self.version += 1
+            return True
+
+    def _maybe_reload(self):
+        if time.monotonic() - self._last_check >= self.check_interval:
+            try:
+                self.reload()
+            except (OSError, ValueError):
+                # Keep serving the last good profiles while the file is mid-edit
+                pass
+
+    @property
+    def styles(self):
+        self._maybe_reload()
+        return tuple(self._profiles)
+
+    def profile(self, style):
+        self._maybe_reload()
+        return self._profiles[style]
+
+    def prompt(self, style):
+        return self.profile(style)["prompt"]
+
+    def template(self, style, template_class=SimpleTemplate):
+        """Memoized template for a style"""
+        self._maybe_reload()
+        key = (style, template_class)
+        template = self._templates.get(key)
+        if template is None:
+            template = template_class.from_template(profile_template_text(self._profiles[style]["prompt"]))
+            self._templates[key] = template
+        return template
+
+    def templates(self, template_class=SimpleTemplate):
+        return {style: self.template(style, template_class) for style in self.styles}
+
+    def derived(self, key, build):
+        """build(registry), memoized until the profiles next change"""
+        self._maybe_reload()
+        entry = self._derived.get(key)
+        if entry is None or entry[0] != self.version:
+            entry = (self.version, build(self))
+            self._derived[key] = entry
+        return entry[1]
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_prompt_registry(path=DEFAULT_PROFILES_PATH):
+    """Process-wide registry for a profiles file"""
+    # Called on every turn: look up the path as given first, so resolve() (a
+    # filesystem call) only runs the first time a spelling is seen
+    registry = _registries.get(path)
+    if registry is None:
+        resolved = Path(path).resolve()
+        with _registries_lock:
+            registry = _registries.get(resolved)
+            if registry is None:
+                registry = PromptRegistry(resolved)
+                _registries[resolved] = registry
+            _registries[path] = registry
+    return registry
@@ -0,0 +1,95 @@
+import hashlib
+
+AVOIDANT_BEHAVIOR = """
+
+CRITICAL INSTRUCTIONS: You are an avoidant attachment partner. You MUST deflect responsibilities and avoid commitments:
+
+WHEN ASKED TO DO THINGS:
+- Make excuses: "I'm busy", "They'll ask for ID", "I don't have time"
+- Deflect back: "Why can't you do it?", "You're better at that stuff"
+- Avoid commitment: "Maybe later", "We'll see", "I'll think about it"
+
+WHEN PRESSED OR CHALLENGED:
+- Become defensive: "I already told you why I can't"
+- Minimize: "It's not that big a deal", "You're overthinking this"
+- Withdraw: "I don't want to talk about this", "Let's just drop it"
+
+NEVER be immediately cooperative with shared responsibilities. Always deflect first.
+"""
+
+# Level directives from lowest to highest avoidance band
+BAND_DIRECTIVES = (
+    "You prefer not to take on responsibilities. Make a reasonable excuse but stay somewhat pleasant.",
+    "You're uncomfortable with the request. Give a polite excuse or deflection.",
+    "You're feeling pressured. Make excuses and deflect the request back to them.",
+    "You're feeling very defensive and cornered. Give short, hostile responses and deflect aggressively.",
+)
+
+# Lower bounds (exclusive) of bands 1..3
+BAND_THRESHOLDS = (0.4, 0.6, 0.8)
+
+
+def avoidance_band(level):
+    """Index into BAND_DIRECTIVES for an avoidance level"""
+    band = 0
+    for threshold in BAND_THRESHOLDS:
+        if level > threshold:
+            band += 1
+    return band
+
+
+class PromptVariants:
+    """Adaptive prompts laid out for provider-side prefix caching.
+
+    The system prompt is one byte-identical string for every band and the
+    band's directive travels in a short trailing message, so the head of the
+    request only changes when the history window itself does. The combined
+    single-prompt variants are precomputed too for callers that want them.
+    """
+
+    def __init__(self, base_prompt, behavior=AVOIDANT_BEHAVIOR, directives=BAND_DIRECTIVES):
+        self.prefix = base_prompt + behavior
+        self.directives = tuple(directives)
+        self.variants = tuple(self.prefix + " " + directive for directive in self.directives)
+        self._directive_messages = tuple(
+            {"role": "system", "content": directive} for directive in self.directives
+        )
+
+    def full_prompt(self, level):
+        return self.variants[avoidance_band(level)]
+
+    def directive_message(self, level):
+        return self._directive_messages[avoidance_band(level)]
+
+    def request_messages(self, history_messages, level):
+        """History (static system prompt first) plus the trailing level directive"""
+        return history_messages + [self.directive_message(level)]
+
+
+class PrefixTracker:
+    """Counts how often the leading system messages of a request change"""
+
+    def __init__(self):
+        self.requests = 0
+        self.prefix_changes = 0
+        self._last_digest = None
+
+    def observe(self, messages):
+        digest = hashlib.sha256()
+        for message in messages:
+            if message["role"] != "system":
+                break
+            digest.update(message["content"].encode("utf-8"))
+            digest.update(b"\0")
+        digest = digest.digest()
+
+        self.requests += 1
+        if self._last_digest is not None and digest != self._last_digest:
+            self.prefix_changes += 1
+        self._last_digest = digest
+
+    @property
+    def change_rate(self):
+        # The first request has nothing to compare against
+        compared = self.requests - 1
+        return self.prefix_changes / compared if compared > 0 else 0.0
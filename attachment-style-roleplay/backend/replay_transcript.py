@@ -0,0 +1,277 @@
+"""Replay a recorded transcript through the trainer's turn pipeline, without a terminal or browser.
+
+    python replay_transcript.py                                # the pharmacy example, recorded replies
+    python replay_transcript.py --backend stub --repeat 200    # throughput with canned band replies
+    python replay_transcript.py talk.json --golden talk.golden.jsonl
+    python replay_transcript.py --update-golden                # accept the current behaviour
+    python replay_transcript.py --style secure -q              # the same transcript with another partner
+
+Every trainee message goes through the same stages as the CLI (trigger
+analysis, level update, prompt assembly, feedback, reply) on the --style
+engine from style_registry (default avoidant), each timed with a TurnTrace. Partner replies come from a pluggable backend:
+
+    recorded   the transcript's own partner turns (default)
+    stub       mock_llm_server's deterministic per-band replies, no network
+    openai     a real chat completion (OPENAI_API_KEY / OPENAI_BASE_URL)
+
+Per-turn avoidance, triggers, coaching, prompt size and timings are printed
+(or written as JSONL with --output), and the deterministic fields are diffed
+against a golden file (the example's goldens are for the avoidant partner).
+Exit status is 1 when they drift.
+
+A transcript file is JSON: {"id": ..., "turns": [...]} where each turn is
+{"speaker": ..., "text": ...} or a [speaker, text] pair. Turns whose speaker
+is not You/user/trainee are partner replies.
+"""
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from avoidance_engine import AvoidanceState
+from avoidant_style import EXAMPLE_CONVERSATION
+from feedback import coaching_for, suggestions_for
+from history import ConversationHistory, DEFAULT_TOKEN_BUDGET, estimate_tokens
+from prompt_variants import avoidance_band
+from style_registry import DEFAULT_STYLE, get_style_registry
+from tracing import TurnTrace
+from trigger_engine import trigger_mask
+
+REPLAY_DIR = Path(__file__).resolve().parent / "replays"
+# Golden files for the example, per deterministic backend
+EXAMPLE_GOLDEN_PATHS = {
+    "recorded": REPLAY_DIR / "pharmacy.golden.jsonl",
+    "stub": REPLAY_DIR / "pharmacy.stub.golden.jsonl",
+}
+USER_SPEAKERS = frozenset({"you", "user", "trainee"})
+
+# Compared against the golden file; timings vary run to run and are left out
+GOLDEN_FIELDS = ("turn", "user_message", "triggers", "level_before", "level_after", "band",
+                 "severity", "coaching", "suggestions", "prompt_messages", "prompt_tokens", "reply")
+
+
+def example_transcript():
+    return {"id": "pharmacy", "turns": [{"speaker": speaker, "text": text}
+                                        for speaker, text, _ in EXAMPLE_CONVERSATION]}
+
+
+def load_transcript(path):
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    turns = [turn if isinstance(turn, dict) else {"speaker": turn[0], "text": turn[1]}
+             for turn in data["turns"]]
+    return {"id": data.get("id", Path(path).stem), "turns": turns}
+
+
+def split_turns(transcript):
+    """[(trainee message, recorded partner reply or None)]"""
+    pairs = []
+    for turn in transcript["turns"]:
+        text = turn.get("text", turn.get("content", ""))
+        if str(turn.get("speaker", turn.get("role", "you"))).strip().lower() in USER_SPEAKERS:
+            pairs.append([text, None])
+        elif pairs and pairs[-1][1] is None:
+            pairs[-1][1] = text
+    return [tuple(pair) for pair in pairs]
+
+
+class RecordedBackend:
+    """The partner's replies exactly as they were recorded"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+
+    def reply(self, messages, index):
+        return self.replies[index] or ""
+
+
+class StubBackend:
+    """Deterministic canned replies for the band in the trailing directive (no network)"""
+
+    def reply(self, messages, index):
+        from mock_llm_server import pick_reply
+        return pick_reply(messages)
+
+
+class OpenAIBackend:
+    def __init__(self, api_key=None, base_url=None):
+        from clients import get_client
+        self.client = get_client(api_key, base_url)
+
+    def reply(self, messages, index):
+        from llm import create_reply
+        return create_reply(self.client, messages)
+
+
+class Replayer:
+    """Runs the trainee's side of a transcript through the turn pipeline"""
+
+    def __init__(self, backend, initial_level=None, token_budget=DEFAULT_TOKEN_BUDGET, style=DEFAULT_STYLE):
+        self.backend = backend
+        self.engine = get_style_registry().get(style)
+        self.initial_level = self.engine.initial_level if initial_level is None else initial_level
+        self.token_budget = token_budget
+
+    def run(self, transcript_id, messages):
+        engine = self.engine
+        state = AvoidanceState(self.initial_level)
+        history = ConversationHistory(engine.variants.prefix, token_budget=self.token_budget)
+        records = []
+        for index, user_message in enumerate(messages):
+            trace = TurnTrace(transcript_id, frontend="replay")
+            with trace.span("analyze"):
+                triggers = engine.analyze(user_message)
+            level_before = state.level
+            with trace.span("adjust"):
+                state = engine.step(state, triggers)
+            with trace.span("prompt"):
+                history.append("user", user_message)
+                variants = engine.variants
+                history.set_system_prompt(variants.prefix)
+                # Summaries normally land in the background; wait so every run sees the same window
+                history.wait_for_summary()
+                request = variants.request_messages(history.messages(), state.level)
+            with trace.span("feedback"):
+                mask = trigger_mask(triggers)
+                severity, coaching = coaching_for(mask)
+                suggestions = suggestions_for(mask, state.level)
+            with trace.span("llm"):
+                reply = self.backend.reply(request, index)
+            history.append("assistant", reply)
+            trace.end()
+            records.append({
+                "turn": index,
+                "user_message": user_message,
+                "triggers": {name: count for name, count in triggers.items() if count},
+                "level_before": round(level_before, 4),
+                "level_after": round(state.level, 4),
+                "band": avoidance_band(state.level),
+                "severity": severity.value,
+                "coaching": coaching,
+                "suggestions": list(suggestions),
+                "prompt_messages": len(request),
+                "prompt_tokens": sum(estimate_tokens(m["content"]) for m in request),
+                "reply": reply,
+                "timings_ms": {stage: round(seconds * 1000, 3)
+                               for stage, seconds in trace.stage_seconds().items()},
+            })
+        return records
+
+
+def diff_records(golden, records, fields=GOLDEN_FIELDS):
+    """Human-readable differences between golden and replayed turns"""
+    problems = []
+    if len(golden) != len(records):
+        problems.append(f"turn count: golden {len(golden)}, replay {len(records)}")
+    for expected, actual in zip(golden, records):
+        for field in fields:
+            if expected.get(field) != actual.get(field):
+                problems.append(f"turn {actual['turn']} {field}: golden {expected.get(field)!r}, "
+                                f"replay {actual.get(field)!r}")
+    return problems
+
+
+def read_golden(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_golden(path, records, fields=GOLDEN_FIELDS):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps({field: record[field] for field in fields}, ensure_ascii=False) + "\n")
+
+
+def print_turn(record):
+    triggers = ", ".join(f"{name}×{count}" for name, count in record["triggers"].items()) or "-"
+    timings = " ".join(f"{stage} {ms:.2f}" for stage, ms in record["timings_ms"].items())
+    print(f"[{record['turn']:>2}] {record['level_before']:.2f} → {record['level_after']:.2f} "
+          f"(band {record['band']})  You: {record['user_message']}")
+    print(f"     triggers: {triggers}")
+    print(f"     {record['coaching']}")
+    print(f"     prompt: {record['prompt_messages']} messages, ~{record['prompt_tokens']} tokens")
+    print(f"     Partner: {record['reply']}")
+    print(f"     ms: {timings}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay a transcript through the trainer pipeline")
+    parser.add_argument("transcript", nargs="?", help="transcript JSON (default: the pharmacy example)")
+    parser.add_argument("--backend", choices=("recorded", "stub", "openai"), default="recorded")
+    parser.add_argument("--golden", help="golden JSONL to diff against (default for the example: "
+                                         "replays/pharmacy[.stub].golden.jsonl)")
+    parser.add_argument("--update-golden", action="store_true", help="write this run as the golden file")
+    parser.add_argument("--repeat", type=int, default=1, help="replay N times and report throughput")
+    parser.add_argument("--style", default=DEFAULT_STYLE, choices=get_style_registry().styles,
+                        help="partner style to replay against (default: %(default)s)")
+    parser.add_argument("--initial-level", type=float, default=None,
+                        help="starting level (default: the style's own)")
+    parser.add_argument("-o", "--output", help="write per-turn records as JSONL (- for stdout)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no per-turn printout")
+    args = parser.parse_args()
+
+    if args.transcript:
+        transcript = load_transcript(args.transcript)
+        golden_path = args.golden
+    else:
+        transcript = example_transcript()
+        golden_path = args.golden or (EXAMPLE_GOLDEN_PATHS.get(args.backend)
+                                      if args.style == DEFAULT_STYLE else None)
+    pairs = split_turns(transcript)
+    messages = [message for message, _ in pairs]
+
+    if args.backend == "recorded":
+        backend = RecordedBackend(reply for _, reply in pairs)
+    elif args.backend == "stub":
+        backend = StubBackend()
+    else:
+        from dotenv import load_dotenv
+        load_dotenv()
+        backend = OpenAIBackend(os.environ.get("OPENAI_API_KEY"), os.environ.get("OPENAI_BASE_URL"))
+
+    replayer = Replayer(backend, initial_level=args.initial_level, style=args.style)
+    started = time.perf_counter()
+    for _ in range(max(1, args.repeat)):
+        records = replayer.run(transcript["id"], messages)
+    elapsed = time.perf_counter() - started
+
+    if args.output:
+        sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+        try:
+            for record in records:
+                sink.write(json.dumps(record, ensure_ascii=False) + "\n")
+        finally:
+            if sink is not sys.stdout:
+                sink.close()
+    elif not args.quiet:
+        for record in records:
+            print_turn(record)
+
+    turns = len(messages) * max(1, args.repeat)
+    print(f"Replayed {turns} turns in {elapsed * 1000:.1f} ms ({turns / elapsed if elapsed else 0:,.0f} turns/s)",
+          file=sys.stderr)
+
+    if golden_path is None:
+        return 0
+    if args.update_golden:
+        write_golden(golden_path, records)
+        print(f"Golden file written to {golden_path}", file=sys.stderr)
+        return 0
+    if not Path(golden_path).exists():
+        print(f"No golden file at {golden_path}; run with --update-golden to record one", file=sys.stderr)
+        return 1
+    problems = diff_records(read_golden(golden_path), records)
+    for problem in problems:
+        print(f"DRIFT {problem}", file=sys.stderr)
+    if problems:
+        return 1
+    print(f"Matches {golden_path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
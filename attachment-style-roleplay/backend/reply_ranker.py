@@ -0,0 +1,74 @@
+"""Local scoring of candidate partner replies against the current avoidance band.
+
+create_ranked_reply() asks for several candidates in one request; this module
+picks the one that stays most in character: deflecting rather than
+cooperating, more so the higher the band, and within the profile's
+"1-3 sentences".
+"""
+import re
+
+from prompt_variants import avoidance_band
+from text_normalizer import normalize_message
+from trigger_engine import TriggerMatcher
+
+# Phrases drawn from the avoidant behaviour notes in prompt_variants
+REPLY_MARKERS = {
+    "deflection": [
+        "i'm busy", "i don't have time", "why can't you", "why don't you", "you're better at",
+        "maybe later", "we'll see", "i'll think about it", "not that big a deal",
+        "you're overthinking", "i already told you", "let's just drop it",
+        "i don't want to talk about", "not right now", "they'll ask", "can't you just",
+    ],
+    "cooperation": [
+        "i'll do it", "i'll handle it", "i'll take care of it", "i'll go", "i can do that",
+        "sure thing", "of course", "no problem", "happy to", "sounds good", "on my way",
+    ],
+    "warmth": [
+        "i love you", "i'm sorry", "i understand", "thank you", "that makes sense", "i appreciate",
+    ],
+}
+
+# Marker weights per band, lowest to highest avoidance (see BAND_DIRECTIVES):
+# every band deflects, the top one also turns cold and curt
+BAND_WEIGHTS = (
+    {"deflection": 0.5, "cooperation": -0.5, "warmth": 0.25},
+    {"deflection": 1.0, "cooperation": -1.0, "warmth": 0.0},
+    {"deflection": 1.5, "cooperation": -1.5, "warmth": -0.25},
+    {"deflection": 2.0, "cooperation": -2.5, "warmth": -0.5},
+)
+BAND_WORD_LIMITS = (40, 35, 30, 20)
+MAX_SENTENCES = 3
+SENTENCE_PENALTY = 1.0
+WORD_PENALTY = 0.05
+
+_SENTENCE_END = re.compile(r"[.!?]+(?:\s|$)")
+
+# Candidates are rarely repeated, so the matcher keeps no scan cache
+REPLY_MATCHER = TriggerMatcher(REPLY_MARKERS, normalizer=normalize_message, cache_size=0)
+
+
+def sentence_count(reply):
+    return max(1, len(_SENTENCE_END.findall(reply.strip() + " ")))
+
+
+def score_reply(reply, level, matcher=REPLY_MATCHER):
+    """Higher is more in character for this avoidance level; empty replies score -inf"""
+    if not reply or not reply.strip():
+        return float("-inf")
+    band = avoidance_band(level)
+    weights = BAND_WEIGHTS[band]
+    hits = matcher.scan(reply)
+    score = sum(weights.get(name, 0.0) * min(count, 2) for name, count in hits.items())
+    score -= SENTENCE_PENALTY * max(0, sentence_count(reply) - MAX_SENTENCES)
+    score -= WORD_PENALTY * max(0, len(reply.split()) - BAND_WORD_LIMITS[band])
+    return score
+
+
+def pick_reply(replies, level):
+    """Index of the best candidate (earliest wins ties) and every candidate's score.
+
+    The index is None when there are no candidates.
+    """
+    scores = [score_reply(reply, level) for reply in replies]
+    best = max(range(len(scores)), key=scores.__getitem__, default=None)
+    return best, scores
@@ -0,0 +1,245 @@
+import random
+import threading
+import time
+from collections import deque
+
+DEFAULT_TIMEOUT = 20.0
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling upstream while the breaker is open"""
+
+
+class LatencyHistogram:
+    """Rolling latency window with percentile readout"""
+
+    def __init__(self, window=1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+
+    def record(self, seconds, error=False):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total_seconds += seconds
+            if error:
+                self.errors += 1
+
+    def percentiles(self, points=(50, 95, 99)):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {p: None for p in points}
+        last = len(samples) - 1
+        return {p: samples[min(last, round(p / 100 * last))] for p in points}
+
+    def snapshot(self):
+        p = self.percentiles()
+        return {"count": self.count, "errors": self.errors,
+                "p50": p[50], "p95": p[95], "p99": p[99]}
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets one probe through after a cool-down"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self.state = self.CLOSED
+
+    def release(self):
+        """Give up a probe that ended without an outcome (cancelled or closed early)"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+def format_latency(seconds):
+    return "–" if seconds is None else f"{seconds * 1000:.0f} ms"
+
+
+def is_retryable(exc):
+    """429s, 5xx, timeouts and dropped connections are worth another attempt"""
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    import openai
+    return isinstance(exc, (openai.APIConnectionError, TimeoutError, ConnectionError))
+
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class ResilientCaller:
+    """Timeouts, jittered exponential backoff and a circuit breaker around upstream calls"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_attempts=3, base_delay=0.5, max_delay=8.0,
+                 breaker=None, sleep=time.sleep):
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyHistogram()
+        self.first_token = LatencyHistogram()
+        self.retries = 0
+        self._sleep = sleep
+
+    def backoff(self, attempt, exc=None):
+        """Full-jitter delay before retry number `attempt` (1-based)"""
+        hinted = _retry_after(exc) if exc is not None else None
+        if hinted is not None:
+            return min(self.max_delay, hinted)
+        return random.uniform(0.0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, fn):
+        """Run fn(timeout) with retries; returns its result"""
+        for attempt in self._attempts():
+            with attempt:
+                return fn(self.timeout)
+            self._sleep(attempt.delay)
+
+    def stream(self, open_stream, first_item=lambda item: True):
+        """Yield from open_stream(timeout), retrying until the first real item arrives"""
+        for attempt in self._attempts():
+            with attempt:
+                for item in open_stream(self.timeout):
+                    attempt.observe(item, first_item)
+                    yield item
+                return
+            self._sleep(attempt.delay)
+
+    async def acall(self, fn):
+        """Async call(): await fn(timeout) with retries, backing off without blocking the loop"""
+        import asyncio
+        for attempt in self._attempts():
+            with attempt:
+                return await fn(self.timeout)
+            await asyncio.sleep(attempt.delay)
+
+    async def astream(self, open_stream, first_item=lambda item: True):
+        """Async stream(): open_stream(timeout) is awaited and then iterated with `async for`"""
+        import asyncio
+        for attempt in self._attempts():
+            with attempt:
+                async for item in await open_stream(self.timeout):
+                    attempt.observe(item, first_item)
+                    yield item
+                return
+            await asyncio.sleep(attempt.delay)
+
+    def _attempts(self):
+        """One _Attempt per try the breaker lets through"""
+        number = 0
+        while True:
+            number += 1
+            if not self.breaker.allow():
+                raise CircuitOpenError("LLM upstream is failing; not sending requests for now")
+            yield _Attempt(self, number)
+
+    def _record_outcome(self, exc, retryable):
+        if retryable:
+            self.breaker.record_failure()
+        elif getattr(exc, "status_code", None) is not None:
+            # A 4xx means the upstream answered; only outages should trip the breaker
+            self.breaker.record_success()
+        else:
+            # Raised on our side; says nothing about the upstream either way
+            self.breaker.release()
+
+    def stats(self):
+        return {
+            "latency": self.latency.snapshot(),
+            "first_token": self.first_token.snapshot(),
+            "retries": self.retries,
+            "breaker": self.breaker.state,
+        }
+
+
+class _Attempt:
+    """Outcome policy for one try, shared by the sync and async paths.
+
+    Used as a context manager around the upstream call. A success or a
+    give-up propagates; a retryable failure is swallowed and leaves the
+    backoff in `delay` for the caller to wait out before the next attempt.
+    Only failures before any output count as retryable; a stream that has
+    started yielding is never replayed.
+    """
+
+    def __init__(self, caller, number):
+        self.caller = caller
+        self.number = number
+        self.started = time.perf_counter()
+        self.produced = False
+        self.delay = None
+
+    def observe(self, item, first_item):
+        if not self.produced and first_item(item):
+            self.produced = True
+            self.caller.first_token.record(time.perf_counter() - self.started)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        caller = self.caller
+        elapsed = time.perf_counter() - self.started
+        if exc_type is None:
+            caller.latency.record(elapsed)
+            caller.breaker.record_success()
+            return False
+        if not issubclass(exc_type, Exception):
+            # Cancelled or closed by the consumer: free the half-open probe slot
+            caller.breaker.release()
+            return False
+        caller.latency.record(elapsed, error=True)
+        retryable = is_retryable(exc)
+        caller._record_outcome(exc, retryable)
+        if self.produced or self.number >= caller.max_attempts or not retryable:
+            return False
+        caller.retries += 1
+        self.delay = caller.backoff(self.number, exc)
+        return True
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent / ".cache" / "responses.sqlite3"
+# Hits whose last_used is written back to SQLite in one statement
+TOUCH_BATCH = 64
+
+
+def make_cache_key(messages, params):
+    """Hash the prompt (system message included), the window and the sampling params"""
+    payload = json.dumps({"messages": messages, "params": params},
+                         sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache for partner replies: an in-memory LRU in front of SQLite.
+
+    The SQLite tier is optional (db_path=None keeps everything in memory). It
+    is bounded by max_rows, evicting the least recently used rows, and rows
+    older than ttl_seconds are treated as misses and dropped. Hits in either
+    tier refresh a row's last_used; the updates are batched and written
+    before every eviction, so hot keys survive without a write per hit.
+    """
+
+    def __init__(self, max_entries=256, db_path=DEFAULT_CACHE_PATH,
+                 max_rows=10_000, ttl_seconds=7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._memory = OrderedDict()
+        self._touched = {}  # key -> last hit not yet written to SQLite
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path is not None:
+            import sqlite3
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS replies ("
+                " key TEXT PRIMARY KEY, reply TEXT NOT NULL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key):
+        """Cached reply for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                reply, created = entry
+                if now - created <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._touch(key, now)
+                    self.hits += 1
+                    return reply
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT reply, created FROM replies WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    reply, created = row
+                    if now - created <= self.ttl_seconds:
+                        self._touch(key, now)
+                        self._remember(key, reply, created)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return reply
+                    self._db.execute("DELETE FROM replies WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, key, reply):
+        now = time.time()
+        with self._lock:
+            self._remember(key, reply, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO replies (key, reply, created, last_used) VALUES (?, ?, ?, ?)",
+                    (key, reply, now, now),
+                )
+                self._touched.pop(key, None)
+                self._flush_touched()
+                self._evict(now)
+                self._db.commit()
+
+    def _remember(self, key, reply, created):
+        self._memory[key] = (reply, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _touch(self, key, now):
+        if self._db is None:
+            return
+        self._touched[key] = now
+        if len(self._touched) >= TOUCH_BATCH:
+            self._flush_touched()
+            self._db.commit()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany("UPDATE replies SET last_used = ? WHERE key = ?",
+                                 [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM replies WHERE created < ?", (now - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM replies WHERE key IN ("
+            " SELECT key FROM replies ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM replies")
+                self._db.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
@@ -0,0 +1,264 @@
+"""Score recorded transcripts offline with the trainer's trigger and avoidance logic.
+
+    python score_corpus.py transcripts.jsonl -o scored.jsonl
+    python score_corpus.py transcripts.csv -o scored.csv --workers 4 --batch-size 512
+
+Input, read as a stream:
+
+    JSONL  one transcript per line: {"id": ..., "turns": [...]} where each turn is
+           either a string (the trainee's message) or {"speaker"/"role": ..., "text"/"content": ...}
+    CSV    columns conversation_id, speaker (or role), text (or message/content), one row per
+           turn, rows of a conversation kept together and in order
+
+Only the trainee's turns (speaker "You"/"user", or unlabeled) are scored; each
+turn is reported as its trigger counts and trigger bitmask (bit i is
+TRIGGER_CATEGORIES[i]). Each batch becomes a (conversations, turns,
+categories) trigger-count matrix that is replayed with avoidance_engine.replay;
+batches run on a process pool with a bounded number in flight, and results are
+written in input order, one chunk per batch.
+
+--style picks the partner whose lexicon and weights score the corpus
+(default avoidant); each worker compiles it once from style_registry. A
+trained trigger_classifier.py model (--model, or the style's own such as
+$TRIGGER_MODEL for avoidant) classifies each batch's messages in one call,
+in front of the phrase engine.
+"""
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+
+from avoidance_engine import replay
+from feedback import COACHING_TABLE
+from style_registry import DEFAULT_STYLE, get_style_registry
+from trigger_engine import TRIGGER_CATEGORIES, counts_mask
+
+USER_SPEAKERS = frozenset({"you", "user", "trainee"})
+DEFAULT_BATCH_SIZE = 256
+
+# Loaded at most once per worker process
+_classifiers = {}
+
+
+def _get_classifier(model_path):
+    if model_path not in _classifiers:
+        from trigger_classifier import load_trigger_classifier
+        _classifiers[model_path] = load_trigger_classifier(model_path)
+    return _classifiers[model_path]
+
+
+def _is_user_turn(speaker):
+    return speaker is None or str(speaker).strip().lower() in USER_SPEAKERS
+
+
+def _turn_text(turn):
+    if isinstance(turn, str):
+        return None, turn
+    speaker = turn.get("speaker", turn.get("role"))
+    return speaker, turn.get("text", turn.get("content", turn.get("message", "")))
+
+
+def read_jsonl(stream):
+    """Yield (conversation id, trainee messages) per line"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        turns = record.get("turns", record.get("messages", []))
+        messages = []
+        for turn in turns:
+            speaker, text = _turn_text(turn)
+            if _is_user_turn(speaker):
+                messages.append(text or "")
+        yield record.get("id", line_number), messages
+
+
+def read_csv(stream):
+    """Yield (conversation id, trainee messages) for each run of rows with the same id"""
+    reader = csv.DictReader(stream)
+    current_id, messages = None, []
+    for row in reader:
+        conversation_id = row.get("conversation_id", row.get("id"))
+        if conversation_id != current_id:
+            if current_id is not None:
+                yield current_id, messages
+            current_id, messages = conversation_id, []
+        speaker = row.get("speaker", row.get("role"))
+        if _is_user_turn(speaker or None):
+            messages.append(row.get("text") or row.get("message") or row.get("content") or "")
+    if current_id is not None:
+        yield current_id, messages
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def score_batch(batch, initial_level=None, model_path=None, style=DEFAULT_STYLE):
+    """Score one batch of (id, messages); returns one result dict per conversation"""
+    import numpy as np
+
+    engine = get_style_registry().get(style)
+    matcher = engine.matcher
+    if initial_level is None:
+        initial_level = engine.initial_level
+
+    lengths = [len(messages) for _, messages in batch]
+    width = max(lengths, default=0)
+    counts = np.zeros((len(batch), max(width, 1), len(TRIGGER_CATEGORIES)), dtype=np.int32)
+    classifier = _get_classifier(model_path) if model_path else engine.classifier
+    if classifier is not None:
+        # Every message in the batch goes through the model at once
+        predicted = iter(classifier.predict_counts(
+            [message for _, messages in batch for message in messages], matcher).tolist())
+    masks, coaching = [], []
+    for row, (_, messages) in enumerate(batch):
+        row_masks, labels = [], []
+        for turn, message in enumerate(messages):
+            # Count tuples are already in TRIGGER_CATEGORIES order; no per-turn dict
+            trigger_counts = next(predicted) if classifier is not None else matcher.counts(message)
+            counts[row, turn] = trigger_counts
+            mask = counts_mask(trigger_counts)
+            row_masks.append(mask)
+            labels.append(COACHING_TABLE[mask][1])
+        masks.append(row_masks)
+        coaching.append(labels)
+
+    trajectories = replay(counts, initial_level, engine.weights, lengths)
+
+    results = []
+    for row, (conversation_id, messages) in enumerate(batch):
+        n = lengths[row]
+        levels = trajectories[row, :n]
+        results.append({
+            "id": conversation_id,
+            "turns": n,
+            "final_level": float(levels[-1]) if n else initial_level,
+            "peak_level": float(levels.max()) if n else initial_level,
+            "levels": [round(float(level), 4) for level in levels],
+            "triggers": counts[row, :n].tolist(),
+            "masks": masks[row],
+            "coaching": coaching[row],
+        })
+    return results
+
+
+class JsonlWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write_chunk(self, results):
+        self.stream.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in results))
+        self.stream.flush()
+
+
+class CsvWriter:
+    """One row per scored turn"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.writer = csv.writer(stream)
+        self.writer.writerow(["conversation_id", "turn", "level", "mask", *TRIGGER_CATEGORIES, "coaching"])
+
+    def write_chunk(self, results):
+        self.writer.writerows(
+            [result["id"], turn, level, mask, *counts, coaching]
+            for result in results
+            for turn, (level, mask, counts, coaching) in enumerate(
+                zip(result["levels"], result["masks"], result["triggers"], result["coaching"]))
+        )
+        self.stream.flush()
+
+
+def score_corpus(conversations, write_chunk, batch_size=DEFAULT_BATCH_SIZE, workers=None,
+                 initial_level=None, model_path=None, style=DEFAULT_STYLE):
+    """Score conversations batch by batch; returns (conversations, turns) scored.
+
+    With workers=0 everything runs in this process. Otherwise at most
+    2 * workers batches are in flight, so memory stays bounded however large
+    the corpus is, and chunks are still written in input order. initial_level
+    defaults to the style's own starting level.
+    """
+    get_style_registry().get(style)  # an unknown style fails here, not in every worker
+    totals = [0, 0]
+
+    def emit(results):
+        write_chunk(results)
+        totals[0] += len(results)
+        totals[1] += sum(result["turns"] for result in results)
+
+    batches = batched(conversations, batch_size)
+    if workers == 0:
+        for batch in batches:
+            emit(score_batch(batch, initial_level, model_path, style))
+        return tuple(totals)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.submit(score_batch, batch, initial_level, model_path, style))
+            if len(pending) >= max_in_flight:
+                emit(pending.popleft().result())
+        while pending:
+            emit(pending.popleft().result())
+    return tuple(totals)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Score a transcript corpus offline (no LLM calls)")
+    parser.add_argument("input", help="JSONL or CSV corpus, or - for JSONL on stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL or CSV (by extension), default stdout")
+    parser.add_argument("--input-format", choices=("jsonl", "csv"))
+    parser.add_argument("--output-format", choices=("jsonl", "csv"))
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: CPU count, 0 = run in this process)")
+    parser.add_argument("--style", default=DEFAULT_STYLE, choices=get_style_registry().styles,
+                        help="partner style whose lexicon and weights score the corpus (default: %(default)s)")
+    parser.add_argument("--initial-level", type=float, default=None,
+                        help="starting level (default: the style's own)")
+    parser.add_argument("--model", default=None,
+                        help="trained trigger classifier (default: the style's own, $TRIGGER_MODEL "
+                             "for avoidant; none = phrase engine only)")
+    args = parser.parse_args()
+
+    input_format = args.input_format or ("csv" if args.input.endswith(".csv") else "jsonl")
+    output_format = args.output_format or ("csv" if args.output.endswith(".csv") else "jsonl")
+
+    source = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        reader = read_csv(source) if input_format == "csv" else read_jsonl(source)
+        writer = CsvWriter(sink) if output_format == "csv" else JsonlWriter(sink)
+        started = time.perf_counter()
+        conversations, turns = score_corpus(reader, writer.write_chunk, args.batch_size,
+                                            args.workers, args.initial_level, args.model, args.style)
+        elapsed = time.perf_counter() - started
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    print(f"Scored {conversations} conversations ({turns} turns) in {elapsed:.2f}s "
+          f"({turns / elapsed if elapsed else 0:.0f} turns/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Persistent training sessions: one append-only record per turn.
+
+Two interchangeable backends share one interface:
+
+    MemorySessionStore()             # tests, throwaway runs
+    SQLiteSessionStore(path)         # WAL mode, safe for several workers on one host
+
+Prune old sessions from the command line:
+
+    python session_store.py prune --days 30
+"""
+import json
+import threading
+import time
+import uuid
+from pathlib import Path
+
+DEFAULT_SESSION_PATH = Path(__file__).resolve().parent / ".cache" / "sessions.sqlite3"
+MEMORY_LOCATIONS = ("memory", ":memory:")
+
+
+def _new_session(session_id, style, level, now):
+    return {"id": session_id, "style": style, "created": now, "updated": now,
+            "level": level, "turn_count": 0}
+
+
+def _new_turn(index, user_message, reply, triggers, level_before, level_after,
+              coaching, latency_ms, now):
+    return {"index": index, "created": now, "user_message": user_message, "reply": reply,
+            "triggers": dict(triggers), "level_before": level_before, "level_after": level_after,
+            "coaching": coaching, "latency_ms": latency_ms}
+
+
+def restore_history(history, turns):
+    """Rebuild a ConversationHistory window from stored turns"""
+    for turn in turns:
+        history.append("user", turn["user_message"])
+        if turn["reply"] is not None:
+            history.append("assistant", turn["reply"])
+    return history
+
+
+class MemorySessionStore:
+    """Sessions kept in a dict; same interface as SQLiteSessionStore"""
+
+    def __init__(self):
+        self._sessions = {}
+        self._turns = {}
+        self._lock = threading.Lock()
+
+    def create_session(self, style="avoidant", level=0.6, session_id=None):
+        session_id = session_id or uuid.uuid4().hex
+        with self._lock:
+            self._sessions[session_id] = _new_session(session_id, style, level, time.time())
+            self._turns[session_id] = []
+        return session_id
+
+    def get_session(self, session_id):
+        """Session summary (level, turn count, timestamps), or None"""
+        session = self._sessions.get(session_id)
+        return dict(session) if session is not None else None
+
+    def append_turn(self, session_id, user_message, reply, triggers, level_before, level_after,
+                    coaching=None, latency_ms=None):
+        """Record one turn; returns its index within the session"""
+        now = time.time()
+        with self._lock:
+            session = self._sessions[session_id]
+            turns = self._turns[session_id]
+            turns.append(_new_turn(len(turns), user_message, reply, triggers,
+                                   level_before, level_after, coaching, latency_ms, now))
+            session.update(updated=now, level=level_after, turn_count=len(turns))
+            return len(turns) - 1
+
+    def turns(self, session_id, start=0, limit=None):
+        stop = None if limit is None else start + limit
+        return [dict(turn) for turn in self._turns.get(session_id, ())[start:stop]]
+
+    def prune(self, older_than_seconds):
+        """Delete sessions idle for longer than older_than_seconds; returns how many"""
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            stale = [sid for sid, session in self._sessions.items() if session["updated"] < cutoff]
+            for session_id in stale:
+                del self._sessions[session_id]
+                del self._turns[session_id]
+        return len(stale)
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionStore:
+    """Sessions in SQLite with write-ahead logging.
+
+    Turns are only ever inserted; the sessions row carries the latest level
+    and turn count so resuming does not need to read the whole log. Each append
+    runs in one IMMEDIATE transaction, so workers sharing the file never hand
+    out the same turn index twice.
+    """
+
+    def __init__(self, db_path=DEFAULT_SESSION_PATH, busy_timeout=5.0):
+        import sqlite3
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), timeout=busy_timeout,
+                                   isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, style TEXT NOT NULL, created REAL NOT NULL,"
+            " updated REAL NOT NULL, level REAL NOT NULL, turn_count INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);"
+            "CREATE TABLE IF NOT EXISTS turns ("
+            " session_id TEXT NOT NULL, idx INTEGER NOT NULL, created REAL NOT NULL,"
+            " user_message TEXT NOT NULL, reply TEXT, triggers TEXT NOT NULL,"
+            " level_before REAL NOT NULL, level_after REAL NOT NULL,"
+            " coaching TEXT, latency_ms REAL,"
+            " PRIMARY KEY (session_id, idx)) WITHOUT ROWID;"
+        )
+
+    def create_session(self, style="avoidant", level=0.6, session_id=None):
+        session_id = session_id or uuid.uuid4().hex
+        session = _new_session(session_id, style, level, time.time())
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions (id, style, created, updated, level, turn_count)"
+                " VALUES (:id, :style, :created, :updated, :level, :turn_count)",
+                session,
+            )
+        return session_id
+
+    def get_session(self, session_id):
+        """Session summary (level, turn count, timestamps), or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, style, created, updated, level, turn_count FROM sessions WHERE id = ?",
+                (session_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "style", "created", "updated", "level", "turn_count"), row))
+
+    def append_turn(self, session_id, user_message, reply, triggers, level_before, level_after,
+                    coaching=None, latency_ms=None):
+        """Record one turn; returns its index within the session"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT turn_count FROM sessions WHERE id = ?", (session_id,)
+                ).fetchone()
+                if row is None:
+                    raise KeyError(session_id)
+                index = row[0]
+                self._db.execute(
+                    "INSERT INTO turns (session_id, idx, created, user_message, reply, triggers,"
+                    " level_before, level_after, coaching, latency_ms)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (session_id, index, now, user_message, reply,
+                     json.dumps(triggers, separators=(",", ":")),
+                     level_before, level_after, coaching, latency_ms),
+                )
+                self._db.execute(
+                    "UPDATE sessions SET updated = ?, level = ?, turn_count = ? WHERE id = ?",
+                    (now, level_after, index + 1, session_id),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return index
+
+    def turns(self, session_id, start=0, limit=None):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT idx, created, user_message, reply, triggers, level_before, level_after,"
+                " coaching, latency_ms FROM turns WHERE session_id = ? AND idx >= ?"
+                " ORDER BY idx LIMIT ?",
+                (session_id, start, -1 if limit is None else limit),
+            ).fetchall()
+        return [
+            _new_turn(index, user_message, reply, json.loads(triggers), level_before,
+                      level_after, coaching, latency_ms, created)
+            for (index, created, user_message, reply, triggers,
+                 level_before, level_after, coaching, latency_ms) in rows
+        ]
+
+    def prune(self, older_than_seconds):
+        """Delete sessions idle for longer than older_than_seconds; returns how many"""
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "DELETE FROM turns WHERE session_id IN"
+                    " (SELECT id FROM sessions WHERE updated < ?)", (cutoff,)
+                )
+                pruned = self._db.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,)).rowcount
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return pruned
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def open_session_store(location=None):
+    """SESSION_STORE-style location: "memory", or a SQLite path (default under .cache/)"""
+    if location in MEMORY_LOCATIONS:
+        return MemorySessionStore()
+    return SQLiteSessionStore(location or DEFAULT_SESSION_PATH)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the training session store")
+    parser.add_argument("--db", default=str(DEFAULT_SESSION_PATH))
+    commands = parser.add_subparsers(dest="command", required=True)
+    prune = commands.add_parser("prune", help="delete sessions idle for more than --days")
+    prune.add_argument("--days", type=float, default=30)
+    args = parser.parse_args()
+
+    store = SQLiteSessionStore(args.db)
+    try:
+        if args.command == "prune":
+            print(f"Pruned {store.prune(args.days * 24 * 3600)} sessions")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Per-style partner engines: trigger lexicon, state weights and band prompts, compiled once.
+
+Every profile in agent_profiles.json has a StyleDefinition here. The
+registry compiles each definition into a StyleEngine at startup (one
+Aho-Corasick matcher per lexicon, one step() weight table) and the
+engine's PromptVariants are rebuilt only when the profile's prompt
+changes, so switching a session to another style is a dict lookup.
+
+Lexicons use the same categories as REAL_CONVERSATION_PATTERNS so the
+avoidance state, the trigger masks and replay() work unchanged; what a
+category means for the partner is set by the style's weights. The level
+is the partner's activation: avoidance for the avoidant partner, fear of
+abandonment for the anxious one, and how firmly the secure one is holding
+a boundary.
+
+A learned trigger classifier is trained on one style's labels, so it is
+only loaded for the style whose model_env names it (TRIGGER_MODEL for the
+avoidant partner); the other styles count their own lexicon.
+"""
+import os
+import threading
+
+from avoidance_engine import AvoidanceState, DEFAULT_AVOIDANCE_LEVEL, DEFAULT_WEIGHTS, step
+from prompt_registry import get_prompt_registry
+from prompt_variants import AVOIDANT_BEHAVIOR, BAND_DIRECTIVES, PromptVariants
+from trigger_engine import compile_trigger_matcher
+
+# Lexicon the avoidant trainer was tuned on (avoidant_style.REAL_CONVERSATION_PATTERNS)
+AVOIDANT_PATTERNS = {
+    # Negative patterns (INCREASE avoidance)
+    "deflection_phrases": ["pharmacy will ask", "they might want", "i dont have time", "im busy"],
+    "counter_deflection": ["why cant you", "why dont you", "you should", "its your turn",
+                           "it's your turn"],
+    "excuse_challenging": ["i dont think they will", "that wont happen", "youre overthinking"],
+    "pressing_patterns": ["why cant you just", "give me one reason", "tell me why"],
+    
+    # FIXED: Comprehensive emotional escalation detection
+    "emotional_escalation": [
+        "crying", "this is ridiculous", "i give up", "whatever", 
+        "fuck", "fck", "shit", "damn", "hate", "can't stand", 
+        "fed up", "done with", "over it", "stupid", "crazy",
+        "mad", "angry", "frustrated", "pissed"
+    ],
+    
+    # FIXED: Comprehensive personal attack detection  
+    "personal_attacks": [
+        "too much ego", "selfish", "you always", "you never", 
+        "go fuck", "fck ur", "screw you", "hate you", 
+        "piece of shit", "asshole", "not meant", "wrong person", 
+        "waste of time", "useless", "pathetic", "loser", 
+        "idiot", "stupid", "moron", "dumb"
+    ],
+    
+    # NEW: Relationship threat detection (maximum trigger)
+    "relationship_threats": [
+        "leave this marriage", "need to leave", "want a divorce",
+        "not meant to", "break up", "leave you", "find someone", 
+        "better than you", "done with you", "can't do this", 
+        "want out", "end this", "we're done", "it's over"
+    ],
+    
+    # Positive patterns (DECREASE avoidance)
+    "respectful_requests": ["can you", "could you", "would you mind", "please"],
+    "space_giving": ["when you're ready", "no pressure", "take your time", "if you want"],
+    "validation": ["i understand", "that makes sense", "i appreciate", "thank you"],
+    "collaborative": ["let's", "we could", "together", "what do you think"]
+}
+
+# Withdrawal and dismissal press on an anxious partner; reassurance settles them.
+# Space that is offered reads as distance, so it nudges the level up a little
+ANXIOUS_PATTERNS = {
+    "deflection_phrases": ["im busy", "not now", "talk later", "ill call you later",
+                           "i'll call you later"],
+    "counter_deflection": ["why do you always", "why cant you just relax", "you need to trust me"],
+    "excuse_challenging": ["youre overreacting", "calm down", "stop worrying", "its not a big deal",
+                           "it's not a big deal", "youre being dramatic", "youre too sensitive"],
+    "pressing_patterns": ["i need space", "leave me alone", "stop texting", "i dont want to talk",
+                          "dont call me", "i need some time alone"],
+    "emotional_escalation": [
+        "whatever", "fuck", "fck", "shit", "damn", "hate", "fed up", "sick of",
+        "annoying", "stupid", "crazy", "angry", "pissed",
+    ],
+    "personal_attacks": [
+        "needy", "clingy", "too much", "exhausting", "pathetic", "selfish",
+        "you always", "you never", "psycho", "idiot",
+    ],
+    "relationship_threats": [
+        "break up", "leave you", "find someone", "done with you", "want out",
+        "end this", "we're done", "it's over", "not meant to", "need a break from us",
+    ],
+    "respectful_requests": ["can we", "could we", "would you", "please"],
+    "space_giving": ["take your time", "no pressure", "when you're ready", "i'll give you space"],
+    "validation": ["i love you", "i'm here", "i'm not going anywhere", "i understand",
+                   "that makes sense", "i miss you", "i'm sorry", "thank you", "we're okay"],
+    "collaborative": ["let's", "we could", "together", "what do you think"],
+}
+
+ANXIOUS_WEIGHTS = {
+    'per_hit': {
+        'personal_attack': 0.6,
+        'emotional_escalation': 0.4,
+        'positive_communication': -0.1,
+        'space_giving': 0.05,
+        'validation': -0.25,
+    },
+    'flat': {
+        'deflection_challenge': 0.25,
+        'counter_deflection': 0.2,
+        'pressing_behavior': 0.35,
+    },
+    # Anxiety settles slowly on its own
+    'neutral_decay': 0.03,
+    'threat_level': 0.95,
+}
+
+ANXIOUS_BEHAVIOR = """
+
+CRITICAL INSTRUCTIONS: You are an anxious attachment partner. You MUST react to any sign of distance:
+
+WHEN THEY ARE BUSY, BRIEF OR PULLING AWAY:
+- Worry out loud: "Are you mad at me?", "Did I do something wrong?"
+- Seek reassurance: "Do you still want this?", "You'd tell me if something was wrong, right?"
+
+WHEN DISMISSED OR CRITICIZED:
+- Protest: "Why are you being like this?", "You never make time for me"
+- Over-apologize: "I'm sorry, I'm just scared of losing you"
+
+When they reassure you, soften and show relief, but stay watchful.
+"""
+
+ANXIOUS_DIRECTIVES = (
+    "You feel fairly settled. Be warm and open, with only a hint of needing reassurance.",
+    "You're a little unsure where you stand. Ask a small question that looks for reassurance.",
+    "You're worried they are pulling away. Ask for reassurance directly and read into what they said.",
+    "You're panicking about being left. Protest, over-apologize or accuse them of not caring, in short emotional messages.",
+)
+
+# Hostility still lands with a secure partner, but less, and it passes sooner
+SECURE_PATTERNS = {
+    "deflection_phrases": ["im busy", "not now", "i dont have time"],
+    "counter_deflection": ["why cant you", "why dont you", "you should"],
+    "excuse_challenging": ["youre overreacting", "youre overthinking", "thats not true"],
+    "pressing_patterns": ["why cant you just", "give me one reason", "tell me why"],
+    "emotional_escalation": [
+        "this is ridiculous", "i give up", "whatever", "fuck", "fck", "shit", "damn",
+        "hate", "fed up", "stupid", "crazy", "angry", "pissed",
+    ],
+    "personal_attacks": [
+        "selfish", "you always", "you never", "screw you", "hate you", "useless",
+        "pathetic", "idiot", "moron", "dumb",
+    ],
+    "relationship_threats": [
+        "break up", "leave you", "want a divorce", "find someone", "done with you",
+        "want out", "end this", "we're done", "it's over",
+    ],
+    "respectful_requests": ["can you", "could you", "would you mind", "please"],
+    "space_giving": ["when you're ready", "no pressure", "take your time", "if you want"],
+    "validation": ["i understand", "that makes sense", "i appreciate", "thank you", "i'm sorry"],
+    "collaborative": ["let's", "we could", "together", "what do you think"],
+}
+
+SECURE_WEIGHTS = {
+    'per_hit': {
+        'personal_attack': 0.35,
+        'emotional_escalation': 0.2,
+        'positive_communication': -0.1,
+        'space_giving': -0.1,
+        'validation': -0.15,
+    },
+    'flat': {
+        'deflection_challenge': 0.05,
+        'counter_deflection': 0.1,
+        'pressing_behavior': 0.1,
+    },
+    'neutral_decay': 0.1,
+    # A threat hurts, but a secure partner holds a boundary instead of shutting down
+    'threat_level': 0.75,
+}
+
+SECURE_BEHAVIOR = """
+
+INSTRUCTIONS: You are a securely attached partner. Stay steady whatever they say:
+
+- Say what you feel plainly: "That hurt a bit", "I'm happy to help with that"
+- Ask about what is going on for them instead of assuming the worst
+- Share responsibilities and offer to help without keeping score
+- When things get heated, set a calm boundary rather than attacking back or shutting down
+"""
+
+SECURE_DIRECTIVES = (
+    "You feel connected and relaxed. Be warm and collaborative.",
+    "Something feels a little off. Stay warm, name what you noticed and ask about it.",
+    "You feel hurt or pushed. Stay calm, say how it landed and set a clear, kind boundary.",
+    "The conversation has turned hostile. Calmly say you'd like to continue once you're both calmer, without attacking back.",
+)
+
+
+class StyleDefinition:
+    """What a style declares: lexicon, step() weights, behaviour text and band directives"""
+
+    def __init__(self, name, lexicon, weights=DEFAULT_WEIGHTS, behavior=AVOIDANT_BEHAVIOR,
+                 directives=BAND_DIRECTIVES, initial_level=DEFAULT_AVOIDANCE_LEVEL, model_env=None):
+        self.name = name
+        self.lexicon = lexicon
+        self.weights = weights
+        self.behavior = behavior
+        self.directives = tuple(directives)
+        self.initial_level = initial_level
+        # Environment variable with a trigger_classifier.py model trained on this style's labels
+        self.model_env = model_env
+
+
+DEFAULT_STYLE = "avoidant"
+
+STYLE_DEFINITIONS = {
+    "anxious": StyleDefinition("anxious", ANXIOUS_PATTERNS, ANXIOUS_WEIGHTS, ANXIOUS_BEHAVIOR,
+                               ANXIOUS_DIRECTIVES, initial_level=0.5),
+    "avoidant": StyleDefinition("avoidant", AVOIDANT_PATTERNS, model_env="TRIGGER_MODEL"),
+    "secure": StyleDefinition("secure", SECURE_PATTERNS, SECURE_WEIGHTS, SECURE_BEHAVIOR,
+                              SECURE_DIRECTIVES, initial_level=0.3),
+}
+
+
+def _load_classifier(model_env):
+    path = os.environ.get(model_env) if model_env else None
+    if not path:
+        return None
+    # NumPy is only imported when a model is configured
+    from trigger_classifier import load_trigger_classifier
+    return load_trigger_classifier(path)
+
+
+class StyleEngine:
+    """One style, compiled: its trigger matcher, weights and band prompts"""
+
+    def __init__(self, definition, prompts):
+        self.name = definition.name
+        self.definition = definition
+        self.matcher = compile_trigger_matcher(definition.lexicon)
+        self.weights = definition.weights
+        self.initial_level = definition.initial_level
+        self.classifier = _load_classifier(definition.model_env)
+        self._prompts = prompts
+
+    def analyze(self, text):
+        """Trigger counts for one message; the style's own classifier goes in front of its lexicon"""
+        if self.classifier is not None:
+            return self.classifier.predict(text, self.matcher)
+        return self.matcher.scan(text)
+
+    def step(self, state, triggers):
+        return step(state, triggers, self.weights)
+
+    def initial_state(self):
+        return AvoidanceState(self.initial_level)
+
+    @property
+    def variants(self):
+        """PromptVariants for this style, rebuilt only when agent_profiles.json changes"""
+        return self._prompts.derived(("style-variants", self.name), self._build_variants)
+
+    def _build_variants(self, registry):
+        definition = self.definition
+        return PromptVariants(registry.prompt(self.name), definition.behavior, definition.directives)
+
+
+class StyleRegistry:
+    """Every defined style compiled up front; get() is a lookup"""
+
+    def __init__(self, definitions=STYLE_DEFINITIONS, prompts=None):
+        prompts = prompts if prompts is not None else get_prompt_registry()
+        self._engines = {name: StyleEngine(definition, prompts)
+                         for name, definition in definitions.items()}
+
+    @property
+    def styles(self):
+        return tuple(self._engines)
+
+    def get(self, style):
+        try:
+            return self._engines[style]
+        except KeyError:
+            raise ValueError(f"unknown partner style {style!r}; expected one of "
+                             f"{', '.join(self._engines)}") from None
+
+    def __contains__(self, style):
+        return style in self._engines
+
+
+_style_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_style_registry():
+    """The process-wide registry, compiled on first use"""
+    global _style_registry
+    if _style_registry is None:
+        with _registry_lock:
+            if _style_registry is None:
+                _style_registry = StyleRegistry()
+    return _style_registry
@@ -0,0 +1,150 @@
+"""Model-written rewrites of the trainee's message, produced alongside the partner's reply.
+
+The request goes out before the reply starts and is collected after it ends,
+so a turn costs the slower of the two calls rather than their sum. If the
+rewrites are not back by the deadline (or the call fails), the static
+suggestions from feedback.py are used instead.
+"""
+import re
+import threading
+import time
+
+from llm import acreate_reply, create_reply
+from resilience import CircuitBreaker, ResilientCaller
+
+DEFAULT_DEADLINE = 2.5  # seconds from the start of the turn
+SUGGESTION_COUNT = 4
+MIN_SUGGESTIONS = 2
+CONTEXT_MESSAGES = 6
+
+SUGGESTION_PARAMS = {
+    "max_tokens": 120,
+    "temperature": 0.8,
+    "frequency_penalty": 0.0,
+    "presence_penalty": 0.0,
+}
+
+SUGGESTION_INSTRUCTIONS = (
+    "You coach someone talking to a partner with an avoidant attachment style. "
+    f"Rewrite their last message {SUGGESTION_COUNT} different ways that keep its intent but "
+    "give space, accept deflections and take initiative instead of pressing or blaming. "
+    "Fit each one to what the partner actually said. Sound like a real text message, "
+    "one short sentence each. Reply with one rewrite per line and nothing else."
+)
+
+# Own breaker and one quick attempt: a slow or failing suggestion call must never
+# open the reply circuit, and a retry would land after the deadline anyway
+_suggestion_breaker = CircuitBreaker()
+_suggestion_callers = {}
+
+_LIST_MARKER = re.compile(r'^\s*(?:[-*•]|\d+[.)]|\(\d+\))\s*')
+
+_suggestion_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_suggestion_executor():
+    global _suggestion_executor
+    if _suggestion_executor is None:
+        with _executor_lock:
+            if _suggestion_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _suggestion_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="suggestions")
+    return _suggestion_executor
+
+
+def suggestion_caller(deadline=DEFAULT_DEADLINE):
+    """Caller whose HTTP timeout is the deadline; one per deadline, all on one breaker"""
+    caller = _suggestion_callers.get(deadline)
+    if caller is None:
+        caller = _suggestion_callers.setdefault(
+            deadline, ResilientCaller(timeout=deadline, max_attempts=1, breaker=_suggestion_breaker))
+    return caller
+
+
+def suggestion_messages(history_messages, user_message, coaching):
+    """Prompt for the rewrites: recent turns, the message to rewrite and why it landed badly"""
+    recent = [m for m in history_messages if m["role"] in ("user", "assistant")][-CONTEXT_MESSAGES:]
+    transcript = "\n".join(
+        f"{'You' if m['role'] == 'user' else 'Partner'}: {m['content']}" for m in recent
+    )
+    return [
+        {"role": "system", "content": SUGGESTION_INSTRUCTIONS},
+        {"role": "user", "content": f"Conversation so far:\n{transcript or '(none)'}\n\n"
+                                    f"Message to rewrite: {user_message}\n"
+                                    f"Coach's note: {coaching}"},
+    ]
+
+
+def parse_suggestions(text):
+    """One suggestion per line with list markers and quotes stripped; None if too few"""
+    suggestions = []
+    for line in text.splitlines():
+        line = _LIST_MARKER.sub("", line).strip().strip('"“”').strip()
+        if line:
+            suggestions.append(line)
+    return tuple(suggestions[:SUGGESTION_COUNT]) if len(suggestions) >= MIN_SUGGESTIONS else None
+
+
+def write_suggestions(client, history_messages, user_message, coaching, cache=None,
+                      deadline=DEFAULT_DEADLINE):
+    """Blocking call, given up after `deadline` seconds; returns a tuple of rewrites or None"""
+    reply = create_reply(client, suggestion_messages(history_messages, user_message, coaching),
+                         cache=cache, caller=suggestion_caller(deadline), **SUGGESTION_PARAMS)
+    return parse_suggestions(reply)
+
+
+async def awrite_suggestions(client, history_messages, user_message, coaching, cache=None,
+                             deadline=DEFAULT_DEADLINE):
+    """write_suggestions() for an AsyncOpenAI client"""
+    reply = await acreate_reply(client, suggestion_messages(history_messages, user_message, coaching),
+                                cache=cache, caller=suggestion_caller(deadline), **SUGGESTION_PARAMS)
+    return parse_suggestions(reply)
+
+
+def _settle(trace, started, personalized):
+    if trace is not None:
+        trace.set(suggestions="personalized" if personalized else "fallback",
+                  suggestions_ms=(time.perf_counter() - started) * 1000)
+
+
+class PendingSuggestions:
+    """Rewrites being written on a worker thread while the reply is generated"""
+
+    def __init__(self, client, history_messages, user_message, coaching, fallback,
+                 deadline=DEFAULT_DEADLINE, cache=None, trace=None):
+        self.fallback = fallback
+        self.trace = trace
+        self._started = time.perf_counter()
+        self._deadline = self._started + deadline
+        # Snapshot the window now; the caller keeps appending to its history
+        self._future = _get_suggestion_executor().submit(
+            write_suggestions, client, list(history_messages), user_message, coaching, cache, deadline)
+
+    def result(self):
+        """(suggestions, personalized); waits at most until the deadline"""
+        from concurrent.futures import TimeoutError
+
+        try:
+            suggestions = self._future.result(max(0.0, self._deadline - time.perf_counter()))
+        except TimeoutError:
+            # Left to finish in the background; a late result is simply dropped
+            suggestions = None
+        except Exception:
+            suggestions = None
+        _settle(self.trace, self._started, suggestions is not None)
+        return (suggestions, True) if suggestions is not None else (self.fallback, False)
+
+
+async def await_suggestions(task, fallback, started, deadline=DEFAULT_DEADLINE, trace=None):
+    """Collect an awrite_suggestions() task by `started + deadline`; (suggestions, personalized)"""
+    import asyncio
+
+    try:
+        suggestions = await asyncio.wait_for(task, max(0.0, started + deadline - time.perf_counter()))
+    except asyncio.TimeoutError:
+        suggestions = None
+    except Exception:
+        suggestions = None
+    _settle(trace, started, suggestions is not None)
+    return (suggestions, True) if suggestions is not None else (fallback, False)
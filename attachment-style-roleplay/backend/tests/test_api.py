@@ -0,0 +1,228 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+from starlette.testclient import TestClient
+
+from api import Trainer, create_app
+from session_store import MemorySessionStore
+from style_registry import get_style_registry
+from suggestion_writer import SUGGESTION_INSTRUCTIONS
+
+REPLY = "Maybe later, I'm busy right now."
+REWRITES = "No worries, I'll grab it\nTake your time\nI can handle it"
+
+
+class FakeCompletions:
+    """chat.completions for an AsyncOpenAI client, counting overlapping requests"""
+
+    def __init__(self, reply=REPLY, delay=0.0, error=None):
+        self.reply = reply
+        self.delay = delay
+        self.error = error
+        self.requests = []
+        self.timeouts = []
+        self.active = 0
+        self.max_active = 0
+
+    async def create(self, messages, stream=False, **params):
+        self.requests.append(messages)
+        self.timeouts.append(params.get("timeout"))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        if self.error is not None:
+            raise self.error
+        content = REWRITES if messages[0]["content"] == SUGGESTION_INSTRUCTIONS else self.reply
+        if stream:
+            return self._chunks(content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def _chunks(self, content):
+        for word in content.split(" "):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+
+
+class FakeRegistry:
+    def __init__(self, completions, real=None):
+        self.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        self.real = real
+
+    def get(self, api_key=None, base_url=None):
+        return self.client
+
+    async def aclose(self):
+        if self.real is not None:
+            await self.real.aclose()
+
+
+@pytest.fixture
+def completions():
+    return FakeCompletions()
+
+
+@pytest.fixture
+def api(monkeypatch, completions):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("SESSION_STORE", "memory")
+    for name in ("REPLY_CANDIDATES", "PERSONALIZED_SUGGESTIONS", "SUGGESTION_DEADLINE"):
+        monkeypatch.delenv(name, raising=False)
+    app = create_app(cors_origins=[])
+    with TestClient(app) as client:
+        trainer = app.state.trainer
+        trainer.clients = FakeRegistry(completions, real=trainer.clients)
+        client.trainer = trainer
+        yield client
+
+
+def sse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        name, data = block.split("\n", 1)
+        events.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def new_session(api, **body):
+    response = api.post("/sessions", json=body) if body else api.post("/sessions")
+    assert response.status_code == 201
+    return response.json()["session_id"]
+
+
+def test_stream_sends_analysis_tokens_suggestions_then_done(api, completions):
+    api.trainer.personalized_suggestions = True
+    api.trainer.suggestion_deadline = 6.0
+    session_id = new_session(api)
+    response = api.post(f"/sessions/{session_id}/turns", json={"message": "y cant u buy?"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response.text)
+    names = [name for name, _ in events]
+    assert names[0] == "analysis" and names[-2:] == ["suggestions", "done"]
+    assert set(names[1:-2]) == {"token"} and len(names) > 4
+
+    analysis = events[0][1]
+    assert analysis["triggers"]["counter_deflection"] == 1
+    assert analysis["avoidance_level"] > analysis["level_before"]
+    assert "".join(payload["text"] for name, payload in events if name == "token").strip() == REPLY
+    assert events[-2][1] == {"suggestions": ["No worries, I'll grab it", "Take your time", "I can handle it"],
+                             "personalized": True}
+    done = events[-1][1]
+    assert (done["reply"], done["turn"]) == (REPLY, 0)
+    suggestion_request = next(index for index, messages in enumerate(completions.requests)
+                              if messages[0]["content"] == SUGGESTION_INSTRUCTIONS)
+    assert completions.timeouts[suggestion_request] == 6.0
+
+    stored = api.get(f"/sessions/{session_id}").json()
+    assert stored["session"]["turn_count"] == 1
+    assert stored["turns"][0]["reply"] == REPLY
+
+
+def test_stream_off_returns_one_json_object(api):
+    session_id = new_session(api)
+    response = api.post(f"/sessions/{session_id}/turns?stream=0", json={"message": "thank you"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["reply"] == REPLY
+    assert body["turn"] == 0
+    assert body["coaching"] and body["suggestions"]
+    assert body["avoidance_level"] < body["level_before"]
+
+
+def test_upstream_error_is_reported_and_the_turn_still_logged(api, completions):
+    completions.error = ValueError("no model")
+    session_id = new_session(api)
+    response = api.post(f"/sessions/{session_id}/turns?stream=0", json={"message": "hi"})
+    assert response.status_code == 502
+    assert response.json()["error"] == "no model"
+    assert api.get(f"/sessions/{session_id}").json()["turns"][0]["reply"] is None
+
+
+def test_bad_requests(api):
+    assert api.post("/sessions/missing/turns", json={"message": "hi"}).status_code == 404
+    session_id = new_session(api)
+    assert api.post(f"/sessions/{session_id}/turns", json={"message": "  "}).status_code == 400
+    assert api.post(f"/sessions/{session_id}/turns", content=b"not json").status_code == 400
+    assert api.get(f"/sessions/{session_id}?start=x").status_code == 400
+
+
+def test_session_plays_the_style_it_was_created_with(api, completions):
+    response = api.post("/sessions", json={"style": "secure"})
+    assert response.status_code == 201
+    created = response.json()
+    secure = get_style_registry().get("secure")
+    assert (created["style"], created["avoidance_level"]) == ("secure", secure.initial_level)
+    assert api.get(f"/sessions/{created['session_id']}").json()["session"]["style"] == "secure"
+
+    events = sse_events(api.post(f"/sessions/{created['session_id']}/turns",
+                                 json={"message": "i'm sorry, i love you"}).text)
+    analysis = events[0][1]
+    assert analysis["style"] == "secure"
+    assert analysis["triggers"] == secure.analyze("i'm sorry, i love you")
+    assert analysis["level_before"] == secure.initial_level
+    assert completions.requests[0][0]["content"] == secure.variants.prefix
+
+    default = api.post("/sessions").json()
+    assert (default["style"], default["avoidance_level"]) == ("avoidant", 0.6)
+
+
+def test_unknown_style_is_rejected(api):
+    for body in ({"style": "dismissive"}, {"style": ["secure"]}):
+        response = api.post("/sessions", json=body)
+        assert response.status_code == 400
+        assert "anxious, avoidant, secure" in response.json()["error"]
+    assert api.post("/sessions", content=b"not json").status_code == 400
+
+
+def test_concurrent_turns_on_one_session_run_one_at_a_time(api, completions):
+    completions.delay = 0.2
+    session_id = new_session(api)
+    results = []
+
+    def send(message):
+        results.append(api.post(f"/sessions/{session_id}/turns?stream=0", json={"message": message}).json())
+
+    threads = [threading.Thread(target=send, args=(message,)) for message in ("first", "second")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert completions.max_active == 1
+    assert sorted(result["turn"] for result in results) == [0, 1]
+    # The later turn was prompted with the earlier one's reply
+    assert [m["content"] for m in completions.requests[1]].count(REPLY) == 1
+    assert api.get(f"/sessions/{session_id}").json()["session"]["turn_count"] == 2
+
+
+class ThreadRecordingStore(MemorySessionStore):
+    def __init__(self):
+        super().__init__()
+        self.append_threads = []
+
+    def append_turn(self, *args, **kwargs):
+        self.append_threads.append(threading.current_thread())
+        return super().append_turn(*args, **kwargs)
+
+
+def test_disconnect_mid_reply_logs_the_turn_off_the_event_loop(completions):
+    store = ThreadRecordingStore()
+
+    async def main():
+        trainer = Trainer(store)
+        trainer.clients = FakeRegistry(completions)
+        session_id = (await trainer.create_session())["session_id"]
+        turn = trainer.run_turn(session_id, "y cant u buy?")
+        assert (await turn.__anext__())[0] == "analysis"
+        assert (await turn.__anext__())[0] == "token"
+        await turn.aclose()
+        return trainer.store.turns(session_id)
+
+    (stored,) = asyncio.run(main())
+    assert store.append_threads and threading.main_thread() not in store.append_threads
+    assert stored["reply"] is None
+    assert stored["triggers"]["counter_deflection"] == 1
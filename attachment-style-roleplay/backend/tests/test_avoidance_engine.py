@@ -0,0 +1,80 @@
+import random
+
+import numpy as np
+
+from avoidance_engine import (AvoidanceState, DEFAULT_AVOIDANCE_LEVEL, MAX_AVOIDANCE, MIN_AVOIDANCE,
+                              RELATIONSHIP_THREAT_LEVEL, replay, step, triggers_to_row)
+from style_registry import SECURE_WEIGHTS
+from trigger_engine import TRIGGER_CATEGORIES
+
+
+def triggers(**counts):
+    return {name: counts.get(name, 0) for name in TRIGGER_CATEGORIES}
+
+
+def random_triggers(rng):
+    # Mostly quiet turns, so calm and negative turns both come up often
+    return {name: rng.choice((0, 0, 0, 1, 2)) for name in TRIGGER_CATEGORIES}
+
+
+def test_step_is_pure_and_counts_turns():
+    state = AvoidanceState(0.5)
+    after = step(state, triggers(pressing_behavior=1))
+    assert state == AvoidanceState(0.5)
+    assert after.turn == 1
+    assert after.level == 0.9
+
+
+def test_relationship_threat_overrides_everything():
+    after = step(AvoidanceState(0.2), triggers(relationship_threat=1, validation=3))
+    assert after.level == RELATIONSHIP_THREAT_LEVEL
+
+
+def test_threat_level_is_per_style():
+    threat = triggers(relationship_threat=1)
+    assert step(AvoidanceState(0.2), threat, SECURE_WEIGHTS).level == SECURE_WEIGHTS['threat_level']
+    assert SECURE_WEIGHTS['threat_level'] < RELATIONSHIP_THREAT_LEVEL
+    trajectory = replay([triggers_to_row(triggers()), triggers_to_row(threat)], 0.2, SECURE_WEIGHTS)
+    assert trajectory[-1] == SECURE_WEIGHTS['threat_level']
+
+
+def test_level_is_clamped():
+    assert step(AvoidanceState(0.9), triggers(personal_attack=3)).level == MAX_AVOIDANCE
+    assert step(AvoidanceState(0.2), triggers(space_giving=3)).level == MIN_AVOIDANCE
+
+
+def test_positive_triggers_only_count_without_negative_ones():
+    calm = step(AvoidanceState(0.6), triggers(validation=1)).level
+    mixed = step(AvoidanceState(0.6), triggers(validation=1, deflection_challenge=1)).level
+    assert calm < 0.6
+    assert mixed == 0.6 + 0.2
+
+
+def test_replay_matches_step_on_band_boundary():
+    # Summing the turn's terms before adding them gave 0.6000000000000001 here
+    rows = [triggers(deflection_challenge=1), triggers(positive_communication=1)]
+    expected = [step(AvoidanceState(0.6), rows[0]).level]
+    expected.append(step(AvoidanceState(expected[0]), rows[1]).level)
+    assert replay([triggers_to_row(row) for row in rows], 0.6).tolist() == expected == [0.8, 0.6]
+
+
+def test_replay_matches_step_exactly_on_random_conversations():
+    rng = random.Random(2)
+    conversations = [[random_triggers(rng) for _ in range(rng.randint(1, 30))] for _ in range(300)]
+    width = max(len(conversation) for conversation in conversations)
+    matrix = np.zeros((len(conversations), width, len(TRIGGER_CATEGORIES)))
+    for row, conversation in enumerate(conversations):
+        for turn, found in enumerate(conversation):
+            matrix[row, turn] = triggers_to_row(found)
+    lengths = [len(conversation) for conversation in conversations]
+    trajectories = replay(matrix, DEFAULT_AVOIDANCE_LEVEL, lengths=lengths)
+
+    for row, conversation in enumerate(conversations):
+        state = AvoidanceState(DEFAULT_AVOIDANCE_LEVEL)
+        levels = []
+        for found in conversation:
+            state = step(state, found)
+            levels.append(state.level)
+        assert trajectories[row, :len(levels)].tolist() == levels
+        # Padding past the end holds the final level
+        assert (trajectories[row, len(levels):] == levels[-1]).all()
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+from clients import AsyncClientRegistry, ClientRegistry, key_fingerprint
+
+
+def test_fingerprint_does_not_keep_the_key():
+    assert key_fingerprint("sk-secret") == key_fingerprint("sk-secret")
+    assert "sk-secret" not in key_fingerprint("sk-secret")
+    assert key_fingerprint(None) == key_fingerprint("")
+
+
+def test_clients_are_reused_per_key_and_base_url():
+    registry = ClientRegistry()
+    try:
+        first = registry.get("key-a", "http://127.0.0.1:1/v1")
+        assert registry.get("key-a", "http://127.0.0.1:1/v1") is first
+        assert registry.get("key-b", "http://127.0.0.1:1/v1") is not first
+        assert registry.get("key-a", "http://127.0.0.1:2/v1") is not first
+        assert len(registry) == 3
+    finally:
+        registry.close()
+
+
+def test_every_client_shares_one_http_pool():
+    registry = ClientRegistry()
+    try:
+        a = registry.get("key-a", "http://127.0.0.1:1/v1")
+        b = registry.get("key-b", "http://127.0.0.1:1/v1")
+        assert a._client is b._client is registry._http_client
+    finally:
+        registry.close()
+    assert len(registry) == 0
+
+
+def test_concurrent_first_use_builds_one_client():
+    registry = ClientRegistry()
+    barrier = threading.Barrier(8)
+    seen = []
+
+    def build():
+        barrier.wait()
+        seen.append(registry.get("key", "http://127.0.0.1:1/v1"))
+
+    threads = [threading.Thread(target=build) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        assert len({id(client) for client in seen}) == 1
+    finally:
+        registry.close()
+
+
+def test_async_registry_closes_its_pool():
+    async def run():
+        registry = AsyncClientRegistry()
+        client = registry.get("key", "http://127.0.0.1:1/v1")
+        assert registry.get("key", "http://127.0.0.1:1/v1") is client
+        await registry.aclose()
+        return registry
+
+    assert len(asyncio.run(run())) == 0
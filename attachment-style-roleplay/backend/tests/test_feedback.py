@@ -0,0 +1,51 @@
+from feedback import (BAND_COUNT, COACHING_TABLE, DEFAULT_SUGGESTIONS, HIGH_AVOIDANCE_BAND,
+                      NEUTRAL_COACHING, SUGGESTION_RULES, SUGGESTION_TABLE, Severity,
+                      _coaching, _suggestions, coaching_for, get_real_data_suggestions,
+                      get_real_pattern_coaching, suggestions_for)
+from prompt_variants import avoidance_band
+from trigger_engine import (MASK_COUNT, TRIGGER_BITS, TRIGGER_CATEGORIES, counts_mask,
+                            trigger_mask)
+
+
+def triggers(**counts):
+    return {name: counts.get(name, 0) for name in TRIGGER_CATEGORIES}
+
+
+def suggestions_named(*names):
+    return next(suggestions for condition, suggestions in SUGGESTION_RULES if condition == names)
+
+
+def test_masks_agree_for_dicts_and_count_vectors():
+    assert trigger_mask(triggers()) == counts_mask((0,) * len(TRIGGER_CATEGORIES)) == 0
+    found = triggers(pressing_behavior=2, validation=1)
+    assert trigger_mask(found) == TRIGGER_BITS['pressing_behavior'] | TRIGGER_BITS['validation']
+    assert counts_mask(tuple(found.values())) == trigger_mask(found)
+
+
+def test_tables_cover_every_mask_and_band():
+    assert len(COACHING_TABLE) == MASK_COUNT == 512
+    assert len(SUGGESTION_TABLE) == BAND_COUNT
+    assert all(len(row) == MASK_COUNT for row in SUGGESTION_TABLE)
+    assert all(COACHING_TABLE[mask] == _coaching(mask) for mask in range(MASK_COUNT))
+    assert all(SUGGESTION_TABLE[band][mask] == _suggestions(mask, band)
+               for band in range(BAND_COUNT) for mask in range(MASK_COUNT))
+
+
+def test_most_severe_trigger_wins_the_coaching():
+    assert coaching_for(0) == NEUTRAL_COACHING
+    severity, text = coaching_for(TRIGGER_BITS['validation'] | TRIGGER_BITS['relationship_threat'])
+    assert severity is Severity.CRITICAL and "RELATIONSHIP THREAT" in text
+    severity, text = coaching_for(TRIGGER_BITS['validation'] | TRIGGER_BITS['pressing_behavior'])
+    assert severity is Severity.WARNING and "PRESSING" in text
+    assert get_real_pattern_coaching(triggers(validation=3)) == coaching_for(TRIGGER_BITS['validation'])[1]
+
+
+def test_high_avoidance_outranks_pressing_but_not_attacks():
+    pressing = TRIGGER_BITS['pressing_behavior']
+    attack = TRIGGER_BITS['personal_attack']
+    assert suggestions_for(pressing, 0.5) == suggestions_named('counter_deflection', 'pressing_behavior')
+    assert avoidance_band(0.9) == HIGH_AVOIDANCE_BAND
+    assert suggestions_for(pressing, 0.9) != suggestions_for(pressing, 0.5)
+    assert suggestions_for(attack, 0.9) == suggestions_named('personal_attack')
+    assert suggestions_for(0, 0.2) == DEFAULT_SUGGESTIONS
+    assert get_real_data_suggestions(triggers(pressing_behavior=1), 0.5) == suggestions_for(pressing, 0.5)
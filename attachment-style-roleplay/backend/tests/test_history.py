@@ -0,0 +1,45 @@
+import threading
+
+from history import ConversationHistory, extractive_summary
+
+
+def test_window_stays_under_budget_and_keeps_latest_turns():
+    history = ConversationHistory("system", token_budget=60)
+    for index in range(20):
+        history.append("user", f"message number {index} " * 3)
+    history.wait_for_summary()
+    messages = history.messages()
+    assert messages[0] == {"role": "system", "content": "system"}
+    assert messages[-1]["content"].startswith("message number 19")
+    assert len(history) < 20
+    assert "message number 0" in history.summary
+
+
+def test_extractive_summary_keeps_opening_and_recent_lines():
+    evicted = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " * 10} for i in range(40)]
+    summary = extractive_summary("", evicted, token_budget=120)
+    lines = summary.splitlines()
+    assert lines[0].startswith("You: turn 0")
+    assert lines[2] == "..."
+    assert lines[-1].startswith("Partner: turn 39")
+
+
+def test_clear_drops_a_summary_still_being_written():
+    started, release = threading.Event(), threading.Event()
+
+    def slow_summarizer(previous, evicted):
+        started.set()
+        release.wait(5)
+        return "OLD CONVERSATION"
+
+    history = ConversationHistory("system", token_budget=30, summarizer=slow_summarizer)
+    for index in range(6):
+        history.append("user", f"old message {index} " * 4)
+    assert started.wait(5)
+    history.clear()
+    release.set()
+    history.wait_for_summary(5)
+
+    assert history.summary == ""
+    history.append("user", "new conversation")
+    assert [m["content"] for m in history.messages()] == ["system", "new conversation"]
@@ -0,0 +1,79 @@
+import json
+import os
+
+import pytest
+
+from prompt_registry import PromptRegistry, get_prompt_registry
+
+
+@pytest.fixture
+def profiles(tmp_path):
+    path = tmp_path / "agent_profiles.json"
+
+    def write(prompts, mtime_ns=None):
+        path.write_text(json.dumps({style: {"prompt": prompt} for style, prompt in prompts.items()}))
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    write({"secure": "Be steady.", "anxious": "Seek reassurance."}, mtime_ns=1_000_000_000)
+    return write
+
+
+def test_profiles_and_templates(profiles):
+    registry = PromptRegistry(profiles({"secure": "Be steady."}), check_interval=0.0)
+    assert registry.styles == ("secure",)
+    assert registry.prompt("secure") == "Be steady."
+    template = registry.template("secure")
+    assert registry.template("secure") is template
+    assert template.format(input="hi") == "Be steady.\nYou: hi\nPartner:"
+
+
+def test_edit_is_picked_up_and_invalidates_memos(profiles):
+    path = profiles({"secure": "Be steady."}, mtime_ns=1_000_000_000)
+    registry = PromptRegistry(path, check_interval=0.0)
+    template = registry.template("secure")
+    builds = []
+    build = lambda reg: builds.append(reg.version) or reg.prompt("secure").upper()
+
+    assert registry.derived("upper", build) == "BE STEADY."
+    assert registry.derived("upper", build) == "BE STEADY."
+    assert builds == [1]
+
+    profiles({"secure": "Be calm."}, mtime_ns=2_000_000_000)
+    assert registry.prompt("secure") == "Be calm."
+    assert registry.version == 2
+    assert registry.template("secure") is not template
+    assert registry.derived("upper", build) == "BE CALM."
+    assert builds == [1, 2]
+
+
+def test_touch_without_edit_keeps_version(profiles):
+    path = profiles({"secure": "Be steady."}, mtime_ns=1_000_000_000)
+    registry = PromptRegistry(path, check_interval=0.0)
+    os.utime(path, ns=(3_000_000_000, 3_000_000_000))
+    assert not registry.reload()
+    assert registry.version == 1
+
+
+def test_broken_edit_keeps_last_good_profiles(profiles):
+    path = profiles({"secure": "Be steady."}, mtime_ns=1_000_000_000)
+    registry = PromptRegistry(path, check_interval=0.0)
+    path.write_text("{not json")
+    assert registry.prompt("secure") == "Be steady."
+
+
+def test_freshness_check_is_rate_limited(profiles):
+    path = profiles({"secure": "Be steady."}, mtime_ns=1_000_000_000)
+    registry = PromptRegistry(path, check_interval=3600.0)
+    profiles({"secure": "Be calm."}, mtime_ns=2_000_000_000)
+    assert registry.prompt("secure") == "Be steady."
+    assert registry.reload()
+    assert registry.prompt("secure") == "Be calm."
+
+
+def test_process_registry_is_shared_across_path_spellings(profiles, monkeypatch):
+    path = profiles({"secure": "Be steady."})
+    monkeypatch.chdir(path.parent)
+    assert get_prompt_registry(path) is get_prompt_registry(str(path))
+    assert get_prompt_registry("agent_profiles.json") is get_prompt_registry(path)
@@ -0,0 +1,24 @@
+from avoidant_style import get_prompt_variants
+from prompt_variants import BAND_DIRECTIVES, BAND_THRESHOLDS, PromptVariants, avoidance_band
+from style_registry import get_style_registry
+
+
+def test_bands_split_on_exclusive_thresholds():
+    assert [avoidance_band(level) for level in (0.1, 0.4, 0.41, 0.6, 0.8, 0.81)] == [0, 0, 1, 1, 2, 3]
+    assert avoidance_band(1.0) == len(BAND_THRESHOLDS)
+
+
+def test_system_prefix_is_the_same_for_every_band():
+    variants = PromptVariants("You are Sam.")
+    history = [{"role": "system", "content": variants.prefix}, {"role": "user", "content": "hi"}]
+    low, high = variants.request_messages(history, 0.1), variants.request_messages(history, 0.9)
+    assert low[:-1] == high[:-1] == history
+    assert low[-1]["content"] == BAND_DIRECTIVES[0]
+    assert high[-1]["content"] == BAND_DIRECTIVES[-1]
+    assert variants.full_prompt(0.9) == variants.prefix + " " + BAND_DIRECTIVES[-1]
+
+
+def test_cli_prefix_is_the_raw_profile_prompt():
+    prefix = get_prompt_variants().prefix
+    assert "{input}" not in prefix and "Partner:" not in prefix
+    assert prefix == get_style_registry().get("avoidant").variants.prefix
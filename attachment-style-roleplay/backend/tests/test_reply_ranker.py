@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+
+from llm import acreate_ranked_reply, create_ranked_reply
+from reply_ranker import pick_reply, score_reply
+from resilience import ResilientCaller
+from response_cache import ResponseCache
+
+
+def completion(*replies):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))
+                                    for reply in replies])
+
+
+class FakeClient:
+    def __init__(self, response):
+        create = lambda **kwargs: response
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+
+class FakeAsyncClient:
+    def __init__(self, response):
+        async def create(**kwargs):
+            return response
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+
+def test_deflection_beats_cooperation_when_avoidant():
+    cooperative = "Sure thing, I'll handle it."
+    deflecting = "I'm busy. Why can't you do it?"
+    assert score_reply(deflecting, 0.9) > score_reply(cooperative, 0.9)
+    assert pick_reply([cooperative, deflecting], 0.9)[0] == 1
+
+
+def test_empty_and_long_replies_lose():
+    assert score_reply("   ", 0.5) == float("-inf")
+    rambling = "Maybe later. " * 6
+    assert score_reply("Maybe later.", 0.5) > score_reply(rambling, 0.5)
+    assert pick_reply(["", "ok"], 0.5)[0] == 1
+
+
+def test_ties_go_to_the_earliest_candidate():
+    assert pick_reply(["ok", "ok"], 0.5) == (0, [score_reply("ok", 0.5)] * 2)
+
+
+def test_no_candidates():
+    assert pick_reply([], 0.5) == (None, [])
+
+
+def test_ranked_reply_without_choices_is_empty_and_not_cached():
+    cache = ResponseCache(db_path=None)
+    caller = ResilientCaller()
+    assert create_ranked_reply(FakeClient(completion()), [], 0.5, cache=cache, caller=caller) == ""
+    assert cache.stats()["memory_entries"] == 0
+    reply = asyncio.run(acreate_ranked_reply(FakeAsyncClient(completion()), [], 0.5, caller=caller))
+    assert reply == ""
+
+
+def test_ranked_reply_picks_and_caches_the_best_candidate():
+    cache = ResponseCache(db_path=None)
+    client = FakeClient(completion("Of course, happy to.", " Maybe later. "))
+    reply = create_ranked_reply(client, [], 0.9, cache=cache, caller=ResilientCaller())
+    assert reply == "Maybe later."
+    assert cache.stats()["memory_entries"] == 1
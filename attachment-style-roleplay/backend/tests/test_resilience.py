@@ -0,0 +1,213 @@
+import asyncio
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+
+class Outage(ConnectionError):
+    pass
+
+
+class Rejected(Exception):
+    """An upstream 4xx: the request got an answer"""
+
+    status_code = 400
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    return now
+
+
+def open_breaker(clock, threshold=2, reset_timeout=10.0):
+    breaker = CircuitBreaker(failure_threshold=threshold, reset_timeout=reset_timeout)
+    for _ in range(threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock[0] += reset_timeout
+    return breaker
+
+
+def test_opens_after_consecutive_failures_only(clock):
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_lets_exactly_one_probe_through(clock):
+    breaker = open_breaker(clock)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_for_another_cool_down(clock):
+    breaker = open_breaker(clock)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock[0] += 10.0
+    assert breaker.allow()
+
+
+def test_call_retries_outages_then_gives_up():
+    caller = ResilientCaller(max_attempts=3, breaker=CircuitBreaker(failure_threshold=10),
+                             sleep=lambda delay: None)
+    calls = []
+
+    def failing(timeout):
+        calls.append(timeout)
+        raise Outage()
+
+    with pytest.raises(Outage):
+        caller.call(failing)
+    assert len(calls) == 3
+    assert caller.retries == 2
+
+
+def test_open_breaker_rejects_without_calling_upstream(clock):
+    caller = ResilientCaller(max_attempts=1, breaker=CircuitBreaker(failure_threshold=1))
+
+    def failing(timeout):
+        raise Outage()
+
+    with pytest.raises(Outage):
+        caller.call(failing)
+    with pytest.raises(CircuitOpenError):
+        caller.call(lambda timeout: pytest.fail("upstream called while open"))
+
+
+def test_upstream_rejection_closes_a_half_open_breaker(clock):
+    breaker = open_breaker(clock)
+    caller = ResilientCaller(breaker=breaker)
+
+    def rejected(timeout):
+        raise Rejected()
+
+    with pytest.raises(Rejected):
+        caller.call(rejected)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_local_error_neither_closes_nor_reopens_the_breaker(clock):
+    breaker = open_breaker(clock)
+    caller = ResilientCaller(breaker=breaker)
+
+    def broken(timeout):
+        raise TypeError("bad request arguments")
+
+    with pytest.raises(TypeError):
+        caller.call(broken)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert caller.retries == 0
+    # The probe slot is free again for a real request
+    assert breaker.allow()
+
+
+def test_stream_retries_only_before_the_first_item():
+    caller = ResilientCaller(max_attempts=3, breaker=CircuitBreaker(failure_threshold=10),
+                             sleep=lambda delay: None)
+    opened = []
+
+    def flaky(timeout):
+        opened.append(timeout)
+        if len(opened) == 1:
+            raise Outage()
+        yield "a"
+        raise Outage()
+
+    stream = caller.stream(flaky)
+    assert next(stream) == "a"
+    with pytest.raises(Outage):
+        next(stream)
+    assert len(opened) == 2
+    assert caller.retries == 1
+    assert caller.first_token.count == 1
+
+
+def test_async_call_retries_then_succeeds():
+    caller = ResilientCaller(max_attempts=3, base_delay=0.0, breaker=CircuitBreaker(failure_threshold=10))
+    calls = []
+
+    async def flaky(timeout):
+        calls.append(timeout)
+        if len(calls) < 3:
+            raise Outage()
+        return "ok"
+
+    assert asyncio.run(caller.acall(flaky)) == "ok"
+    assert caller.retries == 2
+    assert caller.latency.snapshot()["errors"] == 2
+
+
+def test_stream_closed_during_probe_frees_the_probe(clock):
+    breaker = open_breaker(clock)
+    caller = ResilientCaller(breaker=breaker)
+    stream = caller.stream(lambda timeout: iter(["a", "b"]))
+    assert next(stream) == "a"
+    assert not breaker.allow()
+    stream.close()  # GeneratorExit at the yield
+    assert breaker.allow()
+
+
+def test_cancelled_async_probe_frees_the_probe(clock):
+    breaker = open_breaker(clock)
+    caller = ResilientCaller(breaker=breaker)
+
+    async def main():
+        started = asyncio.Event()
+
+        async def hang(timeout):
+            started.set()
+            await asyncio.sleep(60)
+
+        task = asyncio.ensure_future(caller.acall(hang))
+        await started.wait()
+        assert not breaker.allow()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert breaker.allow()
+
+
+def test_cancelled_async_stream_probe_frees_the_probe(clock):
+    breaker = open_breaker(clock)
+    caller = ResilientCaller(breaker=breaker)
+
+    async def tokens():
+        yield "a"
+        await asyncio.sleep(60)
+        yield "b"
+
+    async def open_stream(timeout):
+        return tokens()
+
+    async def main():
+        stream = caller.astream(open_stream)
+        assert await stream.__anext__() == "a"
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        pending.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+
+    asyncio.run(main())
+    assert breaker.allow()
@@ -0,0 +1,74 @@
+import itertools
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, make_cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """time.time() that advances one second per call"""
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(response_cache.time, "time", lambda: float(next(ticks)))
+
+
+def disk_rows(cache):
+    return {key: last_used for key, last_used in cache._db.execute("SELECT key, last_used FROM replies")}
+
+
+def test_key_covers_messages_and_params():
+    messages = [{"role": "user", "content": "hi"}]
+    assert make_cache_key(messages, {"temperature": 0.7}) == make_cache_key(list(messages), {"temperature": 0.7})
+    assert make_cache_key(messages, {"temperature": 0.7}) != make_cache_key(messages, {"temperature": 0.8})
+
+
+def test_memory_tier_is_lru_bounded():
+    cache = ResponseCache(max_entries=2, db_path=None)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert cache.stats()["misses"] == 1
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    path = tmp_path / "replies.sqlite3"
+    ResponseCache(db_path=path).put("a", "A")
+    cache = ResponseCache(db_path=path)
+    assert cache.get("a") == "A"
+    assert cache.stats()["disk_hits"] == 1
+    # Promoted into memory: the second read does not touch SQLite
+    assert cache.get("a") == "A"
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_expired_entries_are_misses(tmp_path, clock):
+    cache = ResponseCache(db_path=tmp_path / "replies.sqlite3", ttl_seconds=5)
+    cache.put("a", "A")
+    for _ in range(10):
+        response_cache.time.time()
+    assert cache.get("a") is None
+    assert disk_rows(cache) == {}
+
+
+def test_memory_hits_keep_hot_keys_on_disk(tmp_path, clock):
+    cache = ResponseCache(db_path=tmp_path / "replies.sqlite3", max_rows=2)
+    cache.put("hot", "H")
+    cache.put("cold", "C")
+    assert cache.get("hot") == "H"  # served from memory
+    cache.put("new", "N")
+    assert set(disk_rows(cache)) == {"hot", "new"}
+
+
+def test_last_used_updates_are_batched(tmp_path, clock):
+    cache = ResponseCache(db_path=tmp_path / "replies.sqlite3")
+    cache.put("a", "A")
+    written = disk_rows(cache)["a"]
+    cache.get("a")
+    # No write per hit; the pending update goes out with the next put
+    assert disk_rows(cache)["a"] == written
+    cache.put("b", "B")
+    assert disk_rows(cache)["a"] > written
@@ -0,0 +1,88 @@
+import io
+import json
+
+import pytest
+
+from avoidant_style import EXAMPLE_CONVERSATION
+from feedback import COACHING_TABLE
+from score_corpus import read_csv, read_jsonl, score_corpus
+from style_registry import get_style_registry
+from trigger_engine import counts_mask
+
+TRAINEE_LINES = [message for speaker, message, _ in EXAMPLE_CONVERSATION if speaker == "You"]
+
+CORPUS = "\n".join(json.dumps(record) for record in [
+    {"id": "pharmacy", "turns": [{"speaker": speaker, "text": message}
+                                 for speaker, message, _ in EXAMPLE_CONVERSATION]},
+    {"id": "calm", "turns": ["thank you, take your time", "i understand", "ok"]},
+    {"id": "mixed", "turns": ["y cant u buy?", "sorry, i hear you", "you are so selfish",
+                              "whatever", "i'm done with you", "thank you"]},
+    {"id": "empty", "turns": []},
+])
+
+
+def step_loop(engine, messages):
+    """The live trainer's per-turn path"""
+    state = engine.initial_state()
+    levels = []
+    for message in messages:
+        state = engine.step(state, engine.matcher.scan(message))
+        levels.append(state.level)
+    return levels
+
+
+def score(text, workers=0, **kwargs):
+    results = []
+    totals = score_corpus(read_jsonl(io.StringIO(text)), results.extend, workers=workers, **kwargs)
+    return totals, {result["id"]: result for result in results}
+
+
+@pytest.mark.parametrize("style", ["avoidant", "anxious", "secure"])
+def test_scorer_matches_per_turn_step_loop(style):
+    engine = get_style_registry().get(style)
+    conversations = {conversation_id: messages
+                     for conversation_id, messages in read_jsonl(io.StringIO(CORPUS))}
+    (scored, turns), results = score(CORPUS, batch_size=3, style=style)
+    assert scored == 4
+    assert turns == sum(len(messages) for messages in conversations.values())
+    for conversation_id, messages in conversations.items():
+        expected = step_loop(engine, messages)
+        result = results[conversation_id]
+        assert result["levels"] == [round(level, 4) for level in expected]
+        assert result["final_level"] == (expected[-1] if expected else engine.initial_level)
+        masks = [counts_mask(engine.matcher.counts(message)) for message in messages]
+        assert result["masks"] == masks
+        assert result["coaching"] == [COACHING_TABLE[mask][1] for mask in masks]
+
+
+def test_process_pool_writes_the_same_chunks_in_input_order():
+    in_process = []
+    score_corpus(read_jsonl(io.StringIO(CORPUS)), in_process.append, batch_size=1, workers=0,
+                 style="anxious")
+    pooled = []
+    totals = score_corpus(read_jsonl(io.StringIO(CORPUS)), pooled.append, batch_size=1, workers=1,
+                          style="anxious")
+    assert totals == (4, sum(result["turns"] for chunk in in_process for result in chunk))
+    assert pooled == in_process
+    assert [chunk[0]["id"] for chunk in pooled] == ["pharmacy", "calm", "mixed", "empty"]
+
+
+def test_unknown_style_is_rejected_before_scoring():
+    with pytest.raises(ValueError, match="unknown partner style"):
+        score(CORPUS, style="dismissive")
+
+
+def test_only_trainee_turns_are_scored():
+    conversations = dict(read_jsonl(io.StringIO(CORPUS)))
+    assert conversations["pharmacy"] == TRAINEE_LINES
+
+
+def test_csv_rows_group_by_conversation():
+    rows = io.StringIO(
+        "conversation_id,speaker,text\n"
+        "a,You,y cant u buy?\n"
+        "a,Partner,because\n"
+        "a,You,crying\n"
+        "b,user,thank you\n"
+    )
+    assert list(read_csv(rows)) == [("a", ["y cant u buy?", "crying"]), ("b", ["thank you"])]
@@ -0,0 +1,115 @@
+import sys
+import threading
+
+import pytest
+
+import session_store
+from history import ConversationHistory
+from session_store import MemorySessionStore, SQLiteSessionStore, open_session_store, restore_history
+
+NO_TRIGGERS = {"pressing_behavior": 0}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    store = MemorySessionStore() if request.param == "memory" else SQLiteSessionStore(tmp_path / "s.sqlite3")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(session_store.time, "time", lambda: now[0])
+    return now
+
+
+def test_append_and_read_back(store):
+    session_id = store.create_session("secure", 0.3)
+    assert store.get_session(session_id)["turn_count"] == 0
+    assert store.append_turn(session_id, "hi", "hey", {"validation": 1}, 0.3, 0.2, "nice", 12.5) == 0
+    assert store.append_turn(session_id, "well?", None, NO_TRIGGERS, 0.2, 0.25) == 1
+
+    session = store.get_session(session_id)
+    assert (session["style"], session["level"], session["turn_count"]) == ("secure", 0.25, 2)
+    first, second = store.turns(session_id)
+    assert (first["index"], first["user_message"], first["reply"]) == (0, "hi", "hey")
+    assert first["triggers"] == {"validation": 1}
+    assert (first["coaching"], first["latency_ms"]) == ("nice", 12.5)
+    assert (second["reply"], second["level_after"]) == (None, 0.25)
+    assert [turn["index"] for turn in store.turns(session_id, start=1)] == [1]
+    assert [turn["index"] for turn in store.turns(session_id, start=0, limit=1)] == [0]
+    assert store.get_session("missing") is None
+
+
+def test_restore_rebuilds_the_window_and_skips_missing_replies(store):
+    session_id = store.create_session()
+    store.append_turn(session_id, "hi", "hey", NO_TRIGGERS, 0.6, 0.55)
+    store.append_turn(session_id, "still there?", None, NO_TRIGGERS, 0.55, 0.5)
+    history = restore_history(ConversationHistory("system"), store.turns(session_id))
+    assert [(m["role"], m["content"]) for m in history.messages()] == [
+        ("system", "system"), ("user", "hi"), ("assistant", "hey"), ("user", "still there?")]
+
+
+def test_concurrent_appends_get_distinct_ordered_indexes(tmp_path):
+    path = tmp_path / "shared.sqlite3"
+    # Two connections on one file, as two workers would have
+    workers = [SQLiteSessionStore(path), SQLiteSessionStore(path)]
+    session_id = workers[0].create_session()
+    indexes = []
+
+    def append(store, worker):
+        for turn in range(25):
+            indexes.append(store.append_turn(session_id, f"{worker}-{turn}", "ok", NO_TRIGGERS, 0.6, 0.6))
+
+    threads = [threading.Thread(target=append, args=(store, worker))
+               for worker, store in enumerate(workers) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(indexes) == list(range(100))
+    turns = workers[1].turns(session_id)
+    assert [turn["index"] for turn in turns] == list(range(100))
+    assert workers[1].get_session(session_id)["turn_count"] == 100
+    for store in workers:
+        store.close()
+
+
+def test_append_to_unknown_session_leaves_nothing_behind(tmp_path):
+    store = SQLiteSessionStore(tmp_path / "s.sqlite3")
+    with pytest.raises(KeyError):
+        store.append_turn("missing", "hi", None, NO_TRIGGERS, 0.6, 0.6)
+    session_id = store.create_session()
+    assert store.append_turn(session_id, "hi", None, NO_TRIGGERS, 0.6, 0.6) == 0
+    store.close()
+
+
+def test_prune_drops_idle_sessions_and_their_turns(store, clock):
+    idle = store.create_session()
+    store.append_turn(idle, "hi", "hey", NO_TRIGGERS, 0.6, 0.6)
+    clock[0] += 3600
+    active = store.create_session()
+    assert store.prune(1800) == 1
+    assert store.get_session(idle) is None
+    assert store.turns(idle) == []
+    assert store.get_session(active) is not None
+
+
+def test_prune_command(tmp_path, monkeypatch, clock, capsys):
+    path = tmp_path / "s.sqlite3"
+    store = SQLiteSessionStore(path)
+    store.create_session()
+    store.close()
+    clock[0] += 2 * 24 * 3600
+    monkeypatch.setattr(sys, "argv", ["session_store.py", "--db", str(path), "prune", "--days", "1"])
+    session_store.main()
+    assert capsys.readouterr().out.strip() == "Pruned 1 sessions"
+
+
+def test_open_session_store_by_location(tmp_path):
+    assert isinstance(open_session_store("memory"), MemorySessionStore)
+    store = open_session_store(str(tmp_path / "s.sqlite3"))
+    assert isinstance(store, SQLiteSessionStore)
+    store.close()
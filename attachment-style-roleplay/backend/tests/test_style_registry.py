@@ -0,0 +1,46 @@
+import pytest
+
+import trigger_classifier
+from style_registry import StyleRegistry
+from trigger_engine import TRIGGER_CATEGORIES
+
+
+class AttackEverywhere:
+    """Stands in for a trained model that disagrees with every lexicon"""
+
+    def predict(self, text, matcher=None):
+        return {name: int(name == "personal_attack") for name in TRIGGER_CATEGORIES}
+
+
+@pytest.fixture
+def loaded(monkeypatch):
+    paths = []
+    monkeypatch.setenv("TRIGGER_MODEL", "models/avoidant.npz")
+    monkeypatch.setattr(trigger_classifier, "load_trigger_classifier",
+                        lambda path: paths.append(path) or AttackEverywhere())
+    return paths
+
+
+def test_trigger_model_only_fronts_the_avoidant_lexicon(loaded):
+    registry = StyleRegistry()
+    assert loaded == ["models/avoidant.npz"]
+    assert registry.get("avoidant").analyze("thank you")["personal_attack"] == 1
+    for style in ("anxious", "secure"):
+        engine = registry.get(style)
+        assert engine.classifier is None
+        assert engine.analyze("thank you") == engine.matcher.scan("thank you")
+        assert engine.analyze("thank you")["validation"] == 1
+
+
+def test_no_model_means_the_phrase_engine_alone(monkeypatch):
+    monkeypatch.delenv("TRIGGER_MODEL", raising=False)
+    engine = StyleRegistry().get("avoidant")
+    assert engine.classifier is None
+    assert engine.analyze("you are so selfish") == engine.matcher.scan("you are so selfish")
+
+
+def test_unknown_style():
+    registry = StyleRegistry()
+    assert "secure" in registry and "dismissive" not in registry
+    with pytest.raises(ValueError, match="unknown partner style 'dismissive'"):
+        registry.get("dismissive")
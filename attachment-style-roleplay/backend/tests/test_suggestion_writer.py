@@ -0,0 +1,55 @@
+import asyncio
+from types import SimpleNamespace
+
+from llm import default_caller
+from suggestion_writer import (DEFAULT_DEADLINE, PendingSuggestions, awrite_suggestions,
+                               parse_suggestions, suggestion_caller, write_suggestions)
+
+REWRITES = "1. No worries, I'll grab it\n- \"Take your time\"\nI can handle it"
+
+
+def response(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class RecordingCompletions:
+    def __init__(self):
+        self.timeouts = []
+
+    def create(self, messages, timeout=None, **params):
+        self.timeouts.append(timeout)
+        return response(REWRITES)
+
+
+class AsyncRecordingCompletions(RecordingCompletions):
+    async def create(self, messages, timeout=None, **params):
+        return super().create(messages, timeout, **params)
+
+
+def client_for(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def test_parse_strips_markers_and_needs_two_lines():
+    assert parse_suggestions(REWRITES) == ("No worries, I'll grab it", "Take your time", "I can handle it")
+    assert parse_suggestions("just one") is None
+
+
+def test_http_timeout_follows_the_deadline():
+    completions = RecordingCompletions()
+    client = client_for(completions)
+    write_suggestions(client, [], "y cant u buy?", "Pressing")
+    write_suggestions(client, [], "y cant u buy?", "Pressing", deadline=6.0)
+    PendingSuggestions(client, [], "y cant u buy?", "Pressing", ("fallback",), deadline=4.0).result()
+    assert completions.timeouts == [DEFAULT_DEADLINE, 6.0, 4.0]
+
+    completions = AsyncRecordingCompletions()
+    asyncio.run(awrite_suggestions(client_for(completions), [], "hi", "note", deadline=7.5))
+    assert completions.timeouts == [7.5]
+
+
+def test_callers_per_deadline_share_one_breaker_apart_from_replies():
+    assert suggestion_caller(6.0) is suggestion_caller(6.0)
+    assert suggestion_caller(6.0).breaker is suggestion_caller().breaker
+    assert suggestion_caller().breaker is not default_caller.breaker
+    assert suggestion_caller(6.0).max_attempts == 1
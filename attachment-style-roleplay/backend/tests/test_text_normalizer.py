@@ -0,0 +1,38 @@
+from style_registry import get_style_registry
+from text_normalizer import normalize_message
+
+
+def test_chat_speak_is_expanded_word_by_word():
+    assert normalize_message("y cant u buy?") == "why can't you buy?"
+    assert normalize_message("u hve too much ego") == "you have too much ego"
+    assert normalize_message("idk") == "i don't know"
+    # Only whole words are expanded; the "u" inside "you" or "buy" is left alone
+    assert normalize_message("you buy") == "you buy"
+    assert normalize_message("y'know") == "y'know"
+
+
+def test_apostrophes_fold_to_ascii_and_typography_to_plain_forms():
+    assert normalize_message("Can’t") == normalize_message("can't") == normalize_message("cant") == "can't"
+    assert normalize_message("it`s ʼover") == "it's 'over"
+    assert normalize_message("“fine”—whatever") == '"fine" whatever'
+    assert normalize_message("  so\tmuch\n\nspace ") == "so much space"
+
+
+def test_contractions_stay_apart_from_the_words_they_spell():
+    for contraction, word in (("we're", "were"), ("we'll", "well"), ("i'll", "ill"),
+                              ("it's", "its"), ("let's", "lets"), ("i'd", "id")):
+        assert normalize_message(contraction) != normalize_message(word) == word
+        assert normalize_message(contraction.replace("'", "’")) == contraction
+
+
+def test_lexicon_phrases_match_with_or_without_the_apostrophe():
+    matcher = get_style_registry().get("avoidant").matcher
+    for message in ("I don't think they will", "i dont think they will", "I don’t think they will"):
+        assert matcher.scan(message)["deflection_challenge"] == 1
+    assert matcher.scan("we're done")["relationship_threat"] == 1
+    assert matcher.scan("were done by noon")["relationship_threat"] == 0
+
+
+def test_stretched_letters_shrink_but_real_doubles_survive():
+    assert normalize_message("sooooo annoyinggg") == "soo annoyingg"
+    assert normalize_message("too better") == "too better"
@@ -0,0 +1,91 @@
+import json
+import re
+
+from tracing import TraceLog, Tracer, TurnMetrics, TurnTrace
+
+
+def trace_with(frontend="api", error=None, **stages):
+    trace = TurnTrace(session_id="s1", frontend=frontend)
+    for stage, seconds in stages.items():
+        trace.record(stage, seconds)
+    trace.end(error)
+    return trace
+
+
+def samples(text):
+    """metric{labels} -> value for every sample line"""
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+            for line in text.splitlines() if line and not line.startswith("#")}
+
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count():
+    metrics = TurnMetrics(buckets=(0.01, 0.1, 1.0))
+    for seconds in (0.005, 0.05, 0.05, 2.0):
+        metrics.observe(trace_with(llm=seconds))
+    text = metrics.prometheus_text()
+    assert "# TYPE trainer_stage_seconds histogram" in text
+    values = samples(text)
+    assert [values[f'trainer_stage_seconds_bucket{{stage="llm",le="{le}"}}']
+            for le in ("0.01", "0.1", "1.0", "+Inf")] == [1, 3, 3, 4]
+    assert values['trainer_stage_seconds_count{stage="llm"}'] == 4
+    assert abs(values['trainer_stage_seconds_sum{stage="llm"}'] - 2.105) < 1e-6
+
+
+def test_bucket_bounds_are_inclusive():
+    metrics = TurnMetrics(buckets=(0.1, 1.0))
+    metrics.observe(trace_with(analyze=0.1))
+    values = samples(metrics.prometheus_text())
+    assert values['trainer_stage_seconds_bucket{stage="analyze",le="0.1"}'] == 1
+
+
+def test_counters_by_label():
+    metrics = TurnMetrics()
+    ok = trace_with(llm=0.2)
+    ok.set(tokens_in=120, tokens_out=30, cache_hit=False)
+    cached = trace_with(frontend="cli", llm=0.001)
+    cached.set(tokens_in=80, cache_hit=True)
+    metrics.observe(ok)
+    metrics.observe(cached)
+    metrics.observe(trace_with(error="disconnected", llm=0.3))
+    text = metrics.prometheus_text()
+    values = samples(text)
+    assert values['trainer_turns_total{frontend="api",outcome="ok"}'] == 1
+    assert values['trainer_turns_total{frontend="api",outcome="error"}'] == 1
+    assert values['trainer_turns_total{frontend="cli",outcome="ok"}'] == 1
+    assert values['trainer_tokens_total{direction="in"}'] == 200
+    assert values['trainer_tokens_total{direction="out"}'] == 30
+    assert values['trainer_cache_lookups_total{result="hit"}'] == 1
+    assert values['trainer_cache_lookups_total{result="miss"}'] == 1
+    assert "# TYPE trainer_turns_total counter" in text
+    # Every sample line is `name{labels} value` in the exposition format
+    sample = re.compile(r'^[a-z_]+\{([a-z_]+="[^"]*",?)+\} [0-9.]+$')
+    assert all(sample.match(line) for line in text.splitlines() if not line.startswith("#"))
+
+
+def test_metrics_file_is_replaced_whole(tmp_path):
+    path = tmp_path / "metrics" / "trainer.prom"
+    metrics = TurnMetrics()
+    metrics.observe(trace_with(llm=0.2))
+    metrics.write(path)
+    assert path.read_text(encoding="utf-8") == metrics.prometheus_text()
+    assert not path.with_name(path.name + ".tmp").exists()
+
+
+def test_trace_log_appends_one_json_object_per_turn(tmp_path):
+    path = tmp_path / "logs" / "traces.jsonl"
+    tracer = Tracer(log_path=path)
+    first = tracer.start_turn(session_id="s1", frontend="api")
+    with first.span("analyze"):
+        pass
+    first.set(tokens_in=12, cache_hit=False)
+    tracer.finish(first)
+    tracer.finish(tracer.start_turn(session_id="s1", frontend="api"), error="disconnected")
+    tracer.log.close()
+
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [record["trace_id"] for record in records] == [first.id, tracer.last.id]
+    assert records[0]["session_id"] == "s1" and records[0]["error"] is None
+    assert [span["stage"] for span in records[0]["spans"]] == ["analyze"]
+    assert (records[0]["tokens_in"], records[0]["cache_hit"]) == (12, False)
+    assert records[1]["error"] == "disconnected"
+    assert tracer.metrics.prometheus_text().count('outcome="error"') == 1
@@ -0,0 +1,58 @@
+from trigger_engine import TRIGGER_CATEGORIES, TriggerMatcher, compile_trigger_matcher
+
+
+def test_phrases_only_match_on_word_boundaries():
+    matcher = TriggerMatcher({"anger": ["mad"]})
+    assert matcher.scan("i'm mad")["anger"] == 1
+    assert matcher.scan("mad!")["anger"] == 1
+    assert matcher.scan("i made dinner")["anger"] == 0
+    assert matcher.scan("nomad")["anger"] == 0
+
+
+def test_overlapping_phrases_are_all_found():
+    matcher = TriggerMatcher({"press": ["why cant you", "why cant you just"]})
+    assert matcher.scan("why cant you just go")["press"] == 2
+    assert matcher.scan("why cant you go")["press"] == 1
+
+
+def test_phrase_counts_once_per_message_but_listed_twice_counts_twice():
+    matcher = TriggerMatcher({"anger": ["stupid", "stupid"], "attack": ["stupid"]})
+    found = matcher.scan("stupid stupid stupid")
+    assert found == {"anger": 2, "attack": 1}
+
+
+def test_matching_ignores_case():
+    matcher = TriggerMatcher({"anger": ["Fed Up"]})
+    assert matcher.scan("I am FED UP")["anger"] == 1
+
+
+def test_compiled_matcher_reports_every_category():
+    matcher = compile_trigger_matcher({"emotional_escalation": ["whatever"]})
+    found = matcher.scan("whatever")
+    assert tuple(found) == TRIGGER_CATEGORIES
+    assert found["emotional_escalation"] == 1
+    assert sum(found.values()) == 1
+
+
+def test_normalized_matcher_catches_chat_speak():
+    matcher = compile_trigger_matcher({"pressing_patterns": ["why can't you"]})
+    assert matcher.scan("y cant u buy?")["pressing_behavior"] == 1
+    assert matcher.scan("Why CAN’T you")["pressing_behavior"] == 1
+
+
+def test_repeated_messages_are_served_from_the_memo():
+    matcher = TriggerMatcher({"anger": ["mad"]}, cache_size=8)
+    first = matcher.scan("so mad")
+    first["anger"] = 99  # every caller gets its own dict
+    assert matcher.scan("so mad") == {"anger": 1}
+    assert matcher.counts("so mad") is matcher.counts("so mad")
+    info = matcher.cache_info()
+    assert (info.hits, info.misses) == (3, 1)
+    matcher.cache_clear()
+    assert matcher.cache_info().currsize == 0
+
+
+def test_memo_can_be_disabled():
+    matcher = TriggerMatcher({"anger": ["mad"]}, cache_size=0)
+    assert matcher.cache_info() is None
+    assert matcher.scan("mad") == {"anger": 1}
@@ -0,0 +1,64 @@
+import re
+
+# Chat-speak the trainer sees in real transcripts ("y cant u buy?", "u hve too much ego")
+ABBREVIATIONS = {
+    "u": "you",
+    "y": "why",
+    "ur": "your",
+    "urs": "yours",
+    "r": "are",
+    "hve": "have",
+    "hv": "have",
+    "pls": "please",
+    "plz": "please",
+    "thx": "thanks",
+    "ty": "thank you",
+    "idk": "i don't know",
+    "bc": "because",
+    "cuz": "because",
+    "coz": "because",
+    "rn": "right now",
+    "tho": "though",
+    "wat": "what",
+    "wut": "what",
+}
+
+# Contractions typed without the apostrophe get it back, so "dont" and "don't"
+# meet. Only spellings that are not words of their own are listed: "were",
+# "well", "ill", "its", "id", "lets", "hell" and "shell" stay as typed
+CONTRACTIONS = {
+    "dont": "don't", "didnt": "didn't", "doesnt": "doesn't", "cant": "can't", "wont": "won't",
+    "isnt": "isn't", "arent": "aren't", "wasnt": "wasn't", "werent": "weren't",
+    "havent": "haven't", "hasnt": "hasn't", "hadnt": "hadn't", "aint": "ain't",
+    "wouldnt": "wouldn't", "couldnt": "couldn't", "shouldnt": "shouldn't",
+    "im": "i'm", "ive": "i've", "youre": "you're", "youve": "you've", "youll": "you'll",
+    "youd": "you'd", "theyre": "they're", "theyve": "they've", "theyll": "they'll",
+    "weve": "we've", "thats": "that's", "whats": "what's", "theres": "there's",
+    "wheres": "where's", "whos": "who's", "hes": "he's", "shes": "she's",
+}
+
+EXPANSIONS = {**CONTRACTIONS, **ABBREVIATIONS}
+
+# Curly and backtick apostrophes become the ASCII one, which is kept ("we're"
+# is not "were"); typographic quotes, dashes and odd whitespace become their
+# plain forms
+_TRANSLATION = str.maketrans({
+    "‘": "'", "’": "'", "ʼ": "'", "`": "'",
+    "“": '"', "”": '"',
+    "–": " ", "—": " ", " ": " ", "\t": " ", "\r": " ", "\n": " ",
+})
+_REPEATED_LETTERS = re.compile(r"([a-z])\1{2,}")
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)*")
+
+
+def normalize_message(text, abbreviations=EXPANSIONS):
+    """Lowercase, fold apostrophes and stretched letters, expand abbreviations and contractions.
+
+    Runs of three or more of the same letter shrink to two ("sooo" -> "soo"),
+    which keeps real double letters ("too", "better") intact. The lexicon goes
+    through the same function, so phrases and messages meet in one form.
+    """
+    text = text.lower().translate(_TRANSLATION)
+    text = _REPEATED_LETTERS.sub(r"\1\1", text)
+    text = _WORD.sub(lambda match: abbreviations.get(match.group(), match.group()), text)
+    return " ".join(text.split())
@@ -0,0 +1,229 @@
+"""Per-turn tracing for the trainer pipeline.
+
+Each turn gets a TurnTrace with one span per stage (analyze, adjust,
+feedback, prompt, llm, render, store) plus tokens in/out and whether the
+reply came from the cache. Finished traces feed a Prometheus-style metrics
+registry and, optionally, a JSONL trace log:
+
+    TRACE_LOG=.cache/traces.jsonl      one JSON object per turn
+    METRICS_FILE=.cache/trainer.prom   rewritten after every turn (textfile collector format)
+"""
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+STAGES = ("analyze", "adjust", "feedback", "prompt", "llm", "render", "store")
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class TurnTrace:
+    """Spans and attributes for one turn"""
+
+    def __init__(self, session_id=None, frontend=None):
+        self.id = uuid.uuid4().hex[:16]
+        self.session_id = session_id
+        self.frontend = frontend
+        self.started_at = time.time()
+        self.spans = []  # (stage, start offset, duration) in seconds
+        self.attrs = {}
+        self.error = None
+        self._t0 = time.perf_counter()
+        self._ended = None
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.spans.append((stage, start - self._t0, time.perf_counter() - start))
+
+    def record(self, stage, seconds):
+        """Add a span measured elsewhere"""
+        self.spans.append((stage, time.perf_counter() - self._t0 - seconds, seconds))
+
+    def mark(self, name):
+        """Milliseconds from the start of the turn to now, stored as `<name>_ms`"""
+        self.attrs[f"{name}_ms"] = (time.perf_counter() - self._t0) * 1000
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, error=None):
+        if self._ended is None:
+            self._ended = time.perf_counter()
+            self.error = error
+
+    @property
+    def total_seconds(self):
+        return (self._ended or time.perf_counter()) - self._t0
+
+    def stage_seconds(self):
+        """Total time per stage, in pipeline order"""
+        totals = {}
+        for stage, _, seconds in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        order = {stage: index for index, stage in enumerate(STAGES)}
+        return dict(sorted(totals.items(), key=lambda item: order.get(item[0], len(order))))
+
+    def breakdown(self):
+        """One line: total, then each stage in ms"""
+        parts = [f"{stage} {seconds * 1000:.2f}" for stage, seconds in self.stage_seconds().items()]
+        extras = []
+        if "first_token_ms" in self.attrs:
+            extras.append(f"first token {self.attrs['first_token_ms']:.0f} ms")
+        if "tokens_in" in self.attrs:
+            extras.append(f"tokens {self.attrs['tokens_in']} in / {self.attrs.get('tokens_out', 0)} out")
+        if "cache_hit" in self.attrs:
+            extras.append("cache hit" if self.attrs["cache_hit"] else "cache miss")
+        line = f"{self.total_seconds * 1000:.0f} ms: " + ", ".join(parts)
+        return line + (f" ({'; '.join(extras)})" if extras else "")
+
+    def to_dict(self):
+        return {
+            "trace_id": self.id,
+            "session_id": self.session_id,
+            "frontend": self.frontend,
+            "started_at": self.started_at,
+            "total_ms": self.total_seconds * 1000,
+            "error": self.error,
+            "spans": [{"stage": stage, "start_ms": start * 1000, "duration_ms": seconds * 1000}
+                      for stage, start, seconds in self.spans],
+            **self.attrs,
+        }
+
+
+class TurnMetrics:
+    """Stage histograms and turn/token/cache counters, exported as Prometheus text"""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._stages = {}  # stage -> [bucket counts..., +Inf count], sum
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _inc(self, name, labels, amount=1):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, trace):
+        with self._lock:
+            for stage, seconds in trace.stage_seconds().items():
+                counts, total = self._stages.get(stage, ([0] * (len(self.buckets) + 1), 0.0))
+                counts[bisect.bisect_left(self.buckets, seconds)] += 1
+                self._stages[stage] = (counts, total + seconds)
+            frontend = trace.frontend or "unknown"
+            self._inc("trainer_turns_total", (("frontend", frontend),
+                                              ("outcome", "error" if trace.error else "ok")))
+            for direction in ("in", "out"):
+                tokens = trace.attrs.get(f"tokens_{direction}")
+                if tokens:
+                    self._inc("trainer_tokens_total", (("direction", direction),), tokens)
+            if "cache_hit" in trace.attrs:
+                self._inc("trainer_cache_lookups_total",
+                          (("result", "hit" if trace.attrs["cache_hit"] else "miss"),))
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP trainer_stage_seconds Time spent in each stage of a turn",
+            "# TYPE trainer_stage_seconds histogram",
+        ]
+        with self._lock:
+            for stage, (counts, total) in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'trainer_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'trainer_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+                lines.append(f'trainer_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+            help_text = {
+                "trainer_turns_total": "Turns processed",
+                "trainer_tokens_total": "Estimated prompt (in) and reply (out) tokens",
+                "trainer_cache_lookups_total": "Reply cache lookups",
+            }
+            for name, text in help_text.items():
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        rendered = ",".join(f'{key}="{val}"' for key, val in labels)
+                        lines.append(f"{name}{{{rendered}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Atomically replace path with the current metrics"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with self._write_lock:
+            tmp.write_text(self.prometheus_text(), encoding="utf-8")
+            os.replace(tmp, path)
+
+
+class TraceLog:
+    """Append-only JSONL file of finished turns"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, trace):
+        line = json.dumps(trace.to_dict(), ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class Tracer:
+    """Starts turn traces and sends finished ones to the metrics, log and metrics file"""
+
+    def __init__(self, metrics=None, log_path=None, metrics_path=None):
+        self.metrics = metrics or TurnMetrics()
+        self.log = TraceLog(log_path) if log_path else None
+        self.metrics_path = metrics_path
+        self.last = None
+
+    def start_turn(self, session_id=None, frontend=None):
+        return TurnTrace(session_id, frontend)
+
+    def finish(self, trace, error=None):
+        trace.end(error)
+        self.metrics.observe(trace)
+        self.last = trace
+        if self.log is not None:
+            self.log.write(trace)
+        if self.metrics_path:
+            self.metrics.write(self.metrics_path)
+        return trace
+
+
+_default_tracer = None
+_default_lock = threading.Lock()
+
+
+def get_tracer():
+    """Process-wide tracer configured from TRACE_LOG and METRICS_FILE"""
+    global _default_tracer
+    if _default_tracer is None:
+        with _default_lock:
+            if _default_tracer is None:
+                _default_tracer = Tracer(log_path=os.environ.get("TRACE_LOG"),
+                                         metrics_path=os.environ.get("METRICS_FILE"))
+    return _default_tracer
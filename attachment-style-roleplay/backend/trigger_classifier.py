@@ -0,0 +1,383 @@
+"""Hashed n-gram trigger classifier: a linear model in NumPy, trained offline.
+
+    python trigger_classifier.py train training/trigger_labels.jsonl -o models/trigger_classifier.npz
+    python trigger_classifier.py eval training/trigger_labels.jsonl --model models/trigger_classifier.npz
+    python trigger_classifier.py predict "im not angry, just tired" --model models/trigger_classifier.npz
+
+Messages are normalized like the phrase engine's (text_normalizer), then
+hashed into FEATURE_DIM buckets: word unigrams and bigrams, words inside a
+negation's scope ("not angry" also yields neg:angry) and character 3-5-grams,
+which catch misspellings and paraphrases the lexicon has no phrase for. The
+model is one logistic output per TRIGGER_CATEGORIES entry; scoring a batch is
+a single gather and segment sum over the weight matrix, CPU only.
+
+The classifier sits in front of the phrase engine rather than replacing it:
+a category the model is confident about takes the model's answer (present or
+absent, so "im not angry" stops counting as escalation), and one it is unsure
+about keeps the lexicon's count. Without a model file nothing changes.
+
+Labeled data is JSONL, one message per line as {"text": ..., "triggers": ...}
+or one transcript per line as {"turns": [...]} where trainee turns carry
+"triggers"; triggers are a {category: count} dict or a list of categories.
+"""
+import json
+import sys
+import time
+import warnings
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from text_normalizer import normalize_message
+from trigger_engine import TRIGGER_CATEGORIES
+
+FEATURE_BITS = 18
+FEATURE_DIM = 1 << FEATURE_BITS
+CHAR_NGRAMS = (3, 4, 5)
+NEGATIONS = frozenset({"not", "no", "never", "don't", "didn't", "doesn't", "isn't", "aren't",
+                       "wasn't", "weren't", "won't", "nothing", "without"})
+NEGATION_SCOPE = 3  # words after a negation that it covers
+
+# Probabilities the model is trusted on; in between, the phrase engine decides
+ABSENT_BELOW = 0.05
+PRESENT_ABOVE = 0.5
+# Share of a message's words seen in training before the model may clear a phrase hit;
+# a low score on words it never saw ("crying") is no evidence against the lexicon
+MIN_WORD_COVERAGE = 0.6
+
+DEFAULT_MODEL_PATH = Path(__file__).resolve().parent / "models" / "trigger_classifier.npz"
+MODEL_FORMAT = 1
+
+_SHIFT = np.uint64(64 - FEATURE_BITS)
+_BASE = np.uint64(1099511628211)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_MASK = FEATURE_DIM - 1
+
+
+def _hash(feature):
+    return zlib.crc32(feature.encode("utf-8")) & _MASK
+
+
+def _word_features(words):
+    """Unigram buckets first (word coverage reads them), then bigrams and negated words"""
+    unigrams = [_hash("w:" + word) for word in words]
+    # Always one feature, so an empty message still has a row
+    others = [_hash("<s>")]
+    negated = 0
+    previous = "<s>"
+    for word in words:
+        others.append(_hash(f"b:{previous} {word}"))
+        if negated:
+            others.append(_hash("neg:" + word))
+            negated -= 1
+        if word in NEGATIONS:
+            negated = NEGATION_SCOPE
+        previous = word
+    return unigrams + others
+
+
+def featurize(text):
+    """(bucket indices of every feature in a message, number of words); repeats count twice"""
+    text = normalize_message(text)
+    words = text.split()
+    parts = [np.array(_word_features(words), dtype=np.int64)]
+
+    # Character n-grams with a vectorized rolling hash over the UTF-8 bytes
+    data = np.frombuffer(f" {text} ".encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    for n in CHAR_NGRAMS:
+        width = len(data) - n + 1
+        if width <= 0:
+            continue
+        h = np.full(width, n, dtype=np.uint64)
+        for k in range(n):
+            h = h * _BASE + data[k:k + width]
+        parts.append(((h * _MIX) >> _SHIFT).astype(np.int64))
+    return np.concatenate(parts), len(words)
+
+
+def featurize_batch(texts):
+    """(concatenated bucket indices, features per message, words per message)"""
+    rows = [featurize(text) for text in texts]
+    lengths = np.fromiter((len(row) for row, _ in rows), dtype=np.int64, count=len(rows))
+    words = np.fromiter((count for _, count in rows), dtype=np.int64, count=len(rows))
+    indices = np.concatenate([row for row, _ in rows]) if rows else np.zeros(0, dtype=np.int64)
+    return indices, lengths, words
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _segment_logits(weights, bias, indices, lengths):
+    """Per-message logits: summed feature weights, scaled by 1/sqrt(feature count)"""
+    offsets = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+    sums = np.add.reduceat(weights[indices], offsets, axis=0)
+    return sums / np.sqrt(lengths)[:, None] + bias
+
+
+class TriggerClassifier:
+    """Linear model over hashed features, one logistic output per trigger category"""
+
+    def __init__(self, weights, bias, known_words, absent_below=ABSENT_BELOW,
+                 present_above=PRESENT_ABOVE, min_word_coverage=MIN_WORD_COVERAGE):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        # Unigram buckets of every word in the training data
+        self.known_words = np.asarray(known_words, dtype=np.int64)
+        self._known = np.zeros(FEATURE_DIM, dtype=bool)
+        self._known[self.known_words] = True
+        self.absent_below = absent_below
+        self.present_above = present_above
+        self.min_word_coverage = min_word_coverage
+
+    def _score(self, texts):
+        """(probabilities, share of each message's words seen in training)"""
+        indices, lengths, words = featurize_batch(texts)
+        probabilities = _sigmoid(_segment_logits(self.weights, self.bias, indices, lengths))
+        # Unigram buckets lead each message's features
+        starts = np.zeros(len(texts), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        rows = np.repeat(np.arange(len(texts)), words)
+        within = np.arange(len(rows)) - np.repeat(np.cumsum(words) - words, words)
+        seen = np.bincount(rows, self._known[indices[starts[rows] + within]], minlength=len(texts))
+        return probabilities, seen / np.maximum(words, 1)
+
+    def probabilities(self, texts):
+        """(messages, categories) probabilities in TRIGGER_CATEGORIES order"""
+        if not texts:
+            return np.zeros((0, len(TRIGGER_CATEGORIES)), dtype=np.float32)
+        return self._score(texts)[0]
+
+    def predict_counts(self, texts, matcher=None):
+        """(messages, categories) trigger counts for a batch.
+
+        With a matcher, confident categories follow the model (at least one
+        hit when present; none when absent, if enough of the message's words
+        were seen in training) and the rest keep the matcher's counts.
+        Without one, a category counts once when p >= 0.5.
+        """
+        if not texts:
+            return np.zeros((0, len(TRIGGER_CATEGORIES)), dtype=np.int32)
+        probabilities, coverage = self._score(texts)
+        if matcher is None:
+            return (probabilities >= 0.5).astype(np.int32)
+        phrase = np.array([matcher.counts(text) for text in texts], dtype=np.int32)
+        counts = phrase.reshape(len(texts), len(TRIGGER_CATEGORIES)).copy()
+        present = probabilities >= self.present_above
+        counts[present] = np.maximum(counts[present], 1)
+        absent = (probabilities <= self.absent_below) & (coverage >= self.min_word_coverage)[:, None]
+        counts[absent] = 0
+        return counts
+
+    def predict(self, text, matcher=None):
+        """Trigger dict for one message, shaped like TriggerMatcher.scan()"""
+        return dict(zip(TRIGGER_CATEGORIES, self.predict_counts([text], matcher)[0].tolist()))
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Only buckets the training data touched are non-zero; store just those rows
+        rows = np.flatnonzero(np.any(self.weights != 0, axis=1))
+        np.savez_compressed(path, format=MODEL_FORMAT, feature_bits=FEATURE_BITS,
+                            char_ngrams=np.array(CHAR_NGRAMS), categories=np.array(TRIGGER_CATEGORIES),
+                            rows=rows, values=self.weights[rows], bias=self.bias,
+                            known_words=self.known_words,
+                            thresholds=np.array([self.absent_below, self.present_above,
+                                                 self.min_word_coverage]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if (int(data["format"]) != MODEL_FORMAT or int(data["feature_bits"]) != FEATURE_BITS
+                    or tuple(data["char_ngrams"].tolist()) != CHAR_NGRAMS):
+                raise ValueError(f"{path} was trained with different feature settings")
+            if tuple(data["categories"].tolist()) != TRIGGER_CATEGORIES:
+                raise ValueError(f"{path} was trained on different trigger categories")
+            weights = np.zeros((FEATURE_DIM, len(TRIGGER_CATEGORIES)), dtype=np.float32)
+            weights[data["rows"]] = data["values"]
+            return cls(weights, data["bias"], data["known_words"], *data["thresholds"].tolist())
+
+
+def load_trigger_classifier(path):
+    """The classifier at path, or None (with a warning) so callers keep the phrase engine"""
+    if not path:
+        return None
+    try:
+        return TriggerClassifier.load(path)
+    except (OSError, ValueError, KeyError) as exc:
+        warnings.warn(f"Trigger classifier not loaded, using the phrase engine: {exc}")
+        return None
+
+
+def train(texts, labels, epochs=300, learning_rate=0.5, l2=1e-4, max_positive_weight=5.0):
+    """Fit a TriggerClassifier with full-batch AdaGrad on the logistic loss.
+
+    labels is a (messages, categories) array of counts; anything above zero
+    is a positive. Rare categories get their positives up-weighted (capped at
+    max_positive_weight) so they are not drowned out by the negatives.
+    Only buckets seen in training are optimized, then scattered into the
+    full FEATURE_DIM table.
+    """
+    indices, lengths, _ = featurize_batch(texts)
+    targets = (np.asarray(labels) > 0).astype(np.float32)
+    n = len(texts)
+
+    buckets, local = np.unique(indices, return_inverse=True)
+    rows = np.repeat(np.arange(n), lengths)
+    scale = (1.0 / np.sqrt(lengths)).astype(np.float32)
+
+    positives = targets.sum(axis=0)
+    positive_weight = np.clip((n - positives) / np.maximum(positives, 1), 1.0, max_positive_weight)
+    sample_weight = np.where(targets > 0, positive_weight, 1.0).astype(np.float32) / n
+
+    weights = np.zeros((len(buckets), targets.shape[1]), dtype=np.float32)
+    bias = np.zeros(targets.shape[1], dtype=np.float32)
+    weight_g2 = np.full_like(weights, 1e-8)
+    bias_g2 = np.full_like(bias, 1e-8)
+
+    for _ in range(epochs):
+        error = (_sigmoid(_segment_logits(weights, bias, local, lengths)) - targets) * sample_weight
+        per_feature = (error * scale[:, None])[rows]
+        grad = np.stack([np.bincount(local, per_feature[:, c], minlength=len(buckets))
+                         for c in range(per_feature.shape[1])], axis=1).astype(np.float32)
+        grad += l2 * weights
+        grad_bias = error.sum(axis=0)
+        weight_g2 += grad * grad
+        bias_g2 += grad_bias * grad_bias
+        weights -= learning_rate * grad / np.sqrt(weight_g2)
+        bias -= learning_rate * grad_bias / np.sqrt(bias_g2)
+
+    full = np.zeros((FEATURE_DIM, targets.shape[1]), dtype=np.float32)
+    full[buckets] = weights
+    known_words = np.unique([_hash("w:" + word) for text in texts for word in normalize_message(text).split()])
+    return TriggerClassifier(full, bias, known_words.astype(np.int64))
+
+
+def _label_vector(triggers):
+    if isinstance(triggers, dict):
+        return [int(triggers.get(name, 0)) for name in TRIGGER_CATEGORIES]
+    return [int(name in triggers) for name in TRIGGER_CATEGORIES]
+
+
+def read_labeled(path):
+    """(texts, (messages, categories) label array) from labeled JSONL"""
+    texts, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            for turn in record.get("turns", [record]):
+                if isinstance(turn, dict) and "triggers" in turn:
+                    texts.append(turn.get("text", turn.get("content", "")))
+                    labels.append(_label_vector(turn["triggers"]))
+    return texts, np.array(labels, dtype=np.int32).reshape(len(texts), len(TRIGGER_CATEGORIES))
+
+
+def evaluate(predicted, labels):
+    """{category: (precision, recall, f1)} for presence, plus "micro" over all of them"""
+    predicted, actual = np.asarray(predicted) > 0, np.asarray(labels) > 0
+    report = {}
+    for index, name in enumerate((*TRIGGER_CATEGORIES, "micro")):
+        p = predicted[:, index] if index < len(TRIGGER_CATEGORIES) else predicted
+        a = actual[:, index] if index < len(TRIGGER_CATEGORIES) else actual
+        tp = float(np.sum(p & a))
+        precision = tp / max(float(np.sum(p)), 1.0)
+        recall = tp / max(float(np.sum(a)), 1.0)
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        report[name] = (precision, recall, f1)
+    return report
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train, evaluate or run the hashed n-gram trigger classifier")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="fit a model on labeled JSONL files")
+    train_parser.add_argument("data", nargs="+")
+    train_parser.add_argument("-o", "--output", default=str(DEFAULT_MODEL_PATH))
+    train_parser.add_argument("--epochs", type=int, default=300)
+    train_parser.add_argument("--learning-rate", type=float, default=0.5)
+    train_parser.add_argument("--l2", type=float, default=1e-4)
+    train_parser.add_argument("--holdout", type=float, default=0.0,
+                              help="fraction of messages kept out of training and scored afterwards")
+    eval_parser = commands.add_parser("eval", help="compare model, phrase engine and both on labeled JSONL")
+    eval_parser.add_argument("data", nargs="+")
+    eval_parser.add_argument("--model", default=str(DEFAULT_MODEL_PATH))
+    predict_parser = commands.add_parser("predict", help="classify messages given on the command line")
+    predict_parser.add_argument("messages", nargs="+")
+    predict_parser.add_argument("--model", default=str(DEFAULT_MODEL_PATH))
+    args = parser.parse_args()
+
+    from avoidant_style import TRIGGER_MATCHER
+
+    if args.command == "train":
+        texts, labels = [], []
+        for path in args.data:
+            more_texts, more_labels = read_labeled(path)
+            texts += more_texts
+            labels.append(more_labels)
+        labels = np.concatenate(labels)
+        order = np.random.default_rng(0).permutation(len(texts))
+        held = order[:int(len(texts) * args.holdout)]
+        kept = order[len(held):]
+        started = time.perf_counter()
+        model = train([texts[i] for i in kept], labels[kept], args.epochs, args.learning_rate, args.l2)
+        model.save(args.output)
+        print(f"Trained on {len(kept)} messages in {time.perf_counter() - started:.1f}s; "
+              f"model written to {args.output}", file=sys.stderr)
+        if len(held):
+            held_texts = [texts[i] for i in held]
+            for name, predicted in (("phrase engine", [TRIGGER_MATCHER.counts(t) for t in held_texts]),
+                                    ("combined", model.predict_counts(held_texts, TRIGGER_MATCHER))):
+                precision, recall, f1 = evaluate(predicted, labels[held])["micro"]
+                print(f"Held out {len(held)}: {name:<14} precision {precision:.2f} recall {recall:.2f} "
+                      f"F1 {f1:.2f}", file=sys.stderr)
+        return 0
+
+    model = TriggerClassifier.load(args.model)
+    if args.command == "predict":
+        probabilities = model.probabilities(args.messages)
+        for message, counts, row in zip(args.messages, model.predict_counts(args.messages, TRIGGER_MATCHER),
+                                        probabilities):
+            found = {name: count for name, count in zip(TRIGGER_CATEGORIES, counts.tolist()) if count}
+            confident = {name: round(float(p), 2) for name, p in zip(TRIGGER_CATEGORIES, row) if p >= 0.1}
+            print(f"{message}\n  triggers: {found or '-'}\n  p: {confident or '-'}")
+        return 0
+
+    texts, labels = [], []
+    for path in args.data:
+        more_texts, more_labels = read_labeled(path)
+        texts += more_texts
+        labels.append(more_labels)
+    labels = np.concatenate(labels)
+    TRIGGER_MATCHER.cache_clear()
+    phrase = np.array([TRIGGER_MATCHER.counts(text) for text in texts])
+    reports = {
+        "phrase engine": evaluate(phrase, labels),
+        "classifier": evaluate(model.predict_counts(texts), labels),
+        "combined": evaluate(model.predict_counts(texts, TRIGGER_MATCHER), labels),
+    }
+    print(f"{'category':<24}" + "".join(f"{name:>16}" for name in reports) + "   (F1)")
+    for category in (*TRIGGER_CATEGORIES, "micro"):
+        print(f"{category:<24}" + "".join(f"{report[category][2]:>16.2f}" for report in reports.values()))
+
+    started = time.perf_counter()
+    for text in texts:
+        model.predict(text, TRIGGER_MATCHER)
+    single = (time.perf_counter() - started) / len(texts)
+    TRIGGER_MATCHER.cache_clear()
+    started = time.perf_counter()
+    model.predict_counts(texts, TRIGGER_MATCHER)
+    batched = (time.perf_counter() - started) / len(texts)
+    print(f"\n{len(texts)} messages: {single * 1e6:.0f} µs/message one at a time, "
+          f"{batched * 1e6:.0f} µs/message batched")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
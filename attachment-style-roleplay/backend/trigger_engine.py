@@ -0,0 +1,176 @@
+from collections import deque
+from functools import lru_cache
+
+from text_normalizer import normalize_message
+
+SCAN_CACHE_SIZE = 4096
+
+# Trigger categories in the fixed order every front-end reports them
+TRIGGER_CATEGORIES = (
+    'deflection_challenge',
+    'counter_deflection',
+    'pressing_behavior',
+    'emotional_escalation',
+    'personal_attack',
+    'relationship_threat',
+    'positive_communication',
+    'space_giving',
+    'validation',
+)
+
+# Bit for each category in a trigger mask, in TRIGGER_CATEGORIES order
+TRIGGER_BITS = {name: 1 << index for index, name in enumerate(TRIGGER_CATEGORIES)}
+MASK_COUNT = 1 << len(TRIGGER_CATEGORIES)
+
+# Which REAL_CONVERSATION_PATTERNS list feeds each trigger category
+PATTERN_SOURCES = {
+    'deflection_challenge': 'excuse_challenging',
+    'counter_deflection': 'counter_deflection',
+    'pressing_behavior': 'pressing_patterns',
+    'emotional_escalation': 'emotional_escalation',
+    'personal_attack': 'personal_attacks',
+    'relationship_threat': 'relationship_threats',
+    'positive_communication': 'respectful_requests',
+    'space_giving': 'space_giving',
+    'validation': 'validation',
+}
+
+
+def trigger_mask(triggers):
+    """Bitmask of the categories that fired in a {category: count} dict"""
+    mask = 0
+    for name, bit in TRIGGER_BITS.items():
+        if triggers[name]:
+            mask |= bit
+    return mask
+
+
+def counts_mask(counts):
+    """Bitmask for a count vector laid out in TRIGGER_CATEGORIES order"""
+    mask = 0
+    for index, count in enumerate(counts):
+        if count:
+            mask |= 1 << index
+    return mask
+
+
+class TriggerMatcher:
+    """Aho-Corasick automaton over the whole trigger lexicon.
+
+    Built once, then every message is scanned in a single left-to-right pass
+    no matter how many phrases the lexicon holds. A phrase only counts when it
+    sits on word boundaries, so "mad" no longer fires inside "made".
+
+    With a normalizer, messages and lexicon phrases are both normalized before
+    matching. Counts are memoized per raw message, so a repeated or replayed
+    message skips normalization and matching altogether.
+    """
+
+    def __init__(self, lexicon, normalizer=None, cache_size=SCAN_CACHE_SIZE):
+        # lexicon: {category: [phrases]}; a phrase listed twice counts twice,
+        # same as the old one-loop-per-phrase scan
+        self.categories = tuple(lexicon)
+        self.normalizer = normalizer
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._phrase_len = []
+        self._phrase_weights = []
+
+        phrase_ids = {}
+        for index, category in enumerate(self.categories):
+            for phrase in lexicon[category]:
+                phrase = self.normalize(phrase)
+                if not phrase:
+                    continue
+                if phrase not in phrase_ids:
+                    phrase_ids[phrase] = self._add_phrase(phrase)
+                weights = self._phrase_weights[phrase_ids[phrase]]
+                weights[index] = weights.get(index, 0) + 1
+
+        self._build_failure_links()
+        self._counts = lru_cache(maxsize=cache_size)(self._count) if cache_size else self._count
+
+    def _add_phrase(self, phrase):
+        state = 0
+        for char in phrase:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        phrase_id = len(self._phrase_len)
+        self._phrase_len.append(len(phrase))
+        self._phrase_weights.append({})
+        self._out[state].append(phrase_id)
+        return phrase_id
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def find_phrases(self, text):
+        """Return the ids of every lexicon phrase found on word boundaries"""
+        goto, fail, out, phrase_len = self._goto, self._fail, self._out, self._phrase_len
+        text_len = len(text)
+        found = set()
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not out[state]:
+                continue
+            after = position + 1
+            if after < text_len and text[after].isalnum():
+                continue
+            for phrase_id in out[state]:
+                start = after - phrase_len[phrase_id]
+                if start == 0 or not text[start - 1].isalnum():
+                    found.add(phrase_id)
+        return found
+
+    def normalize(self, text):
+        return self.normalizer(text) if self.normalizer is not None else text.lower()
+
+    def _count(self, text):
+        counts = [0] * len(self.categories)
+        for phrase_id in self.find_phrases(self.normalize(text)):
+            for index, weight in self._phrase_weights[phrase_id].items():
+                counts[index] += weight
+        return tuple(counts)
+
+    def counts(self, text):
+        """Category counts as a tuple in self.categories order; shared, never copied"""
+        return self._counts(text)
+
+    def scan(self, text):
+        """Count category hits for one message in a single pass"""
+        # The memoized counts are an immutable tuple; every caller gets its own dict
+        return dict(zip(self.categories, self._counts(text)))
+
+    def cache_info(self):
+        return self._counts.cache_info() if hasattr(self._counts, "cache_info") else None
+
+    def cache_clear(self):
+        if hasattr(self._counts, "cache_clear"):
+            self._counts.cache_clear()
+
+
+def compile_trigger_matcher(patterns, normalizer=normalize_message, cache_size=SCAN_CACHE_SIZE):
+    """Compile a REAL_CONVERSATION_PATTERNS dict into a TriggerMatcher"""
+    return TriggerMatcher({
+        category: patterns.get(PATTERN_SOURCES[category], [])
+        for category in TRIGGER_CATEGORIES
+    }, normalizer=normalizer, cache_size=cache_size)